@@ -1,59 +1,89 @@
 import sys
 import json
 import os
+import datetime
+import threading
+import time
+import logging
+from collections import defaultdict
+from itertools import chain
+from bisect import bisect_left, bisect_right
+
+STARTUP_T0 = time.perf_counter()
+
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QPushButton, QListWidget, QListWidgetItem, QLineEdit, QDialog,
+    QPushButton, QListView, QLineEdit, QDialog,
     QLabel, QDateEdit, QTimeEdit, QComboBox, QMessageBox,
-    QRadioButton, QButtonGroup, QGraphicsOpacityEffect
+    QRadioButton, QButtonGroup, QGraphicsOpacityEffect,
+    QStyledItemDelegate, QStyle, QMenu, QFileDialog, QCheckBox, QSpinBox, QShortcut
 )
 from PyQt5.QtCore import (
     Qt, QDate, QTime, QRect, QPropertyAnimation, pyqtSignal,
-    QEasingCurve, QSize, QTimer
+    QEasingCurve, QSize, QTimer, QAbstractListModel, QAbstractProxyModel,
+    QModelIndex, QThread, QObject, QSettings, QUrl, QFileSystemWatcher
 )
 from PyQt5.QtGui import (
-    QPalette, QColor, QFont, QPainter, QBrush, QPen, QMouseEvent, QIcon, QPixmap, QMovie
+    QPalette, QColor, QFont, QPainter, QBrush, QPen, QMouseEvent, QIcon, QPixmap, QMovie, QKeySequence
 )
-
-TASKS_FILE = "tasks.json"
-
-class Task:
-    def __init__(self, description, date, time, ringtone, category):
-        self.description = description
-        self.date = date
-        self.time = time
-        self.ringtone = ringtone
-        self.category = category
-
-    def __str__(self):
-        return f"{self.description} — {self.date.toString('yyyy-MM-dd')} {self.time.toString('HH:mm')} [{self.ringtone}]"
-
-    def to_dict(self):
-        return {
-            "description": self.description,
-            "date": self.date.toString("yyyy-MM-dd"),
-            "time": self.time.toString("HH:mm"),
-            "ringtone": self.ringtone,
-            "category": self.category
-        }
-
-    @staticmethod
-    def from_dict(data):
-        description = data.get("description", "")
-        date_str = data.get("date", QDate.currentDate().toString("yyyy-MM-dd"))
-        time_str = data.get("time", QTime.currentTime().toString("HH:mm"))
-        ringtone = data.get("ringtone", "Chime")
-        category = data.get("category", "Personal")
-
-        date = QDate.fromString(date_str, "yyyy-MM-dd")
-        if not date.isValid():
-            date = QDate.currentDate()
-
-        time = QTime.fromString(time_str, "HH:mm")
-        if not time.isValid():
-            time = QTime.currentTime()
-
-        return Task(description, date, time, ringtone, category)
+from todo_core import (
+    Task, TASKS_FILE, JOURNAL_FILE, STORAGE_MODE, SYNC_SERVER, CATEGORIES, RINGTONES,
+    EXPORT_FORMATS, IMPORT_FORMATS, parse_date, parse_time, task_matches,
+    iter_task_batches, iter_store_tasks, store_page, due_range_for, format_for_path, external_changes,
+    complete_task, next_occurrence_due, reminder_schedule, open_task_store
+)
+from todo_recurrence import FREQUENCIES, UNITS, WEEKDAY_NAMES, RecurrenceRule
+from todo_schedule import DueIndex, DUE_VIEWS, due_key
+from todo_storage import TaskJournal
+from todo_search import TaskSearchIndex
+from todo_history import TaskCommand, UndoHistory
+from todo_metrics import METRICS_ENABLED, METRICS_FILE, metrics, timed
+from todo_reminders import ReminderQueue, due_timestamp
+
+try:
+    from PyQt5.QtMultimedia import QSoundEffect
+except ImportError:
+    QSoundEffect = None
+
+PAGE_SIZE = 200
+# dataChanged spans wider than this re-run the filter once instead of
+# adjusting the proxy row by row.
+PROXY_REFILTER_ROWS = 64
+# Removing more rows than this at once resets the model instead; fewer go
+# row by row so the view keeps its scroll position and selection.
+MODEL_RESET_ROWS = 16
+SEARCH_DEBOUNCE_MS = 150
+SAVE_COALESCE_MS = 100
+# Another process's save arrives as a burst of file and folder events.
+FILE_WATCH_DEBOUNCE_MS = 250
+# How often client mode asks the sync server for changes; an idle poll is a
+# bodiless 304.
+SYNC_POLL_MS = 2000
+RINGTONE_DIR = "assets/ringtones"
+SNOOZE_MINUTES = 5
+# The timer runs on a monotonic clock that may stop during system sleep, so
+# never arm it for longer than this; a wake-up then catches missed reminders.
+REMINDER_MAX_WAIT_MS = 15 * 60 * 1000
+MIN_SPLASH_MS = int(os.environ.get("TODO_MIN_SPLASH_MS", "0"))
+# With TODO_METRICS set, a timer due this often measures how late the event
+# loop runs it, and the overlay (F12) refreshes this often.
+STALL_PROBE_MS = 50
+OVERLAY_REFRESH_MS = 500
+
+logger = logging.getLogger("todo")
+
+def qdate_from_ordinal(ordinal):
+    d = datetime.date.fromordinal(ordinal)
+    return QDate(d.year, d.month, d.day)
+
+def ordinal_from_qdate(qdate):
+    return datetime.date(qdate.year(), qdate.month(), qdate.day()).toordinal()
+
+def qtime_from_minutes(minutes):
+    return QTime(minutes // 60, minutes % 60)
+
+def minutes_from_qtime(qtime):
+    return qtime.hour() * 60 + qtime.minute()
 
 class SegmentedControl(QWidget):
     selectionChanged = pyqtSignal(str)
@@ -79,6 +109,7 @@ class SegmentedControl(QWidget):
     def dummy_property(self, val):
         self._dummy_property = val
 
+    @timed()
     def paintEvent(self, event):
         painter = QPainter(self)
         painter.setRenderHint(QPainter.Antialiasing)
@@ -127,7 +158,7 @@ class SegmentedControl(QWidget):
                 self.selectionChanged.emit(self.segments[self.current_index])
 
     def sizeHint(self):
-        return QSize(300, 36)
+        return QSize(max(300, 80 * len(self.segments)), 36)
 
 class AnimatedPushButton(QPushButton):
     def __init__(self, *args, animation_duration=150, icon=None, **kwargs):
@@ -153,11 +184,29 @@ class AnimatedPushButton(QPushButton):
             self.opacity_effect = self.graphicsEffect()
         self.anim.valueChanged.connect(self.opacity_effect.setOpacity)
 
-class TaskDialog(QDialog):
+class OpenTimedDialog(QDialog):
+    # Records under open_metric the time from construction to the dialog's
+    # first paint: what opening it costs, showing included.
+    open_metric = None
+
+    def __init__(self, parent=None):
+        started = time.perf_counter()
+        super().__init__(parent)
+        self.open_started = started if METRICS_ENABLED else None
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.open_started is not None:
+            metrics.record(self.open_metric, time.perf_counter() - self.open_started)
+            self.open_started = None
+
+class TaskDialog(OpenTimedDialog):
+    open_metric = "TaskDialog.open"
+
     def __init__(self, parent=None, task=None):
         super().__init__(parent)
         self.setWindowTitle("Add Task" if task is None else "Update Task")
-        self.resize(420, 320)
+        self.resize(420, 420)
         self.task = task
 
         layout = QVBoxLayout()
@@ -189,7 +238,7 @@ class TaskDialog(QDialog):
 
         layout.addWidget(QLabel("Ringtone"))
         self.ringtone_combo = QComboBox()
-        self.ringtones = ["Chime", "Ripple", "Glass", "Bell", "Digital"]
+        self.ringtones = list(RINGTONES)
         self.ringtone_combo.addItems(self.ringtones)
         layout.addWidget(self.ringtone_combo)
 
@@ -204,6 +253,45 @@ class TaskDialog(QDialog):
         category_layout.addWidget(self.business_radio)
         layout.addLayout(category_layout)
 
+        layout.addWidget(QLabel("Repeat"))
+        repeat_layout = QHBoxLayout()
+        self.repeat_combo = QComboBox()
+        self.repeat_combo.addItems(["Never"] + [freq.capitalize() for freq in FREQUENCIES])
+        repeat_layout.addWidget(self.repeat_combo)
+        repeat_layout.addWidget(QLabel("every"))
+        self.interval_spin = QSpinBox()
+        self.interval_spin.setRange(1, 999)
+        repeat_layout.addWidget(self.interval_spin)
+        self.unit_label = QLabel()
+        repeat_layout.addWidget(self.unit_label)
+        repeat_layout.addStretch()
+        layout.addLayout(repeat_layout)
+
+        weekday_layout = QHBoxLayout()
+        self.weekday_checks = [QCheckBox(name) for name in WEEKDAY_NAMES]
+        for check in self.weekday_checks:
+            weekday_layout.addWidget(check)
+        layout.addLayout(weekday_layout)
+
+        ends_layout = QHBoxLayout()
+        ends_layout.addWidget(QLabel("Ends"))
+        self.ends_combo = QComboBox()
+        self.ends_combo.addItems(["Never", "On date", "After"])
+        ends_layout.addWidget(self.ends_combo)
+        self.until_edit = QDateEdit()
+        self.until_edit.setCalendarPopup(True)
+        self.until_edit.setDate(QDate.currentDate().addMonths(1))
+        ends_layout.addWidget(self.until_edit)
+        self.count_spin = QSpinBox()
+        self.count_spin.setRange(1, 9999)
+        self.count_spin.setValue(10)
+        self.count_spin.setSuffix(" times")
+        ends_layout.addWidget(self.count_spin)
+        layout.addLayout(ends_layout)
+
+        self.repeat_combo.currentIndexChanged.connect(self.update_repeat_controls)
+        self.ends_combo.currentIndexChanged.connect(self.update_repeat_controls)
+
         btn_layout = QHBoxLayout()
         btn_layout.addStretch()
 
@@ -221,8 +309,8 @@ class TaskDialog(QDialog):
 
         if task:
             self.desc_edit.setText(task.description)
-            self.date_edit.setDate(task.date)
-            self.time_edit.setTime(task.time)
+            self.date_edit.setDate(qdate_from_ordinal(task.date))
+            self.time_edit.setTime(qtime_from_minutes(task.time))
             index = self.ringtones.index(task.ringtone) if task.ringtone in self.ringtones else 0
             self.ringtone_combo.setCurrentIndex(index)
             if task.category == "Personal":
@@ -231,22 +319,773 @@ class TaskDialog(QDialog):
                 self.business_radio.setChecked(True)
             else:
                 self.personal_radio.setChecked(True)
+            if task.repeat is not None:
+                self.show_repeat(task.repeat)
         else:
             self.personal_radio.setChecked(True)
+        self.update_repeat_controls()
+
+    def show_repeat(self, rule):
+        self.repeat_combo.setCurrentIndex(FREQUENCIES.index(rule.freq) + 1)
+        self.interval_spin.setValue(rule.interval)
+        for day, check in enumerate(self.weekday_checks):
+            check.setChecked(day in rule.weekdays)
+        if rule.until is not None:
+            self.ends_combo.setCurrentIndex(1)
+            self.until_edit.setDate(qdate_from_ordinal(rule.until))
+        elif rule.count is not None:
+            self.ends_combo.setCurrentIndex(2)
+            self.count_spin.setValue(rule.count)
+
+    def update_repeat_controls(self):
+        freq_index = self.repeat_combo.currentIndex()
+        repeats = freq_index > 0
+        self.interval_spin.setEnabled(repeats)
+        self.unit_label.setText(UNITS[FREQUENCIES[freq_index - 1]] + "(s)" if repeats else "")
+        for check in self.weekday_checks:
+            check.setVisible(repeats and FREQUENCIES[freq_index - 1] == "weekly")
+        self.ends_combo.setEnabled(repeats)
+        self.until_edit.setVisible(repeats and self.ends_combo.currentIndex() == 1)
+        self.count_spin.setVisible(repeats and self.ends_combo.currentIndex() == 2)
+
+    def get_repeat(self, date):
+        # Raises ValueError when the rule has no occurrence at all.
+        freq_index = self.repeat_combo.currentIndex()
+        if freq_index == 0:
+            return None
+        freq = FREQUENCIES[freq_index - 1]
+        weekdays = [day for day, check in enumerate(self.weekday_checks) if check.isChecked()]
+        ends = self.ends_combo.currentIndex()
+        until = ordinal_from_qdate(self.until_edit.date()) if ends == 1 else None
+        count = self.count_spin.value() if ends == 2 else None
+        rule = RecurrenceRule.create(freq, date, self.interval_spin.value(), weekdays, until, count)
+        old = self.task.repeat if self.task is not None else None
+        if old is not None and date == self.task.date and old.starting(rule.start) == rule:
+            # Unchanged: keep the series' original anchor, which its count
+            # and interval are measured from.
+            return old
+        return rule
 
     def get_task(self):
         description = self.desc_edit.text().strip()
-        date = self.date_edit.date()
-        time = self.time_edit.time()
+        date = ordinal_from_qdate(self.date_edit.date())
+        time = minutes_from_qtime(self.time_edit.time())
         ringtone = self.ringtone_combo.currentText()
         if self.personal_radio.isChecked():
             category = "Personal"
         else:
             category = "Business"
-        return Task(description, date, time, ringtone, category)
+        task_id = self.task.id if self.task is not None else None
+        repeat = self.get_repeat(date)
+        if repeat is not None and (self.task is None or repeat is not self.task.repeat):
+            # A new rule may start after the chosen date (weekly on other days).
+            date = repeat.start
+        return Task(description, date, time, ringtone, category, task_id, repeat)
+
+class RescheduleDialog(OpenTimedDialog):
+    open_metric = "RescheduleDialog.open"
+
+    def __init__(self, parent=None, count=1):
+        super().__init__(parent)
+        self.setWindowTitle("Reschedule Tasks")
+        self.resize(320, 180)
+
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel(f"New date for {count} task{'s' if count != 1 else ''}"))
+        self.date_edit = QDateEdit()
+        self.date_edit.setCalendarPopup(True)
+        self.date_edit.setDate(QDate.currentDate())
+        layout.addWidget(self.date_edit)
+
+        self.time_check = QCheckBox("Also change the time")
+        layout.addWidget(self.time_check)
+        self.time_edit = QTimeEdit()
+        self.time_edit.setTime(QTime.currentTime())
+        self.time_edit.setEnabled(False)
+        self.time_check.toggled.connect(self.time_edit.setEnabled)
+        layout.addWidget(self.time_edit)
+
+        btn_layout = QHBoxLayout()
+        btn_layout.addStretch()
+        self.ok_btn = QPushButton("OK")
+        self.ok_btn.clicked.connect(self.accept)
+        btn_layout.addWidget(self.ok_btn)
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.clicked.connect(self.reject)
+        btn_layout.addWidget(self.cancel_btn)
+        layout.addLayout(btn_layout)
+
+        self.setLayout(layout)
+
+    def get_schedule(self):
+        # The time is None when only the date should change.
+        date = ordinal_from_qdate(self.date_edit.date())
+        time = minutes_from_qtime(self.time_edit.time()) if self.time_check.isChecked() else None
+        return date, time
+
+class TaskListModel(QAbstractListModel):
+    TaskRole = Qt.UserRole
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.tasks = []
+        self.by_id = {}
+        self.category_ids = defaultdict(set)
+        self.due_index = DueIndex()
+        self.has_more = False
+        self.page_loader = None
+        self._row_lookup = {}
+        self._lookup_valid_to = 0
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.tasks)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        task = self.tasks[index.row()]
+        if role == Qt.DisplayRole:
+            return str(task)
+        if role == self.TaskRole:
+            return task
+        return None
+
+    def row_of(self, task_id):
+        # Removing a row shifts everything after it, so the lookup is only
+        # trusted up to _lookup_valid_to and the tail is re-numbered lazily.
+        tasks = self.tasks
+        if self._lookup_valid_to < len(tasks):
+            lookup = self._row_lookup
+            for row in range(self._lookup_valid_to, len(tasks)):
+                lookup[tasks[row].id] = row
+            self._lookup_valid_to = len(tasks)
+        return self._row_lookup[task_id]
+
+    def rows_of(self, task_ids):
+        if not self.tasks:
+            return []
+        self.row_of(self.tasks[0].id)
+        lookup = self._row_lookup
+        return [lookup[task_id] for task_id in task_ids]
+
+    def _index_task(self, task):
+        self.by_id[task.id] = task
+        self.category_ids[task.category].add(task.id)
+
+    def set_tasks(self, tasks):
+        self.beginResetModel()
+        self.tasks = tasks
+        self.by_id = {}
+        self.category_ids = defaultdict(set)
+        for task in tasks:
+            self._index_task(task)
+        self.due_index.rebuild(tasks)
+        self._row_lookup = {}
+        self._lookup_valid_to = 0
+        self.endResetModel()
+
+    def append_task(self, task):
+        row = len(self.tasks)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.tasks.append(task)
+        self._index_task(task)
+        self.due_index.add(task)
+        self.endInsertRows()
+
+    def replace_task(self, task):
+        row = self.row_of(task.id)
+        old_task = self.tasks[row]
+        self.category_ids[old_task.category].discard(task.id)
+        self.due_index.update(old_task, task)
+        self.tasks[row] = task
+        self._index_task(task)
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def replace_tasks(self, tasks):
+        # One dataChanged over the span of touched rows for the whole batch.
+        rows = []
+        for task in tasks:
+            row = self.row_of(task.id)
+            old_task = self.tasks[row]
+            self.category_ids[old_task.category].discard(task.id)
+            self.due_index.update(old_task, task)
+            self.tasks[row] = task
+            self._index_task(task)
+            rows.append(row)
+        if rows:
+            self.dataChanged.emit(self.index(min(rows)), self.index(max(rows)))
+
+    def remove_tasks(self, task_ids):
+        # Scattered rows would mean one removal signal per run; a single reset
+        # is cheaper for the views and keeps the batch to one update.
+        task_ids = set(task_ids)
+        if len(task_ids) <= MODEL_RESET_ROWS:
+            for task_id in task_ids:
+                self.remove_task(task_id)
+            return
+        self.beginResetModel()
+        self.tasks = [task for task in self.tasks if task.id not in task_ids]
+        for task_id in task_ids:
+            task = self.by_id.pop(task_id)
+            self.category_ids[task.category].discard(task_id)
+        self.due_index.remove_many(task_ids)
+        self._row_lookup = {}
+        self._lookup_valid_to = 0
+        self.endResetModel()
+
+    def remove_task(self, task_id):
+        row = self.row_of(task_id)
+        self.beginRemoveRows(QModelIndex(), row, row)
+        task = self.tasks.pop(row)
+        del self.by_id[task_id]
+        self.category_ids[task.category].discard(task_id)
+        self.due_index.remove(task)
+        del self._row_lookup[task_id]
+        self._lookup_valid_to = min(self._lookup_valid_to, row)
+        self.endRemoveRows()
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and self.has_more and self.page_loader is not None
+
+    def append_tasks(self, tasks):
+        if not tasks:
+            return
+        row = len(self.tasks)
+        self.beginInsertRows(QModelIndex(), row, row + len(tasks) - 1)
+        self.tasks.extend(tasks)
+        for task in tasks:
+            self._index_task(task)
+        self.due_index.add_many(tasks)
+        self.endInsertRows()
+
+    def fetchMore(self, parent):
+        self.append_tasks(self.page_loader())
+
+class TaskFilterProxyModel(QAbstractProxyModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.category = "All"
+        self.search_text = ""
+        self.search_index = None
+        self.sort_by_due = False
+        self.due_range = (None, None)
+        self.rows = []
+        # Maps source row to proxy row while rows are in due order rather
+        # than source order, which bisecting self.rows relies on.
+        self._row_pos = None
+        self._pending_removal = None
+
+    def setSourceModel(self, model):
+        super().setSourceModel(model)
+        model.rowsInserted.connect(self._on_rows_inserted)
+        model.rowsAboutToBeRemoved.connect(self._on_rows_about_to_be_removed)
+        model.rowsRemoved.connect(self._on_rows_removed)
+        model.dataChanged.connect(self._on_data_changed)
+        model.modelReset.connect(self.invalidate_filter)
+        self.invalidate_filter()
+
+    def accepts(self, task):
+        start, end = self.due_range
+        if start is not None or end is not None:
+            key = due_key(task.date, task.time)
+            if (start is not None and key < start) or (end is not None and key >= end):
+                return False
+        category = self.category if self.category in CATEGORIES else None
+        return task_matches(task, category, self.search_text)
+
+    def set_filter(self, category, search_text, sort_by_due=False):
+        self.category = category
+        self.search_text = search_text.strip().lower()
+        self.sort_by_due = sort_by_due
+        self.invalidate_filter()
+
+    def invalidate_filter(self):
+        self.beginResetModel()
+        self._filter_rows()
+        self.endResetModel()
+
+    def _filter_rows(self):
+        self.due_range = due_range_for(self.category)
+        self._row_pos = None
+        if self.sort_by_due or self.category in DUE_VIEWS:
+            self._filter_rows_by_due()
+            return
+        tasks = self.sourceModel().tasks
+        category = self.category
+        search_text = self.search_text
+        if category == "All" and not search_text:
+            self.rows = list(range(len(tasks)))
+        elif not search_text:
+            self.rows = [i for i, t in enumerate(tasks) if t.category == category]
+        elif self.search_index is not None:
+            model = self.sourceModel()
+            matches = self.search_index.search(search_text)
+            if category != "All":
+                matches = matches & model.category_ids[category]
+            self.rows = sorted(model.rows_of(matches))
+        elif category == "All":
+            self.rows = [i for i, t in enumerate(tasks) if search_text in t.description.lower()]
+        else:
+            self.rows = [i for i, t in enumerate(tasks)
+                         if t.category == category and search_text in t.description.lower()]
+
+    def _filter_rows_by_due(self):
+        # A range query on the model's due index, so a view costs
+        # O(log n + k) in the number of tasks it shows.
+        model = self.sourceModel()
+        task_ids = model.due_index.between(*self.due_range)
+        category = self.category if self.category in CATEGORIES else None
+        search_text = self.search_text
+        if search_text and self.search_index is not None:
+            matches = self.search_index.search(search_text)
+            if category:
+                matches = matches & model.category_ids[category]
+            task_ids = [task_id for task_id in task_ids if task_id in matches]
+        elif category and not search_text:
+            members = model.category_ids[category]
+            task_ids = [task_id for task_id in task_ids if task_id in members]
+        elif search_text:
+            by_id = model.by_id
+            task_ids = [task_id for task_id in task_ids if task_matches(by_id[task_id], category, search_text)]
+        rows = model.rows_of(task_ids)
+        if self.sort_by_due:
+            self._row_pos = dict(zip(rows, range(len(rows))))
+        else:
+            rows.sort()
+        self.rows = rows
+
+    def index(self, row, column=0, parent=QModelIndex()):
+        if parent.isValid() or column != 0 or not 0 <= row < len(self.rows):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=QModelIndex()):
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 1
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid():
+            return QModelIndex()
+        return self.sourceModel().index(self.rows[proxy_index.row()])
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QModelIndex()
+        source_row = source_index.row()
+        if self._row_pos is not None:
+            pos = self._row_pos.get(source_row)
+            return QModelIndex() if pos is None else self.createIndex(pos, 0)
+        pos = bisect_left(self.rows, source_row)
+        if pos < len(self.rows) and self.rows[pos] == source_row:
+            return self.createIndex(pos, 0)
+        return QModelIndex()
+
+    # In due order a change can move rows anywhere, so those paths re-run the
+    # filter (one range query) instead of patching rows in place.
+    def _on_rows_inserted(self, parent, first, last):
+        if self._row_pos is not None:
+            self.invalidate_filter()
+            return
+        count = last - first + 1
+        pos = bisect_left(self.rows, first)
+        if pos < len(self.rows):
+            self.rows[pos:] = [r + count for r in self.rows[pos:]]
+        tasks = self.sourceModel().tasks
+        accepted = [r for r in range(first, last + 1) if self.accepts(tasks[r])]
+        if accepted:
+            self.beginInsertRows(QModelIndex(), pos, pos + len(accepted) - 1)
+            self.rows[pos:pos] = accepted
+            self.endInsertRows()
+
+    def _on_rows_about_to_be_removed(self, parent, first, last):
+        if self._row_pos is not None:
+            self._pending_removal = None
+            self.beginResetModel()
+            return
+        lo = bisect_left(self.rows, first)
+        hi = bisect_right(self.rows, last)
+        self._pending_removal = (lo, hi, last - first + 1)
+        if hi > lo:
+            self.beginRemoveRows(QModelIndex(), lo, hi - 1)
+
+    def _on_rows_removed(self, parent, first, last):
+        if self._pending_removal is None:
+            self._filter_rows()
+            self.endResetModel()
+            return
+        lo, hi, count = self._pending_removal
+        self._pending_removal = None
+        del self.rows[lo:hi]
+        self.rows[lo:] = [r - count for r in self.rows[lo:]]
+        if hi > lo:
+            self.endRemoveRows()
+
+    def _on_data_changed(self, top_left, bottom_right, roles=()):
+        if self._row_pos is not None or bottom_right.row() - top_left.row() >= PROXY_REFILTER_ROWS:
+            self.invalidate_filter()
+            return
+        tasks = self.sourceModel().tasks
+        for source_row in range(top_left.row(), bottom_right.row() + 1):
+            pos = bisect_left(self.rows, source_row)
+            present = pos < len(self.rows) and self.rows[pos] == source_row
+            accepted = self.accepts(tasks[source_row])
+            if present and accepted:
+                index = self.createIndex(pos, 0)
+                self.dataChanged.emit(index, index)
+            elif present:
+                self.beginRemoveRows(QModelIndex(), pos, pos)
+                del self.rows[pos]
+                self.endRemoveRows()
+            elif accepted:
+                self.beginInsertRows(QModelIndex(), pos, pos)
+                self.rows.insert(pos, source_row)
+                self.endInsertRows()
+
+class TaskItemDelegate(QStyledItemDelegate):
+    ROW_HEIGHT = 76
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.font = QFont()
+        self.font.setPixelSize(18)
+        self.font.setBold(True)
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), self.ROW_HEIGHT)
+
+    def paint(self, painter, option, index):
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        rect = option.rect.adjusted(0, 8, 0, -8)
+        selected = bool(option.state & QStyle.State_Selected)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor("#007aff") if selected else QColor("#fefefe"))
+        painter.drawRoundedRect(rect, 12, 12)
+        painter.setPen(QColor("white") if selected else QColor("#333"))
+        painter.setFont(self.font)
+        painter.drawText(rect.adjusted(24, 0, -24, 0), Qt.AlignLeft | Qt.AlignVCenter, index.data())
+        painter.restore()
+
+class TaskSaveWorker(QThread):
+    saveFinished = pyqtSignal()
+    saveFailed = pyqtSignal(str)
+
+    def __init__(self, journal, journaled, parent=None, open_store=None):
+        super().__init__(parent)
+        self.journal = journal
+        # JSON mode folds each batch into the snapshot on disk; journal mode
+        # appends it. Nothing is ever written from the in-memory list, which
+        # could be missing tasks another process saved.
+        self.journaled = journaled
+        # SQLite mode writes to the database instead, through a connection
+        # opened by open_store() on this thread, as SQLite connections may
+        # only be used on the thread that opened them.
+        self.open_store = open_store
+        self.store = None
+        self._cond = threading.Condition()
+        self._rewrite = False
+        self._records = []
+        self._busy = False
+        self._failed = False
+        self._flushing = False
+        self._stopping = False
+
+    def _has_work(self):
+        return self._rewrite or bool(self._records)
+
+    def is_idle(self):
+        with self._cond:
+            return not self._has_work() and not self._busy
+
+    def rewrite(self):
+        # Rewrites the snapshot from the files, e.g. to persist assigned ids.
+        with self._cond:
+            self._rewrite = True
+            self._failed = False
+            self._cond.notify_all()
+
+    def append_record(self, op, value):
+        self.append_records([(op, value)])
+
+    def append_records(self, records):
+        with self._cond:
+            self._records.extend(records)
+            self._failed = False
+            self._cond.notify_all()
+
+    def flush(self):
+        with self._cond:
+            self._flushing = True
+            self._cond.notify_all()
+            while (self._has_work() or self._busy) and not self._failed:
+                self._cond.wait()
+            self._flushing = False
+
+    def stop(self):
+        with self._cond:
+            # Give work that failed earlier one last attempt before exit.
+            self._failed = False
+        self.flush()
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self.wait()
+
+    def run(self):
+        while True:
+            with self._cond:
+                while (not self._has_work() or self._failed) and not self._stopping:
+                    self._cond.wait()
+                if self._stopping and (not self._has_work() or self._failed):
+                    break
+                deadline = time.monotonic() + SAVE_COALESCE_MS / 1000
+                while not self._flushing and not self._stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                rewrite, records = self._rewrite, self._records
+                self._rewrite = False
+                self._records = []
+                self._busy = True
+            error = None
+            try:
+                self.save(records, rewrite)
+            except Exception as e:
+                error = str(e)
+            with self._cond:
+                self._busy = False
+                if error is not None:
+                    self._rewrite = self._rewrite or rewrite
+                    self._records[:0] = records
+                    self._failed = True
+                self._cond.notify_all()
+            if error is None:
+                self.saveFinished.emit()
+            else:
+                self.saveFailed.emit(error)
+        if self.store is not None:
+            self.store.close()
+
+    @timed()
+    def save(self, records, rewrite):
+        if self.open_store is not None:
+            if self.store is None:
+                self.store = self.open_store()
+            self.store.apply_changes(records)
+        elif records and self.journaled and not rewrite:
+            self.journal.append_many(records)
+        elif records or rewrite:
+            self.journal.apply_changes(records, indent=4)
+
+class ReminderScheduler(QObject):
+    remindersDue = pyqtSignal(list)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.queue = ReminderQueue()
+        self.settings = QSettings("CodSoft", "ToDo_List")
+        self.last_checked = float(self.settings.value("reminders/last_checked", time.time()))
+        self.snoozed = json.loads(self.settings.value("reminders/snoozed", "{}"))
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.VeryCoarseTimer)
+        self.timer.timeout.connect(self.check)
+
+    def load(self, schedule):
+        # schedule yields (task_id, date ordinal, minutes). Anything due after
+        # the last check is pending, including reminders missed while closed.
+        due_by_id = {}
+        for task_id, date, minutes in schedule:
+            due = due_timestamp(date, minutes)
+            if due > self.last_checked:
+                due_by_id[task_id] = due
+        for task_id, until in self.snoozed.items():
+            due_by_id[task_id] = until
+        self.queue.rebuild(due_by_id)
+        self.check()
+
+    def task_changed(self, task):
+        # A repeating task is reminded of at its next occurrence still ahead.
+        self.snoozed.pop(task.id, None)
+        now = time.time()
+        date = next_occurrence_due(task, now)
+        if date is not None:
+            self.queue.schedule(task.id, due_timestamp(date, task.time))
+        else:
+            self.queue.cancel(task.id)
+        self.arm()
+
+    def task_removed(self, task_id):
+        if self.snoozed.pop(task_id, None) is not None:
+            self.save_state()
+        self.queue.cancel(task_id)
+        self.arm()
+
+    def snooze(self, task_ids, minutes=SNOOZE_MINUTES):
+        until = time.time() + minutes * 60
+        for task_id in task_ids:
+            self.snoozed[task_id] = until
+            self.queue.schedule(task_id, until)
+        self.save_state()
+        self.arm()
+
+    def arm(self):
+        next_due = self.queue.next_due()
+        if next_due is None:
+            self.timer.stop()
+            return
+        delay = max(0, int((next_due - time.time()) * 1000))
+        self.timer.start(min(delay, REMINDER_MAX_WAIT_MS))
+
+    def check(self):
+        now = time.time()
+        due_ids = self.queue.pop_due(now)
+        self.last_checked = now
+        for task_id in due_ids:
+            self.snoozed.pop(task_id, None)
+        self.save_state()
+        self.arm()
+        if due_ids:
+            self.remindersDue.emit(due_ids)
+
+    def save_state(self):
+        self.settings.setValue("reminders/last_checked", self.last_checked)
+        self.settings.setValue("reminders/snoozed", json.dumps(self.snoozed))
+
+class TaskLoader(QThread):
+    batchLoaded = pyqtSignal(object)
+    loaded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, journal, parent=None):
+        super().__init__(parent)
+        self.journal = journal
+
+    @timed()
+    def run(self):
+        try:
+            store = None if SYNC_SERVER else open_task_store()
+            if store is not None:
+                store.migrate_from_json(TASKS_FILE, JOURNAL_FILE)
+                store.close()
+                self.loaded.emit(None)
+            else:
+                search_index = TaskSearchIndex()
+                for batch in iter_task_batches(self.journal):
+                    search_index.add_many(batch)
+                    self.batchLoaded.emit(batch)
+                self.loaded.emit(search_index)
+        except Exception as e:
+            self.failed.emit(str(e))
+
+class TaskFileWatcher(QObject):
+    # Reports changes other processes make to the task files. Saves replace
+    # tasks.json by rename, which drops a watch on the file itself, so the
+    # folder is watched too and the files are re-added when it changes.
+    changed = pyqtSignal()
+
+    def __init__(self, paths, parent=None):
+        super().__init__(parent)
+        self.paths = [os.path.abspath(path) for path in paths]
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.addPaths(sorted({os.path.dirname(path) for path in self.paths}))
+        self.watcher.directoryChanged.connect(self.on_directory_changed)
+        self.watcher.fileChanged.connect(self.schedule)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(FILE_WATCH_DEBOUNCE_MS)
+        self.timer.timeout.connect(self.changed)
+        self.watch_files()
+
+    def watch_files(self):
+        watched = set(self.watcher.files())
+        missing = [path for path in self.paths if path not in watched and os.path.exists(path)]
+        if missing:
+            self.watcher.addPaths(missing)
+
+    def on_directory_changed(self, path):
+        self.watch_files()
+        self.schedule()
+
+    def schedule(self):
+        self.timer.start()
+
+class TaskChangeScanner(QThread):
+    # Works out what another process changed off the GUI thread: a few
+    # appended journal lines in journal mode, a streamed comparison of the
+    # rewritten file in JSON mode, a delta from the server in client mode.
+    found = pyqtSignal(object, object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, journal, known, parent=None):
+        super().__init__(parent)
+        self.journal = journal
+        self.known = known
+
+    def run(self):
+        try:
+            changes, token = external_changes(self.journal, self.known)
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.found.emit(changes, token)
+
+class EventLoopMonitor(QObject):
+    # Records how late a timer due every STALL_PROBE_MS fires: the time the
+    # event loop spent blocked, which is what users feel as lag.
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.last = time.perf_counter()
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.probe)
+        self.timer.start(STALL_PROBE_MS)
+
+    def probe(self):
+        now = time.perf_counter()
+        metrics.record("event_loop.stall", max(0.0, now - self.last - STALL_PROBE_MS / 1000))
+        self.last = now
+
+class MetricsOverlay(QLabel):
+    # p50/p99/max of every instrumented call, drawn over the window's
+    # corner. It ignores the mouse so the list under it stays usable.
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.setFont(QFont("Consolas", 9))
+        self.setStyleSheet("background: rgba(0, 0, 0, 190); color: #e5e5ea; padding: 8px; border-radius: 6px;")
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.hide()
+
+    def toggle(self):
+        if self.isVisible():
+            self.timer.stop()
+            self.hide()
+            return
+        self.refresh()
+        self.show()
+        self.raise_()
+        self.timer.start(OVERLAY_REFRESH_MS)
+
+    def refresh(self):
+        lines = [f"{'':<30} {'calls':>7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}"]
+        for name, s in metrics.summary().items():
+            lines.append(f"{name[-30:]:<30} {s['count']:>7} {s['p50_ms']:>8.2f} {s['p99_ms']:>8.2f} {s['max_ms']:>8.2f}")
+        lines.append(f"saved to {METRICS_FILE} on exit")
+        self.setText("\n".join(lines))
+        self.adjustSize()
+        self.move(self.parentWidget().width() - self.width() - 8, 8)
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, load=True):
         super().__init__()
         self.setWindowTitle("To-Do List")
         icon_path = "assets/note.png"
@@ -263,10 +1102,13 @@ class MainWindow(QMainWindow):
         self.top_bar = QHBoxLayout()
         self.top_bar.setSpacing(15)
 
-        self.segmented_switch = SegmentedControl(["All", "Personal", "Business"])
+        self.segmented_switch = SegmentedControl(["All", *CATEGORIES, *DUE_VIEWS])
         self.segmented_switch.selectionChanged.connect(self.on_segment_changed)
         self.v_layout.addWidget(QLabel("TASKS"), alignment=Qt.AlignLeft)
         self.top_bar.addWidget(self.segmented_switch)
+        self.sort_due_check = QCheckBox("Sort by due date")
+        self.sort_due_check.toggled.connect(self.refresh_task_list)
+        self.top_bar.addWidget(self.sort_due_check)
         self.top_bar.addStretch()
 
         self.search_icon_label = QLabel()
@@ -284,35 +1126,41 @@ class MainWindow(QMainWindow):
         self.search_box = QLineEdit()
         self.search_box.setPlaceholderText("Search tasks...")
         self.search_box.setFixedWidth(280)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.filter_task_list)
         self.search_box.returnPressed.connect(self.filter_task_list)
-        self.search_box.textChanged.connect(self.filter_task_list)
+        self.search_box.textChanged.connect(self.search_timer.start)
         self.top_bar.addWidget(self.search_box)
         self.top_bar.addSpacing(10)
 
         self.v_layout.addLayout(self.top_bar)
 
-        self.task_list = QListWidget()
+        self.task_model = TaskListModel(self)
+        self.task_model.page_loader = self.fetch_next_task_page
+        self.search_index = TaskSearchIndex()
+        self.task_proxy = TaskFilterProxyModel(self)
+        self.task_proxy.setSourceModel(self.task_model)
+
+        self.task_list = QListView()
+        self.task_list.setModel(self.task_proxy)
+        self.task_list.setItemDelegate(TaskItemDelegate(self.task_list))
+        self.task_list.setUniformItemSizes(True)
+        # QListView touches every row on relayout; batching spreads that over
+        # several event loop passes so large lists never freeze input.
+        self.task_list.setLayoutMode(QListView.Batched)
+        self.task_list.setBatchSize(500)
+        self.task_list.setVerticalScrollMode(QListView.ScrollPerPixel)
+        self.task_list.setSelectionMode(QListView.ExtendedSelection)
+        self.task_list.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.task_list.customContextMenuRequested.connect(self.show_task_menu)
         self.task_list.setStyleSheet("""
-            QListWidget {
+            QListView {
                 background: transparent;
                 border-radius: 12px;
                 padding: 12px;
-                font-size: 18px;
-                font-weight: 500;
-                color: #333;
-            }
-            QListWidget::item {
-                background: #fefefe;
-                border-radius: 12px;
-                margin: 8px 0;
-                padding: 20px 24px;
-                box-shadow: 0 6px 12px rgba(0,0,0,0.1);
-                transition: background-color 0.3s ease;
-            }
-            QListWidget::item:selected {
-                background: #007aff;
-                color: white;
-                box-shadow: 0 6px 14px rgba(0, 122, 255, 0.75);
+                border: none;
             }
         """)
         self.v_layout.addWidget(self.task_list, 1)
@@ -347,15 +1195,103 @@ class MainWindow(QMainWindow):
         self.delete_btn.clicked.connect(self.delete_task)
         self.buttons_layout.addWidget(self.delete_btn)
 
+        self.undo_btn = AnimatedPushButton("Undo")
+        self.undo_btn.setFixedHeight(44)
+        self.undo_btn.clicked.connect(self.undo)
+        self.buttons_layout.addWidget(self.undo_btn)
+
+        self.redo_btn = AnimatedPushButton("Redo")
+        self.redo_btn.setFixedHeight(44)
+        self.redo_btn.clicked.connect(self.redo)
+        self.buttons_layout.addWidget(self.redo_btn)
+
+        # The search box keeps its own text undo while it has focus.
+        QShortcut(QKeySequence.Undo, self, self.undo)
+        QShortcut(QKeySequence.Redo, self, self.redo)
+
+        self.import_btn = AnimatedPushButton("Import")
+        self.import_btn.setFixedHeight(44)
+        self.import_btn.clicked.connect(self.import_tasks)
+        self.buttons_layout.addWidget(self.import_btn)
+
+        self.export_btn = AnimatedPushButton("Export")
+        self.export_btn.setFixedHeight(44)
+        self.export_btn.clicked.connect(self.export_tasks)
+        self.buttons_layout.addWidget(self.export_btn)
+
         self.v_layout.addLayout(self.buttons_layout)
 
-        self.tasks = []
         self.current_category = "All"
         self.dark_mode = False
+        if SYNC_SERVER:
+            # Client mode: the server's task list stands in for the files.
+            from todo_sync import TaskSyncClient
+            self.journal = TaskSyncClient(SYNC_SERVER)
+        else:
+            self.journal = TaskJournal(TASKS_FILE, JOURNAL_FILE)
+        self.db = None if SYNC_SERVER else open_task_store()
+        self.page_cursor = None
+        if self.db is None:
+            self.task_proxy.search_index = self.search_index
+        self.save_worker = TaskSaveWorker(self.journal, STORAGE_MODE == "journal" or bool(SYNC_SERVER), self,
+                                          open_task_store if self.db is not None and STORAGE_MODE == "sqlite" else None)
+        self.save_worker.saveFinished.connect(self.on_save_finished)
+        self.save_worker.saveFailed.connect(self.on_save_failed)
+        self.save_worker.start()
+        self.reminders = ReminderScheduler(self)
+        self.reminders.remindersDue.connect(self.on_reminders_due)
+        # Today and Upcoming move on at midnight, whether or not a reminder
+        # fires then.
+        self.midnight_timer = QTimer(self)
+        self.midnight_timer.setSingleShot(True)
+        self.midnight_timer.setTimerType(Qt.VeryCoarseTimer)
+        self.midnight_timer.timeout.connect(self.on_midnight)
+        self.arm_midnight_timer()
+        self.history = UndoHistory()
+        self.update_history_buttons()
+        if METRICS_ENABLED:
+            self.stall_monitor = EventLoopMonitor(self)
+            self.metrics_overlay = MetricsOverlay(self.central_widget)
+            QShortcut(QKeySequence(Qt.Key_F12), self, self.metrics_overlay.toggle)
+        self.ringtone_effects = {}
+        self.file_watcher = None
+        self.sync_timer = None
+        self.change_scanner = None
+        # Bumped on every local edit, so a scan that raced one is discarded.
+        self.local_changes = 0
+        self.scan_started_at = 0
 
-        self.load_tasks()
         self.apply_light_mode()
-        self.refresh_task_list()
+        if load:
+            self.load_tasks()
+
+    @property
+    def tasks(self):
+        return self.task_model.tasks
+
+    def selected_task_id(self):
+        indexes = self.task_list.selectionModel().selectedIndexes()
+        if not indexes:
+            return None
+        return self.tasks[self.task_proxy.mapToSource(indexes[0]).row()].id
+
+    def selected_task_ids(self):
+        # Walks the selection ranges rather than selectedIndexes(), which would
+        # build an index object per row after a select-all.
+        proxy_rows = []
+        for selection_range in self.task_list.selectionModel().selection():
+            proxy_rows.extend(range(selection_range.top(), selection_range.bottom() + 1))
+        rows = self.task_proxy.rows
+        tasks = self.tasks
+        return [tasks[rows[row]].id for row in sorted(proxy_rows)]
+
+    def select_task(self, task_id):
+        if task_id not in self.task_model.by_id:
+            return
+        source_index = self.task_model.index(self.task_model.row_of(task_id))
+        proxy_index = self.task_proxy.mapFromSource(source_index)
+        if proxy_index.isValid():
+            self.task_list.setCurrentIndex(proxy_index)
 
     def on_segment_changed(self, text):
         self.current_category = text
@@ -364,89 +1300,531 @@ class MainWindow(QMainWindow):
     def add_task(self):
         dialog = TaskDialog(self)
         if dialog.exec_() == QDialog.Accepted:
-            new_task = dialog.get_task()
+            try:
+                new_task = dialog.get_task()
+            except ValueError as e:
+                QMessageBox.warning(self, "Invalid Input", f"Cannot repeat this task: {e}.")
+                return
             if not new_task.description:
                 QMessageBox.warning(self, "Invalid Input", "Task description cannot be empty.")
                 return
-            self.tasks.append(new_task)
-            self.save_tasks()
-            self.refresh_task_list()
+            # Unloaded SQLite pages are keyed by row id, so a new task there
+            # shows up through fetchMore once the user scrolls to it.
+            if self.db is None:
+                self.search_index.add(new_task)
+            self.reminders.task_changed(new_task)
+            if self.db is None or not self.task_model.has_more:
+                self.task_model.append_task(new_task)
+            self.remember("Add", [(None, new_task)])
+            self.record_change("add", new_task)
 
     def update_task(self):
-        selected_items = self.task_list.selectedItems()
-        if not selected_items:
+        task_id = self.selected_task_id()
+        if task_id is None:
             QMessageBox.warning(self, "No Selection", "Please select a task to update.")
             return
-        selected_index = self.task_list.row(selected_items[0])
-        filtered_tasks = self.get_filtered_tasks()
-        task_to_update = filtered_tasks[selected_index]
+        task_to_update = self.task_model.by_id[task_id]
 
         dialog = TaskDialog(self, task_to_update)
         if dialog.exec_() == QDialog.Accepted:
-            updated_task = dialog.get_task()
+            try:
+                updated_task = dialog.get_task()
+            except ValueError as e:
+                QMessageBox.warning(self, "Invalid Input", f"Cannot repeat this task: {e}.")
+                return
             if not updated_task.description:
                 QMessageBox.warning(self, "Invalid Input", "Task description cannot be empty.")
                 return
-            idx = self.tasks.index(task_to_update)
-            self.tasks[idx] = updated_task
-            self.save_tasks()
-            self.refresh_task_list()
+            if self.db is None:
+                self.search_index.update(updated_task)
+            self.reminders.task_changed(updated_task)
+            self.task_model.replace_task(updated_task)
+            # Sorted by due date the edit may have moved the row.
+            self.select_task(updated_task.id)
+            self.remember("Edit", [(task_to_update, updated_task)], coalesce=True)
+            self.record_change("update", updated_task)
 
     def delete_task(self):
-        selected_items = self.task_list.selectedItems()
-        if not selected_items:
+        task_ids = self.selected_task_ids()
+        if not task_ids:
             QMessageBox.warning(self, "No Selection", "Please select a task to delete.")
             return
-        selected_index = self.task_list.row(selected_items[0])
-        filtered_tasks = self.get_filtered_tasks()
-        task_to_delete = filtered_tasks[selected_index]
-        self.tasks.remove(task_to_delete)
-        self.save_tasks()
-        self.refresh_task_list()
+        if len(task_ids) > 1:
+            reply = QMessageBox.question(self, "Delete Tasks", f"Delete {len(task_ids)} tasks?")
+            if reply != QMessageBox.Yes:
+                return
+            self.apply_batch(removed_ids=task_ids, label="Delete")
+            return
+        task_id = task_ids[0]
+        task_to_delete = self.task_model.by_id[task_id]
+        if self.db is None:
+            self.search_index.remove(task_id)
+        self.reminders.task_removed(task_id)
+        self.task_model.remove_task(task_id)
+        self.remember("Delete", [(task_to_delete, None)])
+        self.record_change("delete", task_to_delete)
+
+    def show_task_menu(self, pos):
+        task_ids = self.selected_task_ids()
+        if not task_ids or not self.delete_btn.isEnabled():
+            return
+        menu = QMenu(self)
+        menu.addAction("Mark Done").triggered.connect(lambda: self.complete_tasks(task_ids))
+        menu.addSeparator()
+        for category in CATEGORIES:
+            action = menu.addAction(f"Move to {category}")
+            action.triggered.connect(lambda checked, c=category: self.recategorize_tasks(task_ids, c))
+        menu.addAction("Reschedule...").triggered.connect(lambda: self.reschedule_tasks(task_ids))
+        menu.addSeparator()
+        menu.addAction("Delete").triggered.connect(self.delete_task)
+        menu.exec_(self.task_list.viewport().mapToGlobal(pos))
+
+    def complete_tasks(self, task_ids):
+        # One-off tasks are removed; repeating ones move to their next
+        # occurrence, a single changed record however long the series.
+        updated, removed_ids = [], []
+        for task_id in task_ids:
+            task = complete_task(self.task_model.by_id[task_id])
+            if task is None:
+                removed_ids.append(task_id)
+            else:
+                updated.append(task)
+        self.apply_batch(updated, removed_ids, label="Mark Done")
+
+    def recategorize_tasks(self, task_ids, category):
+        by_id = self.task_model.by_id
+        self.apply_batch(updated=[
+            Task(t.description, t.date, t.time, t.ringtone, category, t.id, t.repeat)
+            for t in (by_id[task_id] for task_id in task_ids) if t.category != category
+        ], label=f"Move to {category}")
+
+    def reschedule_tasks(self, task_ids):
+        dialog = RescheduleDialog(self, len(task_ids))
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        date, time = dialog.get_schedule()
+        by_id = self.task_model.by_id
+        updated = []
+        skipped = []
+        for t in (by_id[task_id] for task_id in task_ids):
+            # What is left of a repeating task's series restarts from its
+            # first occurrence on or after the new date, as a newly entered
+            # rule would: a count keeps only the occurrences not yet done.
+            task_date, repeat = date, t.repeat
+            if repeat is not None:
+                count = repeat.count
+                if count is not None:
+                    done = sum(1 for _ in repeat.occurrences(end=t.date))
+                    count = max(count - done, 1)
+                try:
+                    repeat = RecurrenceRule.create(repeat.freq, date, repeat.interval, repeat.weekdays,
+                                                   repeat.until, count)
+                except ValueError as e:
+                    skipped.append(f"\"{t.description}\": {e}")
+                    continue
+                task_date = repeat.start
+            updated.append(Task(t.description, task_date, t.time if time is None else time, t.ringtone,
+                                t.category, t.id, repeat))
+        self.apply_batch(updated=updated, label="Reschedule")
+        if skipped:
+            QMessageBox.warning(self, "Invalid Input", "These tasks were not rescheduled:\n" + "\n".join(skipped))
+
+    def apply_batch(self, updated=(), removed_ids=(), added=(), record=True, label=None):
+        # Every index is brought up to date first, then the model emits one
+        # view update and the storage gets one save or transaction. Changes
+        # read back from another process are applied with record=False; a
+        # batch with a label can be undone as one step.
+        if not updated and not removed_ids and not added:
+            return
+        by_id = self.task_model.by_id
+        if label is not None:
+            self.remember(label, [(None, task) for task in added] +
+                          [(by_id[task.id], task) for task in updated] +
+                          [(by_id[task_id], None) for task_id in removed_ids])
+        if added and self.db is None:
+            self.search_index.add_many(added)
+        for task in added:
+            self.reminders.task_changed(task)
+        for task in updated:
+            if self.db is None:
+                self.search_index.update(task)
+            self.reminders.task_changed(task)
+        for task_id in removed_ids:
+            if self.db is None:
+                self.search_index.remove(task_id)
+            self.reminders.task_removed(task_id)
+        changes = [("add", task) for task in added]
+        changes += [("update", task) for task in updated]
+        changes += [("delete", by_id[task_id]) for task_id in removed_ids]
+        if updated:
+            self.task_model.replace_tasks(updated)
+        if removed_ids:
+            self.task_model.remove_tasks(removed_ids)
+        if added:
+            self.task_model.append_tasks(added)
+        if record:
+            self.record_changes(changes)
+
+    def remember(self, label, pairs, coalesce=False):
+        # pairs are (task before, task after), None where there is none.
+        if not self.history.push(TaskCommand.between(label, pairs, coalesce)):
+            self.statusBar().showMessage(f"{label} is too large to undo", 5000)
+        self.update_history_buttons()
+
+    def update_history_buttons(self):
+        step = self.history.next_undo()
+        self.undo_btn.setEnabled(step is not None)
+        self.undo_btn.setToolTip(f"Undo {step.label}" if step else "Nothing to undo")
+        step = self.history.next_redo()
+        self.redo_btn.setEnabled(step is not None)
+        self.redo_btn.setToolTip(f"Redo {step.label}" if step else "Nothing to redo")
+
+    def task_record(self, task_id):
+        task = self.find_task(task_id)
+        return task.to_dict() if task is not None else None
+
+    def undo(self):
+        command = self.history.undo()
+        if command is not None:
+            self.apply_records(command.undo_changes(self.task_record))
+            self.statusBar().showMessage(f"Undid {command.label}", 3000)
+        self.update_history_buttons()
+
+    def redo(self):
+        command = self.history.redo()
+        if command is not None:
+            self.apply_records(command.redo_changes(self.task_record))
+            self.statusBar().showMessage(f"Redid {command.label}", 3000)
+        self.update_history_buttons()
+
+    def apply_records(self, records):
+        # Journal-style ("put", task dict) / ("delete", task id) changes. Tasks
+        # a paged SQLite list has not loaded only go to the database.
+        by_id = self.task_model.by_id
+        paged = self.db is not None and self.task_model.has_more
+        updated, removed_ids, added, unloaded = [], [], [], []
+        for op, value in records:
+            if op == "delete":
+                if value in by_id:
+                    removed_ids.append(value)
+                else:
+                    self.reminders.task_removed(value)
+                    unloaded.append((op, value))
+                continue
+            task = Task.from_dict(value)
+            if task.id in by_id:
+                updated.append(task)
+            elif paged:
+                self.reminders.task_changed(task)
+                unloaded.append((op, value))
+            else:
+                added.append(task)
+        self.apply_batch(updated, removed_ids, added)
+        if unloaded:
+            self.save_records(unloaded)
 
+    @timed()
     def refresh_task_list(self):
-        self.task_list.clear()
-        filtered_tasks = self.get_filtered_tasks()
-        for task in filtered_tasks:
-            item = QListWidgetItem(str(task))
-            font = item.font()
-            font.setBold(True)
-            item.setFont(font)
-            self.task_list.addItem(item)
-
+        selected_id = self.selected_task_id()
+        if self.db is not None:
+            self.task_model.set_tasks(self.fetch_task_page())
+        self.task_proxy.set_filter(self.current_category, self.search_box.text(), self.sort_due_check.isChecked())
+        if selected_id is not None:
+            self.select_task(selected_id)
+
+    def wait_for_saves(self):
+        # SQLite mode saves on the worker's connection; a query on this one
+        # first lets those still queued through, so it sees them.
+        if self.save_worker.open_store is not None and not self.save_worker.is_idle():
+            self.save_worker.flush()
+
+    def fetch_task_page(self, after=None):
+        self.wait_for_saves()
+        segment = self.current_category
+        category = segment if segment in CATEGORIES else None
+        tasks, self.page_cursor = store_page(
+            self.db, category, self.search_box.text().strip(), PAGE_SIZE, after,
+            due_range_for(segment), self.sort_due_check.isChecked())
+        self.task_model.has_more = len(tasks) == PAGE_SIZE
+        return tasks
+
+    def fetch_next_task_page(self):
+        return self.fetch_task_page(self.page_cursor)
+
+    @timed()
     def get_filtered_tasks(self):
-        search_text = self.search_box.text().strip().lower()
-        if self.current_category == "All":
-            filtered = self.tasks
-        else:
-            filtered = [t for t in self.tasks if t.category == self.current_category]
-        if search_text:
-            filtered = [t for t in filtered if search_text in t.description.lower()]
-        return filtered
+        tasks = self.tasks
+        return [tasks[row] for row in self.task_proxy.rows]
 
     def filter_task_list(self):
+        self.search_timer.stop()
         self.refresh_task_list()
 
-    def save_tasks(self):
+    def record_change(self, op, task):
+        self.record_changes([(op, task)])
+
+    def record_changes(self, changes):
+        # changes is a list of ("add" | "update" | "delete", task).
+        self.save_records([("delete", task.id) if op == "delete" else ("put", task.to_dict())
+                           for op, task in changes])
+
+    def save_records(self, records):
+        self.local_changes += 1
+        if self.db is not None and self.save_worker.open_store is None:
+            # The binary store's indexes live in this process and answer the
+            # list's queries, so it takes each change here; appending to its
+            # journal is cheap.
+            try:
+                self.db.apply_changes(records)
+            except Exception as e:
+                self.on_save_failed(str(e))
+            return
+        self.save_worker.append_records(records)
+
+    def import_tasks(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Import Tasks", "", "Task files (*.csv *.ndjson *.jsonl);;All files (*)")
+        if not path:
+            return
+        import_format = format_for_path(path)
+        if import_format not in IMPORT_FORMATS:
+            QMessageBox.warning(self, "Import Error", "Choose a .csv, .ndjson or .jsonl file.")
+            return
+        try:
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                tasks = IMPORT_FORMATS[import_format](f)
+                if self.db is not None:
+                    self.wait_for_saves()
+                    added, skipped = self.db.import_records(task.to_dict() for task in tasks)
+                else:
+                    # Parse everything before touching the model so a bad row
+                    # leaves the list as it was.
+                    by_id = self.task_model.by_id
+                    new_tasks = {}
+                    skipped = 0
+                    for task in tasks:
+                        if task.id in by_id or task.id in new_tasks:
+                            skipped += 1
+                        else:
+                            new_tasks[task.id] = task
+                    new_tasks = list(new_tasks.values())
+                    added = len(new_tasks)
+        except Exception as e:
+            QMessageBox.warning(self, "Import Error", f"Error importing tasks: {e}")
+            return
+        if self.db is None and new_tasks:
+            self.search_index.add_many(new_tasks)
+            self.task_model.append_tasks(new_tasks)
+            self.record_changes([("add", task) for task in new_tasks])
+        elif self.db is not None:
+            self.refresh_task_list()
+        self.load_reminders()
+        self.statusBar().showMessage(f"Imported {added} tasks, skipped {skipped} already present", 5000)
+
+    def export_tasks(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export Tasks", "tasks.csv", "CSV (*.csv);;NDJSON (*.ndjson);;JSON (*.json)")
+        if not path:
+            return
+        if self.db is not None:
+            self.wait_for_saves()
+            tasks = iter_store_tasks(self.db)
+        else:
+            tasks = list(self.tasks)
         try:
-            with open(TASKS_FILE, "w", encoding="utf-8") as f:
-                data = [task.to_dict() for task in self.tasks]
-                json.dump(data, f, indent=4)
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                EXPORT_FORMATS[format_for_path(path, "csv")](tasks, f)
         except Exception as e:
-            QMessageBox.warning(self, "Save Error", f"Error saving tasks: {e}")
+            QMessageBox.warning(self, "Export Error", f"Error exporting tasks: {e}")
+            return
+        self.statusBar().showMessage(f"Exported tasks to {path}", 5000)
+
+    def on_save_finished(self):
+        self.statusBar().clearMessage()
+
+    def on_save_failed(self, message):
+        self.statusBar().showMessage(f"Error saving tasks: {message}")
+
+    def watch_for_changes(self):
+        if SYNC_SERVER and self.sync_timer is None:
+            self.sync_timer = QTimer(self)
+            self.sync_timer.setInterval(SYNC_POLL_MS)
+            self.sync_timer.timeout.connect(self.check_external_changes)
+            self.sync_timer.start()
+        elif not SYNC_SERVER and self.file_watcher is None:
+            self.file_watcher = TaskFileWatcher([TASKS_FILE, JOURNAL_FILE], self)
+            self.file_watcher.changed.connect(self.check_external_changes)
+
+    def schedule_change_check(self):
+        # Client mode polls again on its timer anyway.
+        if self.file_watcher is not None:
+            self.file_watcher.schedule()
+
+    def check_external_changes(self):
+        # Our own queued writes go first: they are merged on disk with the
+        # other process's, after which the scan sees only what it changed.
+        if self.change_scanner is not None or not self.save_worker.is_idle():
+            self.schedule_change_check()
+            return
+        self.scan_started_at = self.local_changes
+        self.change_scanner = TaskChangeScanner(self.journal, self.task_model.by_id, self)
+        self.change_scanner.found.connect(self.on_external_changes)
+        self.change_scanner.failed.connect(self.on_external_scan_failed)
+        self.change_scanner.finished.connect(self.change_scanner.deleteLater)
+        self.change_scanner.start()
+
+    def on_external_changes(self, changes, token):
+        self.change_scanner = None
+        if self.local_changes != self.scan_started_at:
+            self.schedule_change_check()
+            return
+        self.journal.synced = token
+        by_id = self.task_model.by_id
+        added, updated, removed_ids = [], [], []
+        for op, value in changes:
+            if op == "delete":
+                removed_ids.append(value)
+            elif value.id in by_id:
+                updated.append(value)
+            else:
+                added.append(value)
+        self.apply_batch(updated, removed_ids, added, record=False)
+        if changes:
+            self.statusBar().showMessage(f"Loaded {len(changes)} changes saved elsewhere", 5000)
+
+    def on_external_scan_failed(self, message):
+        self.change_scanner = None
+        if self.local_changes != self.scan_started_at:
+            # The task list changed under the scan; look again.
+            self.schedule_change_check()
+            return
+        self.statusBar().showMessage(f"Error reading changed tasks: {message}")
+
+    def shutdown(self):
+        if self.change_scanner is not None:
+            self.change_scanner.wait()
+        self.save_worker.stop()
+        self.journal.close()
+
+    def load_reminders(self):
+        last_checked = self.reminders.last_checked
+        if self.db is not None:
+            # Only repeating tasks need their whole record parsed.
+            since = datetime.date.fromtimestamp(last_checked)
+            self.wait_for_saves()
+            rows = self.db.schedule_since(since.isoformat())
+            schedule = ((uid, parse_date(date_str), parse_time(time_str)) for uid, date_str, time_str in rows)
+            schedule = (item for item in schedule if None not in item)
+            repeating = reminder_schedule(map(Task.from_dict, self.db.repeating()), last_checked)
+            self.reminders.load(chain(schedule, repeating))
+        else:
+            self.reminders.load(reminder_schedule(self.tasks, last_checked))
+
+    def find_task(self, task_id):
+        task = self.task_model.by_id.get(task_id)
+        if task is None and self.db is not None:
+            self.wait_for_saves()
+            data = self.db.get(task_id)
+            task = Task.from_dict(data) if data else None
+        return task
+
+    def play_ringtone(self, name):
+        path = os.path.join(RINGTONE_DIR, name.lower() + ".wav")
+        if QSoundEffect is None or not os.path.exists(path):
+            QApplication.beep()
+            return
+        effect = self.ringtone_effects.get(name)
+        if effect is None:
+            effect = QSoundEffect(self)
+            effect.setSource(QUrl.fromLocalFile(os.path.abspath(path)))
+            self.ringtone_effects[name] = effect
+        effect.play()
+
+    def arm_midnight_timer(self):
+        # A second past the next local midnight, so the date has turned by
+        # the time it fires.
+        midnight = datetime.datetime.combine(datetime.date.today() + datetime.timedelta(days=1), datetime.time())
+        self.midnight_timer.start(int((midnight.timestamp() - time.time()) * 1000) + 1000)
+
+    def on_midnight(self):
+        if self.current_category in DUE_VIEWS:
+            self.refresh_task_list()
+        self.arm_midnight_timer()
 
+    def on_reminders_due(self, task_ids):
+        if self.current_category in DUE_VIEWS:
+            # Overdue and Today are relative to now; a reminder firing means
+            # some task just crossed that line.
+            self.refresh_task_list()
+        tasks = [task for task in map(self.find_task, task_ids) if task is not None]
+        for task in tasks:
+            if task.repeat is not None:
+                self.reminders.task_changed(task)
+        if not tasks:
+            return
+        self.play_ringtone(tasks[0].ringtone)
+        lines = [str(task) for task in tasks[:10]]
+        if len(tasks) > 10:
+            lines.append(f"... and {len(tasks) - 10} more")
+        box = QMessageBox(self)
+        box.setWindowTitle("Reminder")
+        box.setIcon(QMessageBox.Information)
+        box.setText("\n".join(lines))
+        snooze_btn = box.addButton(f"Snooze {SNOOZE_MINUTES} min", QMessageBox.ActionRole)
+        box.addButton("Dismiss", QMessageBox.RejectRole)
+        ids = [task.id for task in tasks]
+        box.buttonClicked.connect(
+            lambda btn: self.reminders.snooze(ids) if btn is snooze_btn else None)
+        box.setAttribute(Qt.WA_DeleteOnClose)
+        box.setModal(False)
+        box.show()
+
+    @timed()
     def load_tasks(self):
-        if not os.path.exists(TASKS_FILE):
+        if self.db is not None:
+            try:
+                self.db.migrate_from_json(TASKS_FILE, JOURNAL_FILE)
+            except Exception as e:
+                QMessageBox.warning(self, "Load Error", f"Error migrating tasks: {e}")
+            self.finish_loading(None)
             return
+        self.begin_loading()
+        search_index = TaskSearchIndex()
         try:
-            with open(TASKS_FILE, "r", encoding="utf-8") as f:
-                data_list = json.load(f)
-                self.tasks = []
-                for data in data_list:
-                    task = Task.from_dict(data)
-                    self.tasks.append(task)
+            for batch in iter_task_batches(self.journal):
+                search_index.add_many(batch)
+                self.append_loaded_tasks(batch)
         except Exception as e:
             QMessageBox.warning(self, "Load Error", f"Error loading tasks: {e}")
+            self.task_model.set_tasks([])
+            search_index = TaskSearchIndex()
+        self.finish_loading(search_index)
+
+    def begin_loading(self):
+        # Until the search index arrives the proxy scans descriptions
+        # directly, and editing waits so nothing races the incoming batches.
+        for button in (self.add_btn, self.update_btn, self.delete_btn, self.import_btn, self.export_btn):
+            button.setEnabled(False)
+        if self.db is None:
+            self.task_proxy.search_index = None
+            self.task_model.set_tasks([])
+
+    def append_loaded_tasks(self, tasks):
+        self.task_model.append_tasks(tasks)
+
+    def finish_loading(self, search_index):
+        if self.db is None:
+            self.search_index = search_index
+            self.task_proxy.search_index = search_index
+        self.refresh_task_list()
+        self.load_reminders()
+        for button in (self.add_btn, self.update_btn, self.delete_btn, self.import_btn, self.export_btn):
+            button.setEnabled(True)
+        if self.db is None:
+            self.journal.synced = self.journal.read_token
+            self.watch_for_changes()
+        if self.journal.ids_assigned:
+            self.save_worker.rewrite()
 
     def apply_light_mode(self):
         self.setStyleSheet("""
@@ -573,15 +1951,59 @@ def main():
     splash_label.show()
     app.processEvents()
 
+    logging.basicConfig(level=os.environ.get("TODO_LOG_LEVEL", "WARNING"))
+    window = MainWindow(load=False)
+    app.main_window = window
+    loader = TaskLoader(window.journal, window)
+    startup = {"ready": False, "shown": False, "splash_done": MIN_SPLASH_MS <= 0, "loaded_at": None}
+
+    def report_startup():
+        app.startup_ms = (time.perf_counter() - STARTUP_T0) * 1000
+        logger.info("startup: first interactive frame after %.1f ms", app.startup_ms)
+
     def show_main():
+        # The window appears with the first screenful; later batches keep
+        # streaming into the model behind it.
+        if startup["shown"] or not startup["ready"] or not startup["splash_done"]:
+            return
+        startup["shown"] = True
         splash_label.close()
-        window = MainWindow()
         window.show()
-        app.main_window = window
-
-    QTimer.singleShot(2000, show_main)
-
-    sys.exit(app.exec_())
+        QTimer.singleShot(0, report_startup)
+
+    def on_batch_loaded(tasks):
+        window.append_loaded_tasks(tasks)
+        startup["ready"] = True
+        show_main()
+
+    def on_loaded(search_index):
+        startup["loaded_at"] = (time.perf_counter() - STARTUP_T0) * 1000
+        logger.info("startup: %d tasks loaded after %.1f ms", len(window.tasks), startup["loaded_at"])
+        window.finish_loading(search_index)
+        startup["ready"] = True
+        show_main()
+
+    def on_load_failed(message):
+        QMessageBox.warning(None, "Load Error", f"Error loading tasks: {message}")
+        window.task_model.set_tasks([])
+        on_loaded(TaskSearchIndex())
+
+    def on_splash_done():
+        startup["splash_done"] = True
+        show_main()
+
+    window.begin_loading()
+    loader.batchLoaded.connect(on_batch_loaded)
+    loader.loaded.connect(on_loaded)
+    loader.failed.connect(on_load_failed)
+    loader.start()
+    if MIN_SPLASH_MS > 0:
+        QTimer.singleShot(MIN_SPLASH_MS, on_splash_done)
+
+    exit_code = app.exec_()
+    loader.wait()
+    window.shutdown()
+    sys.exit(exit_code)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
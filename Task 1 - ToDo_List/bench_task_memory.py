@@ -0,0 +1,97 @@
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import time
+
+from PyQt5.QtCore import QDate, QTime
+
+from todo_core import Task
+
+
+class QtTask:
+    # The layout Task had before it went compact: a plain instance dict
+    # holding live QDate/QTime wrappers and per-row category/ringtone strings.
+    def __init__(self, description, date, time, ringtone, category, task_id):
+        self.id = task_id
+        self.description = description
+        self.date = date
+        self.time = time
+        self.ringtone = ringtone
+        self.category = category
+
+    @staticmethod
+    def from_dict(data):
+        date = QDate.fromString(data["date"], "yyyy-MM-dd")
+        time = QTime.fromString(data["time"], "HH:mm")
+        return QtTask(data["description"], date, time, data["ringtone"], data["category"], data["id"])
+
+
+LAYOUTS = {"qt": QtTask, "compact": Task}
+
+
+def rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def sample_row(i):
+    # json.loads hands back fresh string objects per row, just like loading tasks.json.
+    return json.dumps({
+        "id": f"{i:032x}",
+        "description": f"Task number {i}",
+        "date": f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+        "time": f"{i % 24:02d}:{i % 60:02d}",
+        "ringtone": ("Chime", "Ripple", "Glass", "Bell", "Digital")[i % 5],
+        "category": ("Personal", "Business")[i % 2],
+    })
+
+
+def measure(layout, count):
+    cls = LAYOUTS[layout]
+    rows = [sample_row(i) for i in range(count)]
+    gc.collect()
+    before = rss_bytes()
+    start = time.perf_counter()
+    tasks = [cls.from_dict(json.loads(row)) for row in rows]
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    used = rss_bytes() - before
+    return {
+        "layout": layout,
+        "count": len(tasks),
+        "bytes": used,
+        "bytes_per_task": used / count,
+        "build_seconds": round(elapsed, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare memory used by task layouts.")
+    parser.add_argument("count", nargs="?", type=int, default=1_000_000)
+    parser.add_argument("--layout", choices=sorted(LAYOUTS))
+    args = parser.parse_args()
+
+    if args.layout:
+        print(json.dumps(measure(args.layout, args.count)))
+        return
+
+    # Each layout runs in a fresh interpreter so freed arenas do not skew RSS.
+    results = []
+    for layout in ("qt", "compact"):
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), str(args.count), "--layout", layout],
+            check=True, capture_output=True, text=True,
+            env=dict(os.environ, QT_QPA_PLATFORM="offscreen"))
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    for r in results:
+        print(f"{r['layout']:>8}: {r['bytes'] / 2**20:8.1f} MiB  "
+              f"{r['bytes_per_task']:6.1f} B/task  built in {r['build_seconds']:.2f} s")
+    print(f"compact layout uses {results[1]['bytes'] / results[0]['bytes']:.0%} of the Qt layout")
+
+
+if __name__ == "__main__":
+    main()
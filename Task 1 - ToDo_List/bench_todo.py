@@ -0,0 +1,282 @@
+import argparse
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+MODES = ("json", "journal", "sqlite", "binary")
+WORDS = ("meeting", "call", "review", "report", "invoice", "groceries", "gym", "dentist",
+         "plan", "email", "launch", "budget", "draft", "follow up", "pay", "book")
+# What a user types into the search box, one keystroke at a time.
+KEYSTROKES = ("r", "re", "rev", "revi", "review", "review 1", "review 12")
+# A timing this many times slower than the baseline counts as a regression.
+REGRESSION_RATIO = 1.5
+# Steps this short mostly measure repaints and scheduling; never flagged.
+MIN_COMPARED_MS = 20.0
+
+
+def peak_rss_mb():
+    # Peak resident set size of this process so far; None where unsupported.
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def sample_tasks(count, seed=0):
+    # Deterministic tasks spread two months either side of today, so the due
+    # views and searches select similar shares at every size.
+    rng = random.Random(seed)
+    today = datetime.date.today().toordinal()
+    for i in range(count):
+        yield {
+            "id": f"{i:032x}",
+            "description": f"{rng.choice(WORDS)} {i}",
+            "date": datetime.date.fromordinal(today + rng.randint(-60, 60)).isoformat(),
+            "time": f"{rng.randrange(24):02d}:{rng.randrange(0, 60, 5):02d}",
+            "ringtone": ("Chime", "Ripple", "Glass", "Bell", "Digital")[i % 5],
+            "category": ("Personal", "Business")[i % 2],
+        }
+
+
+def write_tasks(count, mode):
+    # Task files in the current folder, as the GUI in `mode` expects them.
+    from todo_binary import write_binary
+    from todo_core import TASKS_FILE, DB_FILE, BINARY_FILE
+    from todo_storage import SQLiteTaskStore, write_json_array
+
+    if mode == "binary":
+        write_binary(BINARY_FILE, sample_tasks(count))
+        return
+    if mode == "sqlite":
+        db = SQLiteTaskStore(DB_FILE)
+        db.import_records(sample_tasks(count))
+        db.close()
+        return
+    with open(TASKS_FILE, "w", encoding="utf-8") as f:
+        write_json_array(f, sample_tasks(count))
+
+
+class Bench:
+    def __init__(self, app):
+        self.app = app
+        self.timings = {}
+        self.memory = {}
+
+    def settle(self):
+        # Lets queued signals and deferred slots run, as between user actions.
+        for _ in range(3):
+            self.app.processEvents()
+
+    def time(self, name, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        self.settle()
+        self.timings[name] = round((time.perf_counter() - start) * 1000, 2)
+        self.memory[name] = peak_rss_mb()
+        return result
+
+
+def run(count, mode):
+    # One measurement in a fresh interpreter whose working folder holds the
+    # generated tasks; prints a single JSON object.
+    started = time.perf_counter()
+    write_tasks(count, mode)
+    generated_s = time.perf_counter() - started
+
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication([])
+    import ToDo_List as gui
+    from todo_core import Task, CATEGORIES, DUE_VIEWS
+
+    bench = Bench(app)
+    state = {}
+
+    def startup():
+        # The same sequence main() runs, timed to the first rows on screen
+        # and to the end of loading.
+        start = time.perf_counter()
+        window = gui.MainWindow(load=False)
+        loader = gui.TaskLoader(window.journal, window)
+
+        def on_batch(tasks):
+            window.append_loaded_tasks(tasks)
+            state.setdefault("first_rows_ms", (time.perf_counter() - start) * 1000)
+
+        def on_loaded(search_index):
+            window.finish_loading(search_index)
+            state["loaded"] = True
+
+        window.begin_loading()
+        loader.batchLoaded.connect(on_batch)
+        loader.loaded.connect(on_loaded)
+        loader.failed.connect(lambda message: sys.exit(f"load failed: {message}"))
+        loader.start()
+        while not state.get("loaded"):
+            app.processEvents()
+            time.sleep(0.001)
+        loader.wait()
+        window.show()
+        return window
+
+    window = bench.time("startup", startup)
+    bench.timings["startup_first_rows"] = round(state.get("first_rows_ms", bench.timings["startup"]), 2)
+
+    for n, text in enumerate(KEYSTROKES):
+        window.search_box.setText(text)
+        bench.time(f"search_key_{n + 1}", window.filter_task_list)
+    window.search_box.setText("")
+    bench.time("search_clear", window.filter_task_list)
+
+    for segment in ("All", *CATEGORIES, *DUE_VIEWS):
+        bench.time(f"segment_{segment.lower()}", window.on_segment_changed, segment)
+    bench.time("segment_all", window.on_segment_changed, "All")
+    window.sort_due_check.setChecked(True)
+    bench.time("sort_by_due", window.refresh_task_list)
+    window.sort_due_check.setChecked(False)
+    bench.time("refresh", window.refresh_task_list)
+    bench.time("filtered_tasks", window.get_filtered_tasks)
+
+    first = window.tasks[0]
+    new = Task("benchmark task", first.date, first.time, "Chime", "Personal")
+    bench.time("add", window.apply_batch, (), (), [new], True, "Add")
+    bench.time("save_after_add", window.save_worker.flush)
+    edited = Task("benchmark task edited", first.date + 1, first.time, "Bell", "Business", new.id)
+    bench.time("edit", window.apply_batch, [edited], (), (), True, "Edit")
+    bench.time("save_after_edit", window.save_worker.flush)
+    bench.time("delete", window.apply_batch, (), [new.id], (), True, "Delete")
+    bench.time("save_after_delete", window.save_worker.flush)
+    bench.time("undo", window.undo)
+    bench.time("save_after_undo", window.save_worker.flush)
+
+    window.shutdown()
+    return {
+        "mode": mode,
+        "count": count,
+        "generate_seconds": round(generated_s, 2),
+        "timings_ms": bench.timings,
+        "peak_rss_mb": bench.memory,
+    }
+
+
+def git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_child(count, mode):
+    # Each size gets its own interpreter and folder, so memory peaks and
+    # file caches from one run never leak into the next, and reminder
+    # settings land in a throwaway config folder.
+    with tempfile.TemporaryDirectory() as folder:
+        env = dict(os.environ, QT_QPA_PLATFORM="offscreen", TODO_STORAGE=mode, XDG_CONFIG_HOME=folder)
+        env.pop("TODO_SERVER", None)
+        env["PYTHONPATH"] = os.pathsep.join(
+            filter(None, (os.path.dirname(os.path.abspath(__file__)), env.get("PYTHONPATH"))))
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", str(count), "--mode", mode],
+            check=True, capture_output=True, text=True, cwd=folder, env=env)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def best_of(runs):
+    # The fastest time and smallest peak of each step: slower runs measure
+    # whatever else the machine was doing.
+    best = dict(runs[0], runs=len(runs))
+    for key in ("timings_ms", "peak_rss_mb"):
+        best[key] = {name: min((r[key][name] for r in runs), key=lambda v: float("inf") if v is None else v)
+                     for name in runs[0][key]}
+    return best
+
+
+def compare(results, baseline, threshold=REGRESSION_RATIO):
+    # Pairs runs by (mode, count) and lists timings that slowed down past
+    # `threshold`. Returns the regressions found.
+    previous = {(r["mode"], r["count"]): r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        old = previous.get((r["mode"], r["count"]))
+        if old is None:
+            continue
+        for name, ms in r["timings_ms"].items():
+            before = old["timings_ms"].get(name)
+            if before is None or max(ms, before) < MIN_COMPARED_MS:
+                continue
+            ratio = ms / max(before, 0.01)
+            if ratio > threshold:
+                regressions.append((r["mode"], r["count"], name, before, ms, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time startup, search, segment switches and edits of the To-Do List GUI, headless.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES),
+                        help="task counts to generate (default: 1k 10k 100k 1M)")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=["json"])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per size, best kept (default: 3)")
+    parser.add_argument("-o", "--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", metavar="FILE",
+                        help="earlier results to compare with; exits 1 if anything regressed")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_RATIO,
+                        help=f"slowdown ratio that counts as a regression (default: {REGRESSION_RATIO})")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(run(args.child, args.mode)))
+        return 0
+
+    results = []
+    for mode in args.modes:
+        for count in args.sizes:
+            r = best_of([run_child(count, mode) for _ in range(max(1, args.repeat))])
+            results.append(r)
+            t = r["timings_ms"]
+            print(f"{mode:>7} {count:>9,}: startup {t['startup']:9.1f} ms  "
+                  f"search {max(v for k, v in t.items() if k.startswith('search_key')):8.1f} ms  "
+                  f"segment {max(v for k, v in t.items() if k.startswith('segment_')):8.1f} ms  "
+                  f"edit+save {t['edit'] + t['save_after_edit']:7.1f} ms  "
+                  f"peak {max(filter(None, r['peak_rss_mb'].values()), default=0):7.1f} MiB",
+                  file=sys.stderr)
+
+    report = {
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for mode, count, name, before, after, ratio in regressions:
+            print(f"regression: {mode} {count:,} {name}: {before:.1f} -> {after:.1f} ms ({ratio:.2f}x)",
+                  file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+import argparse
+import csv
+import os
+import sys
+
+from todo_core import (
+    Task, TaskRepository, CATEGORIES, DUE_VIEWS, RINGTONES, EXPORT_FORMATS, IMPORT_FORMATS,
+    today_ordinal, now_minutes, parse_date, parse_time, format_date, format_time, format_for_path,
+    iter_agenda
+)
+from todo_binary import convert
+from todo_recurrence import FREQUENCIES, RecurrenceRule, parse_weekdays
+
+
+def print_tasks(tasks):
+    for task in tasks:
+        print(f"{task.id[:8]}  {task.category:<8}  {task}")
+
+
+def cmd_list(repo, args):
+    view = args.due.capitalize() if args.due else None
+    print_tasks(repo.iter_tasks(args.category, args.search, view, args.sort == "due"))
+
+
+def cmd_search(repo, args):
+    print_tasks(repo.iter_tasks(args.category, args.query))
+
+
+def parse_repeat(args, date):
+    if args.repeat is None:
+        if args.every != 1 or args.on or args.until or args.count:
+            raise ValueError("--every, --on, --until and --count need --repeat")
+        return None
+    if args.on and args.repeat != "weekly":
+        raise ValueError("--on only applies to --repeat weekly")
+    until = None
+    if args.until is not None:
+        until = parse_date(args.until)
+        if until is None:
+            raise ValueError(f"invalid date {args.until!r}, expected YYYY-MM-DD")
+    weekdays = parse_weekdays(args.on) if args.on else ()
+    return RecurrenceRule.create(args.repeat, date, args.every, weekdays, until, args.count)
+
+
+def cmd_add(repo, args):
+    date = today_ordinal() if args.date is None else parse_date(args.date)
+    if date is None:
+        raise ValueError(f"invalid date {args.date!r}, expected YYYY-MM-DD")
+    time = now_minutes() if args.time is None else parse_time(args.time)
+    if time is None:
+        raise ValueError(f"invalid time {args.time!r}, expected HH:MM")
+    description = args.description.strip()
+    if not description:
+        raise ValueError("task description cannot be empty")
+    repeat = parse_repeat(args, date)
+    if repeat is not None:
+        # The first occurrence may fall after --date (weekly on other days).
+        date = repeat.start
+    task = Task(description, date, time, args.ringtone, args.category, repeat=repeat)
+    repo.put(task)
+    print(task.id)
+
+
+def cmd_done(repo, args):
+    # Tasks have no completed state; finishing one removes it, as in the GUI.
+    # A repeating task moves on to its next occurrence instead.
+    task_ids = [repo.resolve(prefix) for prefix in args.ids]
+    for task_id, task in repo.complete(task_ids).items():
+        if task is not None:
+            print(f"{task_id[:8]}  next due {format_date(task.date)} {format_time(task.time)}")
+
+
+def cmd_agenda(repo, args):
+    start = today_ordinal() if args.start is None else parse_date(args.start)
+    if start is None:
+        raise ValueError(f"invalid date {args.start!r}, expected YYYY-MM-DD")
+    for date, task in iter_agenda(repo.iter_tasks(args.category), start, start + args.days):
+        print(f"{format_date(date)} {format_time(task.time)}  {task.id[:8]}  {task.description}")
+
+
+def cmd_export(repo, args):
+    tasks = repo.iter_tasks(args.category)
+    if args.output is None:
+        EXPORT_FORMATS[args.format or "json"](tasks, sys.stdout)
+        return
+    export_format = args.format or format_for_path(args.output, "json")
+    with open(args.output, "w", encoding="utf-8", newline="") as f:
+        EXPORT_FORMATS[export_format](tasks, f)
+
+
+def cmd_import(repo, args):
+    import_format = args.format or format_for_path(args.file)
+    if import_format not in IMPORT_FORMATS:
+        raise ValueError(f"cannot tell the format of {args.file!r}; pass --format")
+    with open(args.file, "r", encoding="utf-8", newline="") as f:
+        added, skipped = repo.import_tasks(IMPORT_FORMATS[import_format](f))
+    print(f"imported {added} tasks, skipped {skipped} already present")
+
+
+def cmd_convert(repo, args):
+    count = convert(args.source, args.target)
+    print(f"converted {count} tasks to {args.target}")
+
+
+def cmd_serve(repo, args):
+    # Imported here so the other commands start without asyncio.
+    import asyncio
+    from todo_sync import serve
+
+    def started(port, count):
+        print(f"serving {count} tasks on http://{args.host}:{port}/", flush=True)
+
+    try:
+        asyncio.run(serve(repo, args.host, args.port, started))
+    except KeyboardInterrupt:
+        pass
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="todo", description="Manage To-Do List tasks without the GUI.")
+    parser.add_argument("-C", "--directory", default=os.environ.get("TODO_DIR", "."),
+                        help="folder holding the task files (default: $TODO_DIR or the current folder)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = commands.add_parser("list", help="list tasks")
+    list_parser.add_argument("--category", choices=CATEGORIES)
+    list_parser.add_argument("--search", default="", help="only tasks whose description contains this text")
+    list_parser.add_argument("--due", choices=[view.lower() for view in DUE_VIEWS],
+                             help="only tasks due today, after today, or before now")
+    list_parser.add_argument("--sort", choices=("added", "due"), default="added")
+    list_parser.set_defaults(handler=cmd_list)
+
+    add_parser = commands.add_parser("add", help="add a task and print its id")
+    add_parser.add_argument("description")
+    add_parser.add_argument("--date", help="YYYY-MM-DD (default: today)")
+    add_parser.add_argument("--time", help="HH:MM (default: now)")
+    add_parser.add_argument("--category", choices=CATEGORIES, default="Personal")
+    add_parser.add_argument("--ringtone", choices=RINGTONES, default="Chime")
+    add_parser.add_argument("--repeat", choices=FREQUENCIES, help="make the task recur from --date on")
+    add_parser.add_argument("--every", type=int, default=1, metavar="N",
+                            help="repeat every N days, weeks or months (default: 1)")
+    add_parser.add_argument("--on", metavar="DAYS", help="weekdays for --repeat weekly, e.g. mon,wed,fri")
+    add_parser.add_argument("--until", metavar="DATE", help="last possible date, YYYY-MM-DD")
+    add_parser.add_argument("--count", type=int, metavar="N", help="stop after N occurrences")
+    add_parser.set_defaults(handler=cmd_add)
+
+    done_parser = commands.add_parser("done", help="finish tasks by id or id prefix")
+    done_parser.add_argument("ids", nargs="+")
+    done_parser.set_defaults(handler=cmd_done)
+
+    agenda_parser = commands.add_parser("agenda", help="list every occurrence due in the coming days")
+    agenda_parser.add_argument("--from", dest="start", metavar="DATE", help="YYYY-MM-DD (default: today)")
+    agenda_parser.add_argument("--days", type=int, default=7, help="how many days to cover (default: 7)")
+    agenda_parser.add_argument("--category", choices=CATEGORIES)
+    agenda_parser.set_defaults(handler=cmd_agenda)
+
+    search_parser = commands.add_parser("search", help="find tasks by description")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--category", choices=CATEGORIES)
+    search_parser.set_defaults(handler=cmd_search)
+
+    export_parser = commands.add_parser("export", help="write all tasks as JSON, NDJSON or CSV")
+    export_parser.add_argument("--format", choices=sorted(EXPORT_FORMATS),
+                               help="default: from the output file extension, else json")
+    export_parser.add_argument("--category", choices=CATEGORIES)
+    export_parser.add_argument("-o", "--output", help="file to write (default: stdout)")
+    export_parser.set_defaults(handler=cmd_export)
+
+    import_parser = commands.add_parser("import", help="add tasks from a CSV or NDJSON file")
+    import_parser.add_argument("file")
+    import_parser.add_argument("--format", choices=sorted(IMPORT_FORMATS),
+                               help="default: from the file extension")
+    import_parser.set_defaults(handler=cmd_import)
+
+    convert_parser = commands.add_parser("convert", help="convert a task file between JSON and the binary format")
+    convert_parser.add_argument("source", help="a .json or .tdb task file")
+    convert_parser.add_argument("target", help="the file to create, .tdb or .json")
+    convert_parser.set_defaults(handler=cmd_convert)
+
+    serve_parser = commands.add_parser("serve", help="share the tasks with GUIs on other desktops over HTTP")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    serve_parser.add_argument("--port", type=int, default=8765, help="default: 8765; 0 picks a free port")
+    serve_parser.set_defaults(handler=cmd_serve)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    repo = TaskRepository(args.directory)
+    try:
+        args.handler(repo, args)
+    except BrokenPipeError:
+        # Output piped into head and the like; the reader is gone.
+        sys.stderr.close()
+        return 0
+    except (LookupError, ValueError, OSError, csv.Error) as e:
+        print(f"todo: {e}", file=sys.stderr)
+        return 1
+    finally:
+        repo.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
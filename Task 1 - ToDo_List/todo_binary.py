@@ -0,0 +1,604 @@
+import datetime
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left, bisect_right
+from heapq import merge
+
+from todo_storage import FileLock, TaskJournal, file_stamp, read_journal_tail, write_json_array
+
+# File layout, all little-endian:
+#   header       magic, version, record count, then the offset and length of
+#                the names table and the string heap and the offset of each
+#                column below
+#   names        JSON array of the category and ringtone names in use
+#   columns      one fixed-width array per field, each starting on an
+#                8-byte boundary
+#   heap         per record, its id, description and repeat rule (JSON)
+#                back to back as UTF-8
+# Filters and sorting read only the fixed-width columns; a record's strings
+# are decoded when the record itself is asked for. due_order and id_order
+# are permutations of the rows sorted by (date, time, rowid) and by id, so
+# due ranges and id lookups are bisections of the mapped file.
+MAGIC = b"TODOTDB\0"
+VERSION = 1
+COLUMNS = (
+    ("rowid", "I"),
+    ("date", "I"),
+    ("time", "H"),
+    ("category", "H"),
+    ("ringtone", "H"),
+    ("heap", "Q"),
+    ("id_len", "H"),
+    ("desc_len", "I"),
+    ("repeat_len", "I"),
+    ("due_order", "I"),
+    ("id_order", "I"),
+)
+HEADER = struct.Struct("<8sHHQ" + "Q" * (4 + len(COLUMNS)))
+# Journal size past which the journal is folded into a new binary file.
+COMPACT_BYTES = 4 * 1024 * 1024
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _fields(data):
+    # (id, description, date ordinal, minutes, ringtone, category, repeat
+    # JSON or b"") of a record as Task.to_dict() writes it. A date or time
+    # the format cannot hold raises rather than being changed.
+    task_id = data["id"]
+    try:
+        date = datetime.date.fromisoformat(data["date"]).toordinal()
+        hours, minutes = data["time"].split(":")
+        minutes = int(hours) * 60 + int(minutes)
+    except (AttributeError, KeyError, TypeError, ValueError):
+        raise ValueError(f"task {task_id}: cannot store date {data.get('date')!r} "
+                         f"and time {data.get('time')!r}") from None
+    if data.get("time") != f"{minutes // 60:02d}:{minutes % 60:02d}":
+        raise ValueError(f"task {task_id}: cannot store time {data['time']!r}")
+    repeat = data.get("repeat")
+    repeat = b"" if repeat is None else json.dumps(repeat, separators=(",", ":")).encode("utf-8")
+    return (task_id, data.get("description", ""), date, minutes,
+            data.get("ringtone", "Chime"), data.get("category", "Personal"), repeat)
+
+
+def write_rows(path, rows):
+    # rows yields (rowid, task dict) in rowid order. Written to a temporary
+    # file and renamed over `path`. Returns the number of records.
+    names = {}
+    columns = {name: array(code) for name, code in COLUMNS}
+    ids = []
+    with tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(path))) as heap:
+        heap_len = 0
+        for rowid, data in rows:
+            task_id, description, date, minutes, ringtone, category, repeat = _fields(data)
+            id_bytes = task_id.encode("utf-8")
+            desc_bytes = description.encode("utf-8")
+            columns["rowid"].append(rowid)
+            columns["date"].append(date)
+            columns["time"].append(minutes)
+            columns["category"].append(names.setdefault(category, len(names)))
+            columns["ringtone"].append(names.setdefault(ringtone, len(names)))
+            columns["heap"].append(heap_len)
+            columns["id_len"].append(len(id_bytes))
+            columns["desc_len"].append(len(desc_bytes))
+            columns["repeat_len"].append(len(repeat))
+            heap.write(id_bytes + desc_bytes + repeat)
+            heap_len += len(id_bytes) + len(desc_bytes) + len(repeat)
+            ids.append(task_id)
+        count = len(ids)
+        if len(names) > 0xFFFF:
+            raise ValueError("too many distinct categories and ringtones")
+        dates, times, rowids = columns["date"], columns["time"], columns["rowid"]
+        columns["due_order"].extend(sorted(range(count), key=lambda i: (dates[i], times[i], rowids[i])))
+        columns["id_order"].extend(sorted(range(count), key=ids.__getitem__))
+        del ids
+
+        names_bytes = json.dumps(list(names)).encode("utf-8")
+        offset = HEADER.size
+        names_offset = offset
+        offset = _align(offset + len(names_bytes))
+        column_offsets = []
+        for name, code in COLUMNS:
+            column_offsets.append(offset)
+            offset = _align(offset + columns[name].itemsize * count)
+        heap_offset = offset
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0, count, names_offset, len(names_bytes),
+                                heap_offset, heap_len, *column_offsets))
+            f.write(names_bytes)
+            for (name, code), column_offset in zip(COLUMNS, column_offsets):
+                f.write(b"\0" * (column_offset - f.tell()))
+                column = columns[name]
+                if sys.byteorder != "little":
+                    column.byteswap()
+                f.write(column.tobytes())
+            f.write(b"\0" * (heap_offset - f.tell()))
+            heap.seek(0)
+            shutil.copyfileobj(heap, f)
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return count
+
+
+def write_binary(path, records):
+    # Task dicts in order, e.g. TaskJournal.iter_records() of a JSON store.
+    return write_rows(path, enumerate(records, 1))
+
+
+def convert(source, target):
+    # Between a JSON task file (with the journal beside it, if any) and a
+    # binary one, by extension. Order, ids and every task field come through
+    # unchanged. Returns the number of tasks written.
+    to_binary = target.lower().endswith(".tdb")
+    if to_binary == source.lower().endswith(".tdb"):
+        raise ValueError("convert from a .json task file to a .tdb one, or back")
+    if not os.path.exists(source):
+        raise FileNotFoundError(f"no such file: {source!r}")
+    if os.path.exists(target):
+        raise FileExistsError(f"{target!r} exists; remove it first")
+    if to_binary:
+        return write_binary(target, TaskJournal(source).iter_records())
+    store = BinaryTaskStore(source)
+    count = 0
+
+    def counted(records):
+        nonlocal count
+        for count, data in enumerate(records, 1):
+            yield data
+
+    try:
+        tmp_path = target + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            write_json_array(f, counted(store.iter_records()))
+        os.replace(tmp_path, target)
+    finally:
+        store.close()
+    return count
+
+
+class BinaryTaskFile:
+    # Read-only view of one binary task file through mmap. Columns are
+    # memoryviews straight onto the mapping, so opening costs the same for
+    # any size and the OS pages in only what is touched.
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views = []
+        try:
+            self._read_header()
+        except Exception:
+            self.close()
+            raise
+
+    def _read_header(self):
+        if len(self.map) < HEADER.size:
+            raise ValueError("not a binary task file")
+        magic, version, _, self.count, names_offset, names_len, heap_offset, heap_len, *offsets = \
+            HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a binary task file, or a newer version")
+        self.names = json.loads(self.map[names_offset:names_offset + names_len])
+        self.name_index = {name: i for i, name in enumerate(self.names)}
+        self.heap_offset = heap_offset
+        for (name, code), offset in zip(COLUMNS, offsets):
+            size = struct.calcsize(code) * self.count
+            if sys.byteorder == "little":
+                view = self._view(offset, size, code)
+            else:
+                view = array(code, self.map[offset:offset + size])
+                view.byteswap()
+            setattr(self, name + "s", view)
+
+    def _view(self, offset, size, code):
+        # Every view onto the mapping has to be released before it can close.
+        whole = memoryview(self.map)
+        part = whole[offset:offset + size]
+        view = part.cast(code)
+        self._views += (view, part, whole)
+        return view
+
+    def task_id(self, i):
+        start = self.heap_offset + self.heaps[i]
+        return self.map[start:start + self.id_lens[i]].decode("utf-8")
+
+    def description(self, i):
+        start = self.heap_offset + self.heaps[i] + self.id_lens[i]
+        return self.map[start:start + self.desc_lens[i]].decode("utf-8")
+
+    def record(self, i):
+        start = self.heap_offset + self.heaps[i]
+        id_end = start + self.id_lens[i]
+        desc_end = id_end + self.desc_lens[i]
+        minutes = self.times[i]
+        data = {
+            "id": self.map[start:id_end].decode("utf-8"),
+            "description": self.map[id_end:desc_end].decode("utf-8"),
+            "date": datetime.date.fromordinal(self.dates[i]).isoformat(),
+            "time": f"{minutes // 60:02d}:{minutes % 60:02d}",
+            "ringtone": self.names[self.ringtones[i]],
+            "category": self.names[self.categorys[i]],
+        }
+        if self.repeat_lens[i]:
+            data["repeat"] = json.loads(self.map[desc_end:desc_end + self.repeat_lens[i]])
+        return data
+
+    def find(self, task_id):
+        # Row index of the id, or None; a bisection over id_order.
+        position = bisect_left(self.id_orders, task_id, key=self.task_id)
+        if position < self.count and self.task_id(self.id_orders[position]) == task_id:
+            return self.id_orders[position]
+        return None
+
+    def ids_from(self, prefix):
+        # Row indexes in id order, from the first id not below `prefix`.
+        for position in range(bisect_left(self.id_orders, prefix, key=self.task_id), self.count):
+            yield self.id_orders[position]
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        self._views = []
+        self.map.close()
+
+
+class BinaryTaskStore:
+    # Task store over a binary file, with the query interface of
+    # SQLiteTaskStore so the GUI pages through it the same way. Edits are
+    # appended to a journal of the same records TaskJournal writes and kept
+    # in an overlay on top of the mapped rows (`changed` by row index, None
+    # once deleted, and `added` by rowid); past COMPACT_BYTES of journal
+    # everything is written out as a new binary file. Rowids survive
+    # compaction, so page cursors stay valid. Writes take the same kind of
+    # lock as the JSON files and first replay what other processes appended.
+    COLUMNS = ("id", "description", "date", "time", "ringtone", "category", "repeat")
+
+    def __init__(self, path, journal_path=None, compact_bytes=COMPACT_BYTES):
+        self.path = path
+        self.journal_path = journal_path or path + ".journal"
+        self.compact_bytes = compact_bytes
+        self._lock = FileLock(path + ".lock")
+        self.base = None
+        self._open()
+
+    def _open(self):
+        if self.base is not None:
+            self.base.close()
+        self.base_stamp = file_stamp(self.path)
+        self.base = BinaryTaskFile(self.path) if self.base_stamp is not None else None
+        count = self.base.count if self.base else 0
+        self.changed = {}
+        self.added = {}
+        self.added_ids = {}
+        self.deleted = 0
+        self.next_rowid = self.base.rowids[count - 1] + 1 if count else 1
+        self.seq = 0
+        self.journal_inode = None
+        self.journal_offset = 0
+        self._replay()
+
+    def _replay(self):
+        records, self.journal_offset, self.journal_inode = read_journal_tail(self.journal_path, self.journal_offset)
+        for record in records:
+            self.seq = max(self.seq, record.get("seq", 0))
+            if record.get("op") == "delete":
+                self._delete(record["id"])
+            elif record.get("op") == "put":
+                self._put(record["task"])
+
+    def _catch_up(self):
+        # Called under the lock: fold in what other processes wrote.
+        if file_stamp(self.path) != self.base_stamp:
+            self._open()
+            return
+        journal = file_stamp(self.journal_path)
+        if journal is None:
+            if self.journal_inode is not None:
+                self._open()
+        elif self.journal_inode is not None and (journal[0] != self.journal_inode or journal[1] < self.journal_offset):
+            self._open()
+        elif journal[1] != self.journal_offset:
+            self._replay()
+
+    def changed_elsewhere(self):
+        # Whether another process wrote since this store last looked; what
+        # it wrote is folded in. This store's own writes are replayed as
+        # they are made, so they do not count.
+        with self._lock:
+            journal = file_stamp(self.journal_path)
+            seen = None if self.journal_inode is None else (self.journal_inode, self.journal_offset)
+            changed = file_stamp(self.path) != self.base_stamp or (journal and journal[:2]) != seen
+            self._catch_up()
+        return changed
+
+    def _base_index(self, task_id):
+        # Index of the task's live row in the mapped file, or None.
+        if self.base is None:
+            return None
+        i = self.base.find(task_id)
+        if i is None or (i in self.changed and self.changed[i] is None):
+            return None
+        return i
+
+    def _put(self, data):
+        rowid = self.added_ids.get(data["id"])
+        if rowid is not None:
+            self.added[rowid] = data
+            return
+        i = self._base_index(data["id"])
+        if i is not None:
+            self.changed[i] = data
+            return
+        self.added[self.next_rowid] = data
+        self.added_ids[data["id"]] = self.next_rowid
+        self.next_rowid += 1
+
+    def _delete(self, task_id):
+        rowid = self.added_ids.pop(task_id, None)
+        if rowid is not None:
+            del self.added[rowid]
+            return
+        i = self._base_index(task_id)
+        if i is not None:
+            self.changed[i] = None
+            self.deleted += 1
+
+    def count(self):
+        return (self.base.count if self.base else 0) - self.deleted + len(self.added)
+
+    def apply_changes(self, changes):
+        # Same ("put", task dict) / ("delete", task id) pairs as
+        # TaskJournal.append_many, appended and fsynced as one write.
+        with self._lock:
+            self._catch_up()
+            lines = []
+            for op, value in changes:
+                if op == "put":
+                    _fields(value)
+                self.seq += 1
+                record = {"seq": self.seq, "op": op}
+                record["id" if op == "delete" else "task"] = value
+                lines.append(json.dumps(record, separators=(",", ":")) + "\n")
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write("".join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+            self._replay()
+            if self.journal_offset >= self.compact_bytes:
+                self.compact()
+
+    def put(self, data):
+        self.apply_changes([("put", data)])
+
+    def delete(self, task_id):
+        self.apply_changes([("delete", task_id)])
+
+    def iter_rows(self):
+        # (rowid, task dict) of every task in rowid order.
+        base = self.base
+        for i in range(base.count if base else 0):
+            if i in self.changed:
+                if self.changed[i] is not None:
+                    yield base.rowids[i], self.changed[i]
+            else:
+                yield base.rowids[i], base.record(i)
+        yield from self.added.items()
+
+    def iter_records(self):
+        for rowid, data in self.iter_rows():
+            yield data
+
+    def compact(self):
+        with self._lock:
+            self._catch_up()
+            if self.base is None and not self.added:
+                return
+            tmp_path = self.path + ".new"
+            write_rows(tmp_path, self.iter_rows())
+            # The old mapping has to go before the file under it is replaced.
+            self.close()
+            os.replace(tmp_path, self.path)
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self._open()
+
+    def import_records(self, records):
+        # Returns (added, skipped); records whose id is already stored are
+        # skipped. Into an empty store the records are written straight out
+        # as the binary file, however many there are.
+        with self._lock:
+            self._catch_up()
+            counts = [0, 0]
+            seen = set()
+
+            def new_records():
+                for data in records:
+                    if data["id"] in seen or self.get(data["id"]) is not None:
+                        counts[1] += 1
+                        continue
+                    seen.add(data["id"])
+                    counts[0] += 1
+                    yield data
+
+            if self.count() == 0 and not os.path.exists(self.journal_path):
+                self.close()
+                write_binary(self.path, new_records())
+                self._open()
+            else:
+                batch = []
+                for data in new_records():
+                    batch.append(("put", data))
+                    if len(batch) >= 10000:
+                        self.apply_changes(batch)
+                        batch = []
+                if batch:
+                    self.apply_changes(batch)
+            return counts[0], counts[1]
+
+    def migrate_from_json(self, snapshot_path, journal_path=None):
+        if self.count() or not os.path.exists(snapshot_path):
+            return 0
+        return self.import_records(TaskJournal(snapshot_path, journal_path).iter_records())[0]
+
+    def get(self, task_id):
+        rowid = self.added_ids.get(task_id)
+        if rowid is not None:
+            return self.added[rowid]
+        if self.base is None:
+            return None
+        i = self.base.find(task_id)
+        if i is None:
+            return None
+        return self.changed[i] if i in self.changed else self.base.record(i)
+
+    def ids_with_prefix(self, prefix, limit=2):
+        found = [task_id for task_id in self.added_ids if task_id.startswith(prefix)]
+        if self.base is not None:
+            for i in self.base.ids_from(prefix):
+                task_id = self.base.task_id(i)
+                if not task_id.startswith(prefix) or len(found) > limit:
+                    break
+                if self.changed.get(i, True) is not None:
+                    found.append(task_id)
+        return sorted(found)[:limit]
+
+    @staticmethod
+    def _due(data):
+        # (date ordinal, minutes) of an overlay record; it passed _fields().
+        hours, minutes = data["time"].split(":")
+        return datetime.date.fromisoformat(data["date"]).toordinal(), int(hours) * 60 + int(minutes)
+
+    @staticmethod
+    def _bound(pair):
+        # The (date text, time text) bounds SQLiteTaskStore.query takes.
+        if pair is None:
+            return None
+        hours, minutes = pair[1].split(":")
+        return datetime.date.fromisoformat(pair[0]).toordinal(), int(hours) * 60 + int(minutes)
+
+    def _by_rowid(self, after_id):
+        # (rowid, row index or None, overlay dict or None) in rowid order.
+        base = self.base
+        if base is not None:
+            changed = self.changed
+            for i in range(bisect_right(base.rowids, after_id), base.count):
+                if i in changed:
+                    if changed[i] is not None:
+                        yield base.rowids[i], None, changed[i]
+                else:
+                    yield base.rowids[i], i, None
+        for rowid, data in self.added.items():
+            if rowid > after_id:
+                yield rowid, None, data
+
+    def _by_due(self, after):
+        # The same triples in (date, time, rowid) order, from past `after`.
+        overlay = [(*self._due(data), rowid, data) for rowid, data in self.added.items()]
+        base = self.base
+        if base is not None:
+            rowids = base.rowids
+            overlay += [(*self._due(data), rowids[i], data) for i, data in self.changed.items() if data is not None]
+        overlay = [row for row in overlay if after is None or row[:3] > after]
+        overlay.sort(key=lambda row: row[:3])
+
+        def mapped():
+            if base is None:
+                return
+            dates, times, changed, order = base.dates, base.times, self.changed, base.due_orders
+            key = lambda i: (dates[i], times[i], rowids[i])
+            start = 0 if after is None else bisect_right(order, after, key=key)
+            for position in range(start, base.count):
+                i = order[position]
+                if i not in changed:
+                    yield dates[i], times[i], rowids[i], i
+
+        for date, minutes, rowid, row in merge(mapped(), overlay, key=lambda row: row[:3]):
+            if isinstance(row, dict):
+                yield rowid, None, row, (date, minutes)
+            else:
+                yield rowid, row, None, (date, minutes)
+
+    def query(self, category=None, search="", limit=None, after_id=0,
+              due_from=None, due_to=None, by_due=False, after_due=None):
+        # Same arguments and (rowid, task dict) results as
+        # SQLiteTaskStore.query. Rows are tested on their fixed-width
+        # columns first; a description is decoded only for rows that pass,
+        # and only when there is search text. What other processes appended
+        # is folded in first, so a query never returns stale rows.
+        with self._lock:
+            self._catch_up()
+        low, high = self._bound(due_from), self._bound(due_to)
+        search = search.lower()
+        base = self.base
+        category_index = base.name_index.get(category, -1) if base is not None and category else None
+        if by_due:
+            after = None
+            if after_due is not None:
+                after = (*self._bound(after_due[:2]), after_due[2])
+            if low is not None and (after is None or after < (*low, 0)):
+                after = (*low, 0)
+            rows = self._by_due(after)
+        else:
+            rows = ((rowid, i, data, None) for rowid, i, data in self._by_rowid(after_id))
+        results = []
+        for rowid, i, data, due in rows:
+            if due is None and (low is not None or high is not None):
+                due = (base.dates[i], base.times[i]) if i is not None else self._due(data)
+            if by_due and high is not None and due >= high:
+                break
+            if (low is not None and due < low) or (high is not None and due >= high):
+                continue
+            if i is not None:
+                if category_index is not None and base.categorys[i] != category_index:
+                    continue
+                if search and search not in base.description(i).lower():
+                    continue
+                data = base.record(i)
+            elif (category and data.get("category") != category) or \
+                    (search and search not in data.get("description", "").lower()):
+                continue
+            results.append((rowid, data))
+            if limit is not None and len(results) >= limit:
+                break
+        return results
+
+    def schedule_since(self, date_str):
+        # One-off tasks due on or after the date, as (id, date, time) text;
+        # see repeating().
+        since = (datetime.date.fromisoformat(date_str).toordinal(), 0, 0)
+        rows = []
+        for rowid, i, data, due in self._by_due(since):
+            if i is None:
+                if not data.get("repeat"):
+                    rows.append((data["id"], data["date"], data["time"]))
+            elif not self.base.repeat_lens[i]:
+                date, minutes = due
+                rows.append((self.base.task_id(i), datetime.date.fromordinal(date).isoformat(),
+                             f"{minutes // 60:02d}:{minutes % 60:02d}"))
+        return rows
+
+    def repeating(self):
+        # Records of every repeating task, whatever its date.
+        records = []
+        base = self.base
+        if base is not None:
+            repeat_lens = base.repeat_lens
+            records += [base.record(i) for i in range(base.count) if repeat_lens[i] and i not in self.changed]
+        records += [data for data in self.changed.values() if data and data.get("repeat")]
+        records += [data for data in self.added.values() if data.get("repeat")]
+        return records
+
+    def close(self):
+        if self.base is not None:
+            self.base.close()
+            self.base = None
@@ -0,0 +1,428 @@
+import csv
+import datetime
+import heapq
+import json
+import os
+import sys
+
+from todo_binary import BinaryTaskStore
+from todo_recurrence import RecurrenceRule
+from todo_reminders import due_timestamp
+from todo_schedule import DUE_VIEWS, due_key, due_view_range, split_due_key
+from todo_storage import TaskJournal, SQLiteTaskStore, new_task_id, write_json_array
+
+TASKS_FILE = "tasks.json"
+JOURNAL_FILE = "tasks.journal"
+DB_FILE = "tasks.db"
+BINARY_FILE = "tasks.tdb"
+STORAGE_MODE = os.environ.get("TODO_STORAGE", "json")
+# Base URL of a task sync server (see todo_sync); the GUI then keeps no files.
+SYNC_SERVER = os.environ.get("TODO_SERVER")
+CATEGORIES = ("Personal", "Business")
+RINGTONES = ("Chime", "Ripple", "Glass", "Bell", "Digital")
+# Streaming load hands the view a screenful first, then fills in larger
+# batches so each model insert stays short enough not to stall input.
+FIRST_LOAD_BATCH = 100
+LOAD_BATCH = 5000
+QUERY_PAGE_SIZE = 1000
+
+def today_ordinal():
+    return datetime.date.today().toordinal()
+
+def now_minutes():
+    now = datetime.datetime.now()
+    return now.hour * 60 + now.minute
+
+def parse_date(text):
+    try:
+        return datetime.date.fromisoformat(text).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+def parse_time(text):
+    try:
+        hours, minutes = int(text[:2]), int(text[3:5])
+    except (TypeError, ValueError):
+        return None
+    if len(text) != 5 or text[2] != ":" or not (0 <= hours < 24 and 0 <= minutes < 60):
+        return None
+    return hours * 60 + minutes
+
+def format_date(ordinal):
+    return datetime.date.fromordinal(ordinal).isoformat()
+
+def format_time(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+class Task:
+    # date is a proleptic Gregorian day ordinal and time is minutes since
+    # midnight; Qt types are only built where a widget needs them. A
+    # repeating task carries its RecurrenceRule in `repeat`, and its date is
+    # always the next occurrence still to be done, so due views, sorting and
+    # reminders treat it like any other task.
+    __slots__ = ("id", "description", "date", "time", "ringtone", "category", "repeat")
+
+    def __init__(self, description, date, time, ringtone, category, task_id=None, repeat=None):
+        self.id = task_id or new_task_id()
+        self.description = description
+        self.date = date
+        self.time = time
+        self.ringtone = sys.intern(ringtone)
+        self.category = sys.intern(category)
+        self.repeat = repeat
+
+    def __str__(self):
+        text = f"{self.description} — {format_date(self.date)} {format_time(self.time)} [{self.ringtone}]"
+        if self.repeat is not None:
+            text += f" ↻ {self.repeat.describe()}"
+        return text
+
+    def to_dict(self):
+        data = {
+            "id": self.id,
+            "description": self.description,
+            "date": format_date(self.date),
+            "time": format_time(self.time),
+            "ringtone": self.ringtone,
+            "category": self.category
+        }
+        if self.repeat is not None:
+            data["repeat"] = self.repeat.to_dict()
+        return data
+
+    def occurrences(self, start=None, end=None):
+        # Dates in [start, end) this task is still due on, generated lazily.
+        start = self.date if start is None else max(start, self.date)
+        if self.repeat is not None:
+            yield from self.repeat.occurrences(start, end)
+        elif start == self.date and (end is None or self.date < end):
+            yield self.date
+
+    @staticmethod
+    def from_dict(data):
+        description = data.get("description", "")
+        ringtone = data.get("ringtone", "Chime")
+        category = data.get("category", "Personal")
+
+        date = parse_date(data.get("date"))
+        if date is None:
+            date = today_ordinal()
+
+        time = parse_time(data.get("time"))
+        if time is None:
+            time = now_minutes()
+
+        # CSV cells and SQLite columns hold the rule as JSON text.
+        repeat = data.get("repeat")
+        try:
+            if isinstance(repeat, str):
+                repeat = json.loads(repeat)
+            repeat = RecurrenceRule.from_dict(repeat) if repeat else None
+        except ValueError:
+            repeat = None
+
+        return Task(description, date, time, ringtone, category, data.get("id"), repeat)
+
+def complete_task(task):
+    # Finishing a one-off task removes it (returns None). Finishing a repeating
+    # one moves it to its next occurrence, which is a single-record change
+    # however long the series is; None once the series has run out.
+    if task.repeat is None:
+        return None
+    date = task.repeat.next_after(task.date)
+    if date is None:
+        return None
+    return Task(task.description, date, task.time, task.ringtone, task.category, task.id, task.repeat)
+
+def next_occurrence_due(task, timestamp):
+    # Date of the first pending occurrence due after `timestamp`, or None.
+    for date in task.occurrences(datetime.date.fromtimestamp(timestamp).toordinal()):
+        if due_timestamp(date, task.time) > timestamp:
+            return date
+    return None
+
+def reminder_schedule(tasks, timestamp):
+    # (task id, date, minutes) of each task's next occurrence that could be
+    # due after `timestamp`; repeating tasks are expanded only that far.
+    since = datetime.date.fromtimestamp(timestamp).toordinal()
+    for task in tasks:
+        if task.repeat is None:
+            if task.date >= since:
+                yield task.id, task.date, task.time
+        else:
+            date = next_occurrence_due(task, timestamp)
+            if date is not None:
+                yield task.id, date, task.time
+
+def iter_agenda(tasks, start, end):
+    # (date, task) for every pending occurrence in [start, end), in due order.
+    # Each task contributes a lazy generator that heapq.merge draws from, so
+    # a daily series adds one entry per day of the window and nothing more.
+    def stream(n, task):
+        for date in task.occurrences(start, end):
+            yield date, task.time, n, task
+
+    for date, time, n, task in heapq.merge(*(stream(n, task) for n, task in enumerate(tasks))):
+        yield date, task
+
+def task_matches(task, category=None, search=""):
+    # search is expected to be lowercased already; callers filter many tasks
+    # against the same query.
+    if category and task.category != category:
+        return False
+    return not search or search in task.description.lower()
+
+def due_bound_text(key):
+    # Stored "YYYY-MM-DD" / "HH:MM" text sorts the same way as due keys.
+    if key is None:
+        return None
+    date, time = split_due_key(key)
+    return format_date(date), format_time(time)
+
+def due_range_for(view):
+    if view not in DUE_VIEWS:
+        return None, None
+    return due_view_range(view, today_ordinal(), now_minutes())
+
+def open_task_store(directory=".", mode=STORAGE_MODE):
+    # The indexed store behind the "sqlite" and "binary" modes; None for the
+    # modes that keep the tasks in the JSON files.
+    if mode == "sqlite":
+        return SQLiteTaskStore(os.path.join(directory, DB_FILE))
+    if mode == "binary":
+        return BinaryTaskStore(os.path.join(directory, BINARY_FILE))
+    return None
+
+def store_page(db, category=None, search="", limit=None, after=None, due_range=(None, None), by_due=False):
+    # One keyset page from an indexed store. `after` is the cursor returned with the
+    # previous page: a row id, or a (date, time, id) key when sorted by due.
+    start, end = due_range
+    rows = db.query(category, search, limit, 0 if by_due or after is None else after,
+                    due_bound_text(start), due_bound_text(end), by_due, after if by_due else None)
+    cursor = after
+    if rows:
+        rowid, data = rows[-1]
+        cursor = (data["date"], data["time"], rowid) if by_due else rowid
+    return [Task.from_dict(data) for rowid, data in rows], cursor
+
+def iter_store_tasks(db, category=None, search="", due_range=(None, None), by_due=False):
+    # Keyset pages keep each query an index seek however far the scan gets.
+    cursor = None
+    while True:
+        tasks, cursor = store_page(db, category, search, QUERY_PAGE_SIZE, cursor, due_range, by_due)
+        yield from tasks
+        if len(tasks) < QUERY_PAGE_SIZE:
+            return
+
+def iter_task_batches(journal):
+    # Only one batch of parsed records is alive at a time; each is turned
+    # into compact Task objects before the next one is read.
+    batch = []
+    size = FIRST_LOAD_BATCH
+    for data in journal.iter_records():
+        batch.append(Task.from_dict(data))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+            size = LOAD_BATCH
+    if batch:
+        yield batch
+
+def task_fields(task):
+    return task.description, task.date, task.time, task.ringtone, task.category, task.repeat
+
+def external_changes(journal, known):
+    # What other processes changed in the task files since journal.synced,
+    # as ("put", Task) / ("delete", task id) relative to `known` (id -> Task)
+    # with unchanged tasks left out. Appended journal records are all that is
+    # read when that is all that happened; a replaced snapshot is streamed
+    # and compared task by task. Returns the changes and the sync token to
+    # hand back to the journal once they have been applied.
+    kind, records, token = journal.poll_changes()
+    changes = []
+
+    def compare(data):
+        task = Task.from_dict(data)
+        old = known.get(task.id)
+        if old is None or task_fields(old) != task_fields(task):
+            changes.append(("put", task))
+
+    if kind == "tail":
+        latest = {}
+        for record in records:
+            if record["op"] == "delete":
+                latest[record["id"]] = None
+            else:
+                latest[record["task"]["id"]] = record["task"]
+        for task_id, data in latest.items():
+            if data is not None:
+                compare(data)
+            elif task_id in known:
+                changes.append(("delete", task_id))
+    elif kind == "full":
+        seen = set()
+        for data in journal.iter_records():
+            seen.add(data["id"])
+            compare(data)
+        changes.extend(("delete", task_id) for task_id in known if task_id not in seen)
+        token = journal.read_token
+    return changes, token
+
+def store_changes(db, known):
+    # external_changes() for an indexed store: nothing is read unless
+    # another process has written to it, and then every task is compared.
+    changes = []
+    if not db.changed_elsewhere():
+        return changes
+    seen = set()
+    for task in iter_store_tasks(db):
+        seen.add(task.id)
+        old = known.get(task.id)
+        if old is None or task_fields(old) != task_fields(task):
+            changes.append(("put", task))
+    changes.extend(("delete", task_id) for task_id in known if task_id not in seen)
+    return changes
+
+# Exporters and importers work one task at a time, so files of any size pass
+# through in constant memory.
+def write_tasks_json(tasks, f):
+    write_json_array(f, (task.to_dict() for task in tasks))
+    f.write("\n")
+
+def write_tasks_ndjson(tasks, f):
+    for task in tasks:
+        f.write(json.dumps(task.to_dict(), ensure_ascii=False))
+        f.write("\n")
+
+def write_tasks_csv(tasks, f):
+    writer = csv.DictWriter(f, fieldnames=SQLiteTaskStore.COLUMNS)
+    writer.writeheader()
+    for task in tasks:
+        data = task.to_dict()
+        if "repeat" in data:
+            data["repeat"] = json.dumps(data["repeat"])
+        writer.writerow(data)
+
+def read_tasks_ndjson(f):
+    for line_number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"line {line_number}: {e}") from None
+        if not isinstance(data, dict):
+            raise ValueError(f"line {line_number}: expected a JSON object")
+        yield Task.from_dict(data)
+
+def read_tasks_csv(f):
+    reader = csv.DictReader(f)
+    if reader.fieldnames is None or "description" not in reader.fieldnames:
+        raise ValueError("CSV needs a header row with at least a description column")
+    for row in reader:
+        # Blank cells fall back to the same defaults as a missing JSON key.
+        yield Task.from_dict({key: value for key, value in row.items() if value})
+
+EXPORT_FORMATS = {"json": write_tasks_json, "ndjson": write_tasks_ndjson, "csv": write_tasks_csv}
+IMPORT_FORMATS = {"ndjson": read_tasks_ndjson, "csv": read_tasks_csv}
+FORMAT_EXTENSIONS = {".json": "json", ".ndjson": "ndjson", ".jsonl": "ndjson", ".csv": "csv"}
+
+def format_for_path(path, default=None):
+    return FORMAT_EXTENSIONS.get(os.path.splitext(path)[1].lower(), default)
+
+class TaskRepository:
+    # Synchronous access to whichever storage mode is configured, for scripts
+    # and the command line; the GUI writes through its background worker.
+    def __init__(self, directory=".", mode=STORAGE_MODE):
+        self.mode = mode
+        self.journal = TaskJournal(os.path.join(directory, TASKS_FILE), os.path.join(directory, JOURNAL_FILE))
+        self.db = open_task_store(directory, mode)
+        if self.db is not None:
+            self.db.migrate_from_json(self.journal.snapshot_path, self.journal.journal_path)
+
+    def iter_tasks(self, category=None, search="", view=None, by_due=False):
+        # view is one of DUE_VIEWS. Without SQLite's date index, due order
+        # needs the matching tasks gathered and sorted first.
+        search = search.strip().lower()
+        due_range = due_range_for(view)
+        if self.db is not None:
+            yield from iter_store_tasks(self.db, category, search, due_range, by_due)
+            return
+        tasks = self._iter_file_tasks(category, search, due_range)
+        if by_due:
+            tasks = sorted(tasks, key=lambda task: (task.date, task.time))
+        yield from tasks
+
+    def _iter_file_tasks(self, category, search, due_range):
+        start, end = due_range
+        for data in self.journal.iter_records():
+            task = Task.from_dict(data)
+            if not task_matches(task, category, search):
+                continue
+            if start is not None or end is not None:
+                key = due_key(task.date, task.time)
+                if (start is not None and key < start) or (end is not None and key >= end):
+                    continue
+            yield task
+
+    def resolve(self, prefix):
+        # Accepts a full id or any unambiguous prefix of one.
+        if self.db is not None:
+            matches = self.db.ids_with_prefix(prefix)
+        else:
+            matches = []
+            for data in self.journal.iter_records():
+                if data["id"].startswith(prefix):
+                    matches.append(data["id"])
+                    if len(matches) > 1:
+                        break
+        if not matches:
+            raise LookupError(f"no task with id {prefix!r}")
+        if len(matches) > 1:
+            raise LookupError(f"task id {prefix!r} is ambiguous")
+        return matches[0]
+
+    def apply(self, changes):
+        # changes is a list of ("put", task dict) or ("delete", task id), the
+        # same shape the journal records, and is committed as one unit.
+        if self.db is not None:
+            self.db.apply_changes(changes)
+            return
+        # Both file modes write under the journal's lock from what is on disk,
+        # so changes made by the GUI or another command in between are kept.
+        if self.mode == "journal":
+            self.journal.append_many(changes)
+        else:
+            self.journal.apply_changes(changes, indent=4)
+
+    def import_tasks(self, tasks):
+        # Returns (added, skipped); tasks whose id is already stored are skipped.
+        records = (task.to_dict() for task in tasks)
+        if self.db is not None:
+            return self.db.import_records(records)
+        return self.journal.import_records(records)
+
+    def get_tasks(self, task_ids):
+        wanted = set(task_ids)
+        if self.db is not None:
+            return {data["id"]: Task.from_dict(data) for data in map(self.db.get, wanted) if data}
+        return {data["id"]: Task.from_dict(data) for data in self.journal.iter_records() if data["id"] in wanted}
+
+    def complete(self, task_ids):
+        # Returns {task id: the task moved to its next occurrence, or None
+        # when it was removed}.
+        done = {task_id: complete_task(task) for task_id, task in self.get_tasks(task_ids).items()}
+        self.apply([("delete", task_id) if task is None else ("put", task.to_dict())
+                    for task_id, task in done.items()])
+        return done
+
+    def put(self, task):
+        self.apply([("put", task.to_dict())])
+
+    def delete(self, task_ids):
+        self.apply([("delete", task_id) for task_id in task_ids])
+
+    def close(self):
+        self.journal.close()
+        if self.db is not None:
+            self.db.close()
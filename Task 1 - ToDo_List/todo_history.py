@@ -0,0 +1,161 @@
+import sys
+import time
+from collections import deque
+
+# Memory the undo and redo stacks may use between them.
+UNDO_MAX_BYTES = 8 * 1024 * 1024
+# Edits of the same tasks this close together undo as one step.
+COALESCE_SECONDS = 10
+
+
+def task_delta(old, new):
+    # (before, after) for a task going from `old` to `new` (Tasks, None when
+    # the task did not or no longer exists). An added or removed task keeps
+    # its whole record on the side it exists; an edit keeps only the fields
+    # that changed. Values are as in Task.to_dict(), the journal's format.
+    if old is None:
+        return None, new.to_dict()
+    if new is None:
+        return old.to_dict(), None
+    a = old.to_dict()
+    b = new.to_dict()
+    before = {key: a.get(key) for key in a.keys() | b.keys() if a.get(key) != b.get(key)}
+    return before, {key: b.get(key) for key in before}
+
+
+def patched(record, fields):
+    # A missing key and a None value both mean "unset" (e.g. no repeat rule).
+    record = dict(record)
+    record.update(fields)
+    return {key: value for key, value in record.items() if value is not None}
+
+
+def record_size(record):
+    if record is None:
+        return 0
+    return sys.getsizeof(record) + sum(sys.getsizeof(value) for value in record.values())
+
+
+class TaskCommand:
+    # One user action as a list of (task id, before, after) deltas from
+    # task_delta(). Undoing and redoing turn them into the journal's
+    # ("put", task dict) / ("delete", task id) changes, so a step is stored
+    # and replayed exactly like any other edit. `lookup(task_id)` gives the
+    # current record of a task and is only called for edited tasks.
+    __slots__ = ("label", "deltas", "size", "coalesce", "time")
+
+    def __init__(self, label, deltas, coalesce=False):
+        self.label = label
+        self.deltas = [(task_id, before, after) for task_id, before, after in deltas if before != after]
+        self.size = sys.getsizeof(self) + sum(
+            sys.getsizeof(delta) + record_size(delta[1]) + record_size(delta[2]) for delta in self.deltas)
+        self.coalesce = coalesce
+        self.time = time.monotonic()
+
+    @classmethod
+    def between(cls, label, pairs, coalesce=False):
+        # pairs are (old Task or None, new Task or None).
+        return cls(label, [((old or new).id, *task_delta(old, new)) for old, new in pairs], coalesce)
+
+    def undo_changes(self, lookup):
+        return self._changes(reversed(self.deltas), lookup, undo=True)
+
+    def redo_changes(self, lookup):
+        return self._changes(self.deltas, lookup, undo=False)
+
+    @staticmethod
+    def _changes(deltas, lookup, undo):
+        changes = []
+        for task_id, before, after in deltas:
+            if undo:
+                before, after = after, before
+            if after is None:
+                changes.append(("delete", task_id))
+            elif before is None:
+                changes.append(("put", after))
+            else:
+                current = lookup(task_id)
+                # A task deleted elsewhere since has nothing left to edit.
+                if current is not None:
+                    changes.append(("put", patched(current, after)))
+        return changes
+
+    def merge(self, other):
+        # Folds a later edit of the same tasks into this one: the earliest
+        # value of each field and the latest one. Returns False if nothing
+        # is left, i.e. the second edit put everything back.
+        merged = []
+        for (task_id, before, after), (_, later_before, later_after) in zip(self.deltas, other.deltas):
+            before = {**later_before, **before}
+            after = {**after, **later_after}
+            changed = {key for key in before if before[key] != after.get(key)}
+            merged.append((task_id, {key: before[key] for key in changed}, {key: after.get(key) for key in changed}))
+        self.__init__(self.label, merged, self.coalesce)
+        return bool(self.deltas)
+
+    def can_merge(self, other):
+        return (self.coalesce and other.coalesce and self.label == other.label
+                and other.time - self.time <= COALESCE_SECONDS
+                and len(self.deltas) == len(other.deltas)
+                and all(a[0] == b[0] and None not in (a[1], a[2], b[1], b[2])
+                        for a, b in zip(self.deltas, other.deltas)))
+
+
+class UndoHistory:
+    # Undo and redo stacks of TaskCommands. Undo and redo move one command
+    # between the stacks; nothing is copied, so either costs the size of the
+    # step, not of the task list. The oldest steps are dropped once both
+    # stacks together exceed max_bytes; a step larger than that on its own
+    # cannot be kept at all and clears the history, since the steps before
+    # it could no longer be undone in order.
+    def __init__(self, max_bytes=UNDO_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.size = 0
+
+    def push(self, command):
+        # Returns False when the step is too large to keep.
+        if not command.deltas:
+            return True
+        can_merge = not self.redo_stack and self.undo_stack and self.undo_stack[-1].can_merge(command)
+        self.size -= sum(step.size for step in self.redo_stack)
+        self.redo_stack.clear()
+        if can_merge:
+            top = self.undo_stack[-1]
+            self.size -= top.size
+            if top.merge(command):
+                self.size += top.size
+            else:
+                self.undo_stack.pop()
+            return True
+        self.undo_stack.append(command)
+        self.size += command.size
+        while self.size > self.max_bytes and self.undo_stack:
+            self.size -= self.undo_stack.popleft().size
+        return bool(self.undo_stack)
+
+    def undo(self):
+        if not self.undo_stack:
+            return None
+        command = self.undo_stack.pop()
+        self.redo_stack.append(command)
+        return command
+
+    def redo(self):
+        if not self.redo_stack:
+            return None
+        command = self.redo_stack.pop()
+        self.undo_stack.append(command)
+        return command
+
+    def next_undo(self):
+        return self.undo_stack[-1] if self.undo_stack else None
+
+    def next_redo(self):
+        return self.redo_stack[-1] if self.redo_stack else None
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.size = 0
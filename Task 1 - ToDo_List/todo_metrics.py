@@ -0,0 +1,122 @@
+import atexit
+import functools
+import json
+import math
+import os
+import threading
+import time
+
+# TODO_METRICS=1 turns instrumentation on and writes todo_metrics.json on
+# exit; a value ending in .json names the file instead. Unset, timed()
+# hands every function back untouched, so nothing is measured or paid for.
+METRICS_SETTING = os.environ.get("TODO_METRICS", "")
+METRICS_ENABLED = METRICS_SETTING not in ("", "0")
+METRICS_FILE = METRICS_SETTING if METRICS_SETTING.endswith(".json") else "todo_metrics.json"
+# Buckets per doubling of latency; 8 keeps quantiles within about 9%.
+BUCKETS_PER_OCTAVE = 8
+# Latencies are bucketed from one microsecond up.
+MIN_LATENCY = 1e-6
+
+
+class LatencyHistogram:
+    # Counts per log-spaced bucket, so recording is O(1) and the memory
+    # used does not grow with the number of calls. Quantiles are read back
+    # as the upper edge of the bucket they fall in.
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    @staticmethod
+    def bucket(seconds):
+        return max(0, math.ceil(math.log2(max(seconds, MIN_LATENCY) / MIN_LATENCY) * BUCKETS_PER_OCTAVE))
+
+    @staticmethod
+    def bucket_limit(bucket):
+        return MIN_LATENCY * 2 ** (bucket / BUCKETS_PER_OCTAVE)
+
+    def add(self, seconds):
+        bucket = self.bucket(seconds)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(self.bucket_limit(bucket), self.max)
+        return self.max
+
+    def summary(self):
+        # Milliseconds, rounded for reading.
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.5) * 1000, 3),
+            "p90_ms": round(self.quantile(0.9) * 1000, 3),
+            "p99_ms": round(self.quantile(0.99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class Metrics:
+    # Named histograms, filled from any thread.
+    def __init__(self):
+        self.histograms = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.add(seconds)
+
+    def summary(self):
+        with self._lock:
+            return {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+
+    def dump(self, path=None):
+        data = {
+            "started": self.started,
+            "seconds": round(time.time() - self.started, 1),
+            "bucket_resolution": f"1/{BUCKETS_PER_OCTAVE} octave",
+            "latencies": self.summary(),
+        }
+        with open(path or METRICS_FILE, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+
+
+metrics = Metrics()
+if METRICS_ENABLED:
+    atexit.register(metrics.dump)
+
+
+def timed(name=None):
+    # Decorator recording each call's latency under `name` (default: the
+    # function's qualified name). Exceptions are timed too.
+    def decorate(fn):
+        if not METRICS_ENABLED:
+            return fn
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                metrics.record(label, time.perf_counter() - start)
+        return wrapper
+    return decorate
@@ -0,0 +1,158 @@
+import datetime
+from calendar import monthrange
+
+FREQUENCIES = ("daily", "weekly", "monthly")
+WEEKDAY_NAMES = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+UNITS = {"daily": "day", "weekly": "week", "monthly": "month"}
+MAX_ORDINAL = datetime.date.max.toordinal()
+
+
+def weekday(ordinal):
+    # Day ordinal 1, 0001-01-01, was a Monday.
+    return (ordinal - 1) % 7
+
+
+def parse_weekdays(text):
+    # "mon,wed" or "Mon Wed" -> (0, 2).
+    days = set()
+    for name in text.replace(",", " ").split():
+        try:
+            days.add([day.lower() for day in WEEKDAY_NAMES].index(name[:3].lower()))
+        except ValueError:
+            raise ValueError(f"unknown weekday {name!r}") from None
+    return tuple(sorted(days))
+
+
+class RecurrenceRule:
+    # How a task repeats, anchored at `start`, the day ordinal of its first
+    # occurrence. Occurrences are never stored: occurrences() works out the
+    # first one inside the requested window arithmetically and generates the
+    # rest one at a time, so an open-ended series costs nothing until some
+    # range of it is asked for.
+    __slots__ = ("freq", "start", "interval", "weekdays", "until", "count")
+
+    def __init__(self, freq, start, interval=1, weekdays=(), until=None, count=None):
+        if freq not in FREQUENCIES:
+            raise ValueError(f"unknown repeat frequency {freq!r}")
+        if interval < 1 or (count is not None and count < 1):
+            raise ValueError("repeat interval and count must be at least 1")
+        self.freq = freq
+        self.start = start
+        self.interval = interval
+        self.weekdays = tuple(sorted(set(weekdays))) if freq == "weekly" else ()
+        self.until = until
+        self.count = count
+
+    @classmethod
+    def create(cls, freq, date, interval=1, weekdays=(), until=None, count=None):
+        # A new series from `date` on, anchored at its first real occurrence
+        # (a Tuesday date with a Mon/Wed rule starts on the Wednesday).
+        rule = cls(freq, date, interval, weekdays, until, count)
+        first = next(rule.occurrences(), None)
+        if first is None:
+            raise ValueError("the repeat rule ends before its first occurrence")
+        return rule.starting(first)
+
+    def starting(self, start):
+        return RecurrenceRule(self.freq, start, self.interval, self.weekdays, self.until, self.count)
+
+    def _key(self):
+        return self.freq, self.start, self.interval, self.weekdays, self.until, self.count
+
+    def __eq__(self, other):
+        return isinstance(other, RecurrenceRule) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def occurrences(self, start=None, end=None):
+        # Day ordinals of the occurrences in [start, end), earliest first;
+        # either bound may be None.
+        start = self.start if start is None else max(start, self.start)
+        for index, day in getattr(self, "_" + self.freq)(start):
+            if ((self.count is not None and index >= self.count) or
+                    (self.until is not None and day > self.until) or
+                    (end is not None and day >= end) or day > MAX_ORDINAL):
+                return
+            yield day
+
+    def next_after(self, day):
+        return next(self.occurrences(day + 1), None)
+
+    # Each generator yields (position in the series, day) from the first
+    # occurrence on or after `start`, jumping there without walking the
+    # occurrences before it.
+    def _daily(self, start):
+        index = -(-(start - self.start) // self.interval)
+        while True:
+            yield index, self.start + index * self.interval
+            index += 1
+
+    def _weekly(self, start):
+        weekdays = self.weekdays or (weekday(self.start),)
+        monday = self.start - weekday(self.start)
+        period = 7 * self.interval
+        # Days of the anchor's week that fall before it are not occurrences.
+        skipped = sum(1 for day in weekdays if monday + day < self.start)
+        week = (start - monday) // period
+        while True:
+            base = monday + week * period
+            for position, day in enumerate(weekdays):
+                if base + day >= start:
+                    yield week * len(weekdays) + position - skipped, base + day
+            week += 1
+
+    def _monthly(self, start):
+        # Days past the end of a shorter month fall on its last day.
+        first = datetime.date.fromordinal(self.start)
+        target = datetime.date.fromordinal(min(start, MAX_ORDINAL))
+        index = ((target.year - first.year) * 12 + target.month - first.month) // self.interval
+        while True:
+            month = first.month - 1 + index * self.interval
+            year, month = first.year + month // 12, month % 12 + 1
+            if year > datetime.MAXYEAR:
+                return
+            day = datetime.date(year, month, min(first.day, monthrange(year, month)[1])).toordinal()
+            if day >= start:
+                yield index, day
+            index += 1
+
+    def describe(self):
+        if self.interval == 1:
+            text = self.freq
+        else:
+            text = f"every {self.interval} {UNITS[self.freq]}s"
+        if self.weekdays:
+            text += " on " + ", ".join(WEEKDAY_NAMES[day] for day in self.weekdays)
+        if self.until is not None:
+            text += f" until {datetime.date.fromordinal(self.until).isoformat()}"
+        if self.count is not None:
+            text += f", {self.count} times"
+        return text
+
+    def to_dict(self):
+        data = {"freq": self.freq, "start": datetime.date.fromordinal(self.start).isoformat()}
+        if self.interval != 1:
+            data["interval"] = self.interval
+        if self.weekdays:
+            data["weekdays"] = list(self.weekdays)
+        if self.until is not None:
+            data["until"] = datetime.date.fromordinal(self.until).isoformat()
+        if self.count is not None:
+            data["count"] = self.count
+        return data
+
+    @staticmethod
+    def from_dict(data):
+        # Raises ValueError for anything that is not a rule to_dict() wrote.
+        try:
+            until = data.get("until")
+            return RecurrenceRule(
+                data["freq"],
+                datetime.date.fromisoformat(data["start"]).toordinal(),
+                int(data.get("interval", 1)),
+                (int(day) % 7 for day in data.get("weekdays", ())),
+                None if until is None else datetime.date.fromisoformat(until).toordinal(),
+                None if data.get("count") is None else int(data["count"]))
+        except (AttributeError, KeyError, TypeError) as e:
+            raise ValueError(f"bad repeat rule {data!r}") from e
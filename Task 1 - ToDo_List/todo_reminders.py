@@ -0,0 +1,59 @@
+import datetime
+from heapq import heapify, heappop, heappush
+
+
+def due_timestamp(date_ordinal, minutes):
+    due = datetime.datetime.fromordinal(date_ordinal) + datetime.timedelta(minutes=minutes)
+    return due.timestamp()
+
+
+class ReminderQueue:
+    # Min-heap of (due, task_id) with lazy deletion: rescheduling or cancelling
+    # only updates `due_by_id`, and heap entries that no longer match it are
+    # skipped when they reach the top.
+    def __init__(self):
+        self.heap = []
+        self.due_by_id = {}
+
+    def __len__(self):
+        return len(self.due_by_id)
+
+    def rebuild(self, due_by_id):
+        self.due_by_id = dict(due_by_id)
+        self.heap = [(due, task_id) for task_id, due in self.due_by_id.items()]
+        heapify(self.heap)
+
+    def schedule(self, task_id, due):
+        if self.due_by_id.get(task_id) == due:
+            return
+        self.due_by_id[task_id] = due
+        heappush(self.heap, (due, task_id))
+        self._maybe_compact()
+
+    def cancel(self, task_id):
+        if self.due_by_id.pop(task_id, None) is not None:
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        if len(self.heap) > 64 and len(self.heap) > 2 * len(self.due_by_id):
+            self.rebuild(self.due_by_id)
+
+    def _prune(self):
+        heap = self.heap
+        due_by_id = self.due_by_id
+        while heap and due_by_id.get(heap[0][1]) != heap[0][0]:
+            heappop(heap)
+
+    def next_due(self):
+        self._prune()
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now):
+        due_ids = []
+        self._prune()
+        while self.heap and self.heap[0][0] <= now:
+            due, task_id = heappop(self.heap)
+            del self.due_by_id[task_id]
+            due_ids.append(task_id)
+            self._prune()
+        return due_ids
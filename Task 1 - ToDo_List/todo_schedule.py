@@ -0,0 +1,89 @@
+from bisect import bisect_left, bisect_right
+from heapq import merge
+
+MINUTES_PER_DAY = 24 * 60
+DUE_VIEWS = ("Today", "Upcoming", "Overdue")
+
+
+def due_key(date_ordinal, minutes):
+    return date_ordinal * MINUTES_PER_DAY + minutes
+
+
+def split_due_key(key):
+    return divmod(key, MINUTES_PER_DAY)
+
+
+def due_view_range(view, today, now):
+    # Half-open [start, end) due keys; None leaves that side open. Overdue is
+    # everything before this minute, so it overlaps the earlier part of Today.
+    if view == "Today":
+        return due_key(today, 0), due_key(today + 1, 0)
+    if view == "Upcoming":
+        return due_key(today + 1, 0), None
+    if view == "Overdue":
+        return None, due_key(today, now)
+    raise ValueError(f"unknown due view {view!r}")
+
+
+class DueIndex:
+    # Task ids ordered by due time in two parallel lists, so any view is two
+    # bisects and a slice. Bulk additions wait in `pending` and are merged in
+    # one linear pass the next time the index is read or edited.
+    def __init__(self):
+        self.keys = []
+        self.ids = []
+        self.pending = []
+
+    def __len__(self):
+        return len(self.keys) + len(self.pending)
+
+    def rebuild(self, tasks):
+        self.keys = []
+        self.ids = []
+        self.pending = []
+        self.add_many(tasks)
+
+    def add_many(self, tasks):
+        self.pending.extend((due_key(task.date, task.time), task.id) for task in tasks)
+
+    def _merge_pending(self):
+        if not self.pending:
+            return
+        self.pending.sort()
+        merged = list(merge(zip(self.keys, self.ids), self.pending))
+        self.keys = [key for key, task_id in merged]
+        self.ids = [task_id for key, task_id in merged]
+        self.pending = []
+
+    def add(self, task):
+        self._merge_pending()
+        key = due_key(task.date, task.time)
+        pos = bisect_right(self.keys, key)
+        self.keys.insert(pos, key)
+        self.ids.insert(pos, task.id)
+
+    def remove(self, task):
+        # Takes the task as it was indexed; its due time locates the entry.
+        self._merge_pending()
+        key = due_key(task.date, task.time)
+        pos = self.ids.index(task.id, bisect_left(self.keys, key), bisect_right(self.keys, key))
+        del self.keys[pos]
+        del self.ids[pos]
+
+    def remove_many(self, task_ids):
+        self._merge_pending()
+        keep = [pos for pos, task_id in enumerate(self.ids) if task_id not in task_ids]
+        self.keys = [self.keys[pos] for pos in keep]
+        self.ids = [self.ids[pos] for pos in keep]
+
+    def update(self, old_task, task):
+        if (old_task.date, old_task.time) != (task.date, task.time):
+            self.remove(old_task)
+            self.add(task)
+
+    def between(self, start=None, end=None):
+        # Ids due in [start, end), earliest first.
+        self._merge_pending()
+        lo = 0 if start is None else bisect_left(self.keys, start)
+        hi = len(self.keys) if end is None else bisect_left(self.keys, end)
+        return self.ids[lo:hi]
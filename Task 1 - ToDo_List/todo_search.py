@@ -0,0 +1,84 @@
+from collections import defaultdict
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TaskSearchIndex:
+    def __init__(self):
+        self.postings = defaultdict(set)
+        self.lowered = {}
+        self.last_query = None
+        self.last_result = None
+
+    def rebuild(self, tasks):
+        self.postings = defaultdict(set)
+        self.lowered = {}
+        self.add_many(tasks)
+
+    def add_many(self, tasks):
+        self.last_query = None
+        self.last_result = None
+        postings = self.postings
+        lowered = self.lowered
+        for task in tasks:
+            task_id = task.id
+            text = task.description.lower()
+            lowered[task_id] = text
+            for i in range(len(text) - 2):
+                postings[text[i:i + 3]].add(task_id)
+
+    def add(self, task):
+        task_id = task.id
+        text = task.description.lower()
+        self.lowered[task_id] = text
+        postings = self.postings
+        for i in range(len(text) - 2):
+            postings[text[i:i + 3]].add(task_id)
+        if self.last_result is not None and self.last_query in text:
+            self.last_result.add(task_id)
+
+    def remove(self, task_id):
+        text = self.lowered.pop(task_id, None)
+        if text is None:
+            return
+        postings = self.postings
+        for gram in trigrams(text):
+            bucket = postings.get(gram)
+            if bucket is not None:
+                bucket.discard(task_id)
+                if not bucket:
+                    del postings[gram]
+        if self.last_result is not None:
+            self.last_result.discard(task_id)
+
+    def update(self, task):
+        self.remove(task.id)
+        self.add(task)
+
+    def search(self, query):
+        query = query.lower()
+        if not query:
+            return set(self.lowered)
+        # Callers get copies: add() and remove() keep last_result up to date
+        # in place, and it must not change under them or through them.
+        if query == self.last_query:
+            return set(self.last_result)
+        lowered = self.lowered
+        if self.last_query is not None and self.last_query in query:
+            # The query only grew, so every match is already in the last result.
+            candidates = self.last_result
+        elif len(query) < 3:
+            candidates = lowered
+        else:
+            buckets = sorted((self.postings.get(gram, ()) for gram in trigrams(query)), key=len)
+            candidates = set(buckets[0])
+            for bucket in buckets[1:]:
+                if not candidates:
+                    break
+                candidates &= bucket
+        result = {task_id for task_id in candidates if query in lowered[task_id]}
+        self.last_query = query
+        self.last_result = result
+        return set(result)
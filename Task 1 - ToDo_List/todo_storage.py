@@ -0,0 +1,858 @@
+import itertools
+import json
+import os
+import re
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    import errno
+    import msvcrt
+    fcntl = None
+
+JSON_WHITESPACE = re.compile(r"[ \t\r\n]*")
+
+
+def new_task_id():
+    # 128 random bits in the same 32-hex-digit form as uuid4().hex, without
+    # the uuid module's import cost on command-line startup.
+    return os.urandom(16).hex()
+
+
+def legacy_task_id(position, data):
+    # Records from before task ids get one derived from where they sit in the
+    # snapshot, so every reader hands out the same id until it is saved.
+    import hashlib
+    key = f"{position}\0{json.dumps(data, sort_keys=True)}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:32]
+
+
+def atomic_write_json(path, data, indent=None):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        if indent is None:
+            json.dump(data, f, separators=(",", ":"))
+        else:
+            json.dump(data, f, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def write_json_array(f, records):
+    # One record per line: json.dumps only takes its C fast path without
+    # indent, which makes large streamed writes several times faster.
+    separator = "[\n    "
+    for data in records:
+        f.write(separator)
+        f.write(json.dumps(data))
+        separator = ",\n    "
+    f.write("[]" if separator.startswith("[") else "\n]")
+
+
+def file_stamp(path):
+    # Cheap identity of a file's current contents, or None when it is missing.
+    # Replacing a file by rename changes the inode even at the same size.
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def _lock_fd(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            return
+        except OSError as e:
+            # LK_LOCK gives up after ten seconds of retries; keep waiting.
+            if e.errno != errno.EDEADLOCK:
+                raise
+
+
+def _unlock_fd(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class FileLock:
+    # Advisory lock shared by every process writing the same task files. It
+    # lives on a side file because the files it guards are replaced by
+    # rename. Re-entrant within a process, and it also serialises threads.
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            except BaseException:
+                self._thread_lock.release()
+                raise
+            try:
+                _lock_fd(fd)
+            except BaseException:
+                os.close(fd)
+                self._thread_lock.release()
+                raise
+            self._fd = fd
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        if self._depth == 0:
+            _unlock_fd(self._fd)
+            os.close(self._fd)
+            self._fd = None
+        self._thread_lock.release()
+
+
+def read_snapshot(path):
+    if not os.path.exists(path):
+        return 0, []
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    # Plain JSON mode writes a bare list; journal compaction wraps it with the
+    # sequence number of the last journal record folded into the snapshot.
+    if isinstance(data, dict):
+        return data.get("seq", 0), data.get("tasks", [])
+    return 0, data
+
+
+class SnapshotStream:
+    # Incremental reader for a snapshot file: yields the task records one by
+    # one while holding at most a chunk of text plus the record in progress.
+    # Accepts both the bare list and the {"seq": ..., "tasks": [...]} form.
+    def __init__(self, path, chunk_size=64 * 1024):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.seq = 0
+        self.seq_known = False
+        self._decoder = json.JSONDecoder()
+
+    def __iter__(self):
+        if not os.path.exists(self.path):
+            self.seq_known = True
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            self._file = f
+            self._buf = ""
+            self._pos = 0
+            self._eof = False
+            char = self._peek()
+            if char == "[":
+                self.seq_known = True
+                yield from self._items()
+            elif char == "{":
+                yield from self._object()
+            elif char:
+                raise ValueError(f"unexpected {char!r} at start of {self.path}")
+
+    def _fill(self):
+        if self._pos > self.chunk_size:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        chunk = self._file.read(self.chunk_size)
+        if not chunk:
+            self._eof = True
+        self._buf += chunk
+
+    def _peek(self):
+        while True:
+            buf = self._buf
+            pos = self._pos = JSON_WHITESPACE.match(buf, self._pos).end()
+            if pos < len(buf):
+                return buf[pos]
+            if self._eof:
+                return ""
+            self._fill()
+
+    def _take(self, expected):
+        char = self._peek()
+        if char not in expected:
+            raise ValueError(f"expected one of {expected!r} in {self.path}, got {char!r}")
+        self._pos += 1
+        return char
+
+    def _decode(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+                self._fill()
+                continue
+            # A number that runs into the end of the buffer may continue in
+            # the next chunk.
+            if end == len(self._buf) and not self._eof:
+                self._fill()
+                continue
+            self._pos = end
+            return value
+
+    def _items(self):
+        self._take("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield self._decode()
+            if self._take(",]") == "]":
+                return
+
+    def _object(self):
+        self._take("{")
+        if self._peek() == "}":
+            return
+        while True:
+            key = self._decode()
+            self._take(":")
+            if key == "tasks" and self._peek() == "[":
+                yield from self._items()
+            else:
+                value = self._decode()
+                if key == "seq":
+                    self.seq = value
+                    self.seq_known = True
+            if self._take(",}") == "}":
+                return
+
+
+def read_journal_tail(path, offset=0):
+    # Complete records from byte `offset` on, the offset just past the last
+    # of them and the file's inode, so a reader can resume where it stopped.
+    # A torn final line from a crash (or an append in progress) is left out.
+    records = []
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return records, 0, None
+    with f:
+        inode = os.fstat(f.fileno()).st_ino
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+            offset += len(line)
+    return records, offset, inode
+
+
+def read_journal_records(path):
+    return read_journal_tail(path)[0]
+
+
+def last_journal_seq(path):
+    # Sequence number of the last complete record, reading only the tail.
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return 0
+    with f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(0, size - 64 * 1024))
+        lines = f.read().split(b"\n")[:-1]
+    for line in reversed(lines):
+        try:
+            return json.loads(line).get("seq", 0)
+        except ValueError:
+            # Torn record, or the cut-off first line of the window.
+            continue
+    return 0
+
+
+def is_keyed(record):
+    return record.get("op") in ("put", "delete") and (record["op"] == "put" or "id" in record)
+
+
+def index_records(records):
+    # Records written before tasks carried ids get one on first load.
+    by_id = {}
+    for position, data in enumerate(records):
+        if not data.get("id"):
+            data["id"] = legacy_task_id(position, data)
+        by_id[data["id"]] = data
+    return by_id
+
+
+def apply_record(by_id, record):
+    op = record.get("op")
+    if op == "put":
+        by_id[record["task"]["id"]] = record["task"]
+        return True
+    if op == "delete" and "id" in record:
+        by_id.pop(record["id"], None)
+        return True
+    # Position-addressed records from journals older than task ids.
+    if op == "add":
+        record["task"]["id"] = new_task_id()
+        by_id[record["task"]["id"]] = record["task"]
+    elif op == "update":
+        key = list(by_id)[record["index"]]
+        record["task"]["id"] = key
+        by_id[key] = record["task"]
+    elif op == "delete":
+        del by_id[list(by_id)[record["index"]]]
+    return False
+
+
+def replay_journal(path, by_id, after_seq):
+    return replay_records(read_journal_records(path), by_id, after_seq)
+
+
+def replay_records(records, by_id, after_seq):
+    # Returns the last applied sequence number and whether every record was
+    # id-addressed; legacy records mean the ids given out on load are new.
+    last_seq = after_seq
+    keyed = True
+    for record in records:
+        seq = record.get("seq", 0)
+        if seq <= last_seq:
+            continue
+        keyed = apply_record(by_id, record) and keyed
+        last_seq = seq
+    return last_seq, keyed
+
+
+class TaskJournal:
+    # Several processes (the GUI, the command line) may share one set of task
+    # files. Every write happens under `_lock`, an advisory lock on a side
+    # file, and starts from what is on disk rather than from this process's
+    # copy. `synced` records the file state this process's copy reflects, as
+    # (snapshot stamp, journal inode, journal offset); poll_changes() compares
+    # it with the disk to find what other writers did since.
+    def __init__(self, snapshot_path, journal_path=None, compact_threshold=1024 * 1024):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or os.path.splitext(snapshot_path)[0] + ".journal"
+        self.rotated_path = self.journal_path + ".1"
+        self.compact_threshold = compact_threshold
+        self.seq = 0
+        self.ids_assigned = False
+        self.read_token = None
+        self.synced = None
+        self._lock = FileLock(snapshot_path + ".lock")
+        self._file = None
+        self._compactor = None
+
+    def _read(self):
+        snapshot = file_stamp(self.snapshot_path)
+        snapshot_seq, records = read_snapshot(self.snapshot_path)
+        keyed = all(data.get("id") for data in records)
+        by_id = index_records(records)
+        rotated = read_journal_records(self.rotated_path)
+        live, offset, inode = read_journal_tail(self.journal_path)
+        seq, rotated_keyed = replay_records(rotated, by_id, snapshot_seq)
+        seq, live_keyed = replay_records(live, by_id, seq)
+        return by_id, seq, keyed and rotated_keyed and live_keyed, (snapshot, inode, offset)
+
+    def load(self):
+        by_id, seq, keyed, token = self._read()
+        self.seq = seq
+        records = list(by_id.values())
+        if not keyed:
+            # Persist freshly assigned ids right away so later journal records
+            # and compaction refer to the same tasks.
+            with self._lock:
+                atomic_write_json(self.snapshot_path, {"seq": seq, "tasks": records} if seq else records)
+            token = (file_stamp(self.snapshot_path),) + token[1:]
+        self.read_token = token
+        return records
+
+    def iter_records(self):
+        # Streams the same records load() returns. Journals are small (they
+        # are compacted past a threshold), so they are read up front into an
+        # overlay keyed by id and merged into the snapshot stream. Records
+        # that had to be given an id set ids_assigned; the caller should save.
+        # Once the stream is exhausted, read_token describes what was read.
+        self.ids_assigned = False
+        rotated = read_journal_records(self.rotated_path)
+        snapshot_stamp = file_stamp(self.snapshot_path)
+        live, offset, inode = read_journal_tail(self.journal_path)
+        journal = rotated + live
+        if not all(is_keyed(record) for record in journal):
+            yield from self.load()
+            return
+        stream = SnapshotStream(self.snapshot_path)
+        snapshot = iter(stream)
+        first = next(snapshot, None)
+        if not stream.seq_known:
+            yield from self.load()
+            return
+
+        overlay = {}
+        moved = set()
+        seq = stream.seq
+        for record in journal:
+            if record.get("seq", 0) <= seq:
+                continue
+            seq = record["seq"]
+            if record["op"] == "delete":
+                overlay[record["id"]] = None
+                moved.add(record["id"])
+            else:
+                task_id = record["task"]["id"]
+                # A task deleted and put back again moves to the end, as in load().
+                overlay.pop(task_id, None)
+                overlay[task_id] = record["task"]
+        self.seq = seq
+
+        if first is not None:
+            for position, data in enumerate(itertools.chain((first,), snapshot)):
+                task_id = data.get("id")
+                if not task_id:
+                    data["id"] = legacy_task_id(position, data)
+                    self.ids_assigned = True
+                elif task_id in moved:
+                    continue
+                elif task_id in overlay:
+                    data = overlay.pop(task_id)
+                yield data
+        for data in overlay.values():
+            if data is not None:
+                yield data
+        self.read_token = (snapshot_stamp, inode, offset)
+
+    def poll_changes(self):
+        # What other writers did since `synced`. Returns ("none", [], token),
+        # ("tail", records, token) when they only appended journal records,
+        # or ("full", None, None) when the snapshot itself was replaced and
+        # the caller has to compare against iter_records() (whose read_token
+        # is then the new sync point). Only appended bytes are ever read here.
+        with self._lock:
+            if self.synced is None:
+                return "full", None, None
+            snapshot, inode, offset = self.synced
+            if file_stamp(self.snapshot_path) != snapshot:
+                return "full", None, None
+            journal = file_stamp(self.journal_path)
+            if journal is None:
+                if inode is None:
+                    return "none", [], self.synced
+                return "full", None, None
+            if inode is None:
+                # A journal started since this process compacted its own.
+                offset = 0
+            elif journal[0] != inode or journal[1] < offset:
+                return "full", None, None
+            if journal[1] == offset:
+                return "none", [], self.synced
+            records, offset, inode = read_journal_tail(self.journal_path, offset)
+            if not all(is_keyed(record) for record in records):
+                return "full", None, None
+            return "tail", records, (snapshot, inode, offset)
+
+    def _in_sync(self):
+        # Called under the lock: has anyone else written since `synced`?
+        if self.synced is None:
+            return False
+        snapshot, inode, offset = self.synced
+        if file_stamp(self.snapshot_path) != snapshot:
+            return False
+        journal = file_stamp(self.journal_path)
+        if journal is None:
+            return inode is None
+        return journal[0] == inode and journal[1] == offset
+
+    def _wrote(self, in_sync):
+        # After a write of our own: if nobody else had written before it, our
+        # copy still matches the disk and the new state is the sync point.
+        if in_sync:
+            journal = file_stamp(self.journal_path)
+            self.synced = (file_stamp(self.snapshot_path),
+                           journal[0] if journal else None, journal[1] if journal else 0)
+
+    def _stored_seq(self):
+        # The last sequence number on disk, which another process may have
+        # moved past ours. Only the tail of the journal is read.
+        for path in (self.journal_path, self.rotated_path):
+            seq = last_journal_seq(path)
+            if seq:
+                return seq
+        stream = SnapshotStream(self.snapshot_path)
+        next(iter(stream), None)
+        return stream.seq if stream.seq_known else read_snapshot(self.snapshot_path)[0]
+
+    def put(self, task):
+        self.append_many([("put", task)])
+
+    def delete(self, task_id):
+        self.append_many([("delete", task_id)])
+
+    def append_many(self, changes):
+        # Each change is ("put", task dict) or ("delete", task id). Records are
+        # keyed by id, so replaying one twice leaves the same result.
+        with self._lock:
+            in_sync = self._in_sync()
+            self.seq = max(self.seq, self._stored_seq())
+            lines = []
+            for op, value in changes:
+                self.seq += 1
+                record = {"seq": self.seq, "op": op}
+                if op == "delete":
+                    record["id"] = value
+                else:
+                    record["task"] = value
+                lines.append(json.dumps(record, separators=(",", ":")) + "\n")
+            self._open_journal()
+            self._file.write("".join(lines))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            size = self._file.tell()
+            self._wrote(in_sync)
+        if size >= self.compact_threshold:
+            self.compact_in_background()
+
+    def _open_journal(self):
+        # Another process's compaction may have moved the file we hold open.
+        if self._file is not None:
+            journal = file_stamp(self.journal_path)
+            if journal is None or journal[0] != os.fstat(self._file.fileno()).st_ino:
+                self._close_file()
+        if self._file is None:
+            self._repair_tail()
+            self._file = open(self.journal_path, "a", encoding="utf-8")
+
+    def _repair_tail(self):
+        # Drop a torn final line so new records are not glued onto it.
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def write_snapshot(self, records, indent=4):
+        self._join_compactor()
+        with self._lock:
+            in_sync = self._in_sync()
+            self._replace_snapshot(records, indent)
+            self._wrote(in_sync)
+
+    def apply_changes(self, changes, indent=4):
+        # Applies ("put", task dict) / ("delete", task id) changes to what the
+        # files hold now, not to this process's copy, so tasks another
+        # process saved in the meantime survive the rewrite.
+        self._join_compactor()
+        with self._lock:
+            in_sync = self._in_sync()
+            by_id = self._read()[0]
+            for op, value in changes:
+                if op == "delete":
+                    by_id.pop(value, None)
+                else:
+                    by_id[value["id"]] = value
+            self._replace_snapshot(list(by_id.values()), indent)
+            self._wrote(in_sync)
+
+    def _replace_snapshot(self, records, indent):
+        atomic_write_json(self.snapshot_path, records, indent=indent)
+        self._remove_journals()
+
+    def _remove_journals(self):
+        self._close_file()
+        for path in (self.journal_path, self.rotated_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.seq = 0
+
+    def import_records(self, records):
+        # Streams the current tasks and then the new ones into a fresh
+        # snapshot, so an import of any size is a single atomic rename. Only
+        # ids are held in memory; records whose id is already present are
+        # skipped. Returns (added, skipped).
+        self._join_compactor()
+        with self._lock:
+            in_sync = self._in_sync()
+            seen = set()
+            counts = [0, 0]
+
+            def merged():
+                for data in self.iter_records():
+                    seen.add(data["id"])
+                    yield data
+                for data in records:
+                    if data["id"] in seen:
+                        counts[1] += 1
+                        continue
+                    seen.add(data["id"])
+                    counts[0] += 1
+                    yield data
+
+            tmp_path = self.snapshot_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                write_json_array(f, merged())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            self._remove_journals()
+            self._wrote(in_sync)
+        return counts[0], counts[1]
+
+    def compact_in_background(self):
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            self._rotate()
+            self._compactor = threading.Thread(target=self._compact_rotated, daemon=True)
+            self._compactor.start()
+
+    def compact(self):
+        self._join_compactor()
+        with self._lock:
+            self._rotate()
+        self._compact_rotated()
+
+    def _join_compactor(self):
+        # The compactor takes the lock itself, so it is waited for outside it.
+        if self._compactor is not None:
+            self._compactor.join()
+
+    def _rotate(self):
+        # A leftover rotated journal means an earlier compaction was cut short;
+        # fold it in first and keep appending to the live journal.
+        if os.path.exists(self.rotated_path):
+            return
+        in_sync = self._in_sync()
+        self._close_file()
+        if os.path.exists(self.journal_path):
+            os.replace(self.journal_path, self.rotated_path)
+        self._wrote(in_sync)
+
+    def _compact_rotated(self):
+        with self._lock:
+            if not os.path.exists(self.rotated_path):
+                return
+            in_sync = self._in_sync()
+            snapshot_seq, records = read_snapshot(self.snapshot_path)
+            by_id = index_records(records)
+            seq, _ = replay_journal(self.rotated_path, by_id, snapshot_seq)
+            atomic_write_json(self.snapshot_path, {"seq": seq, "tasks": list(by_id.values())})
+            os.remove(self.rotated_path)
+            self._wrote(in_sync)
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        self._join_compactor()
+        with self._lock:
+            self._close_file()
+
+
+class SQLiteTaskStore:
+    COLUMNS = ("id", "description", "date", "time", "ringtone", "category", "repeat")
+
+    def __init__(self, path):
+        import sqlite3
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY,
+                uid TEXT,
+                description TEXT NOT NULL,
+                date TEXT NOT NULL,
+                time TEXT NOT NULL,
+                ringtone TEXT NOT NULL,
+                category TEXT NOT NULL,
+                repeat TEXT
+            );
+            CREATE INDEX IF NOT EXISTS tasks_category ON tasks(category);
+            CREATE INDEX IF NOT EXISTS tasks_date ON tasks(date, time);
+            CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+                description, content='tasks', content_rowid='id', tokenize='trigram'
+            );
+            CREATE TRIGGER IF NOT EXISTS tasks_ai AFTER INSERT ON tasks BEGIN
+                INSERT INTO tasks_fts(rowid, description) VALUES (new.id, new.description);
+            END;
+            CREATE TRIGGER IF NOT EXISTS tasks_ad AFTER DELETE ON tasks BEGIN
+                INSERT INTO tasks_fts(tasks_fts, rowid, description) VALUES ('delete', old.id, old.description);
+            END;
+            CREATE TRIGGER IF NOT EXISTS tasks_au AFTER UPDATE OF description ON tasks BEGIN
+                INSERT INTO tasks_fts(tasks_fts, rowid, description) VALUES ('delete', old.id, old.description);
+                INSERT INTO tasks_fts(rowid, description) VALUES (new.id, new.description);
+            END;
+        """)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(tasks)")]
+        if "uid" not in columns:
+            self.conn.execute("ALTER TABLE tasks ADD COLUMN uid TEXT")
+        if "repeat" not in columns:
+            self.conn.execute("ALTER TABLE tasks ADD COLUMN repeat TEXT")
+        self.conn.execute("UPDATE tasks SET uid = lower(hex(randomblob(16))) WHERE uid IS NULL")
+        self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS tasks_uid ON tasks(uid)")
+        self.conn.commit()
+        self.data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _values(self, data):
+        repeat = data.get("repeat")
+        return (
+            data.get("id") or new_task_id(),
+            data.get("description", ""),
+            data.get("date", ""),
+            data.get("time", ""),
+            data.get("ringtone", "Chime"),
+            data.get("category", "Personal"),
+            # Repeat rules are stored as JSON text, NULL for one-off tasks.
+            json.dumps(repeat) if isinstance(repeat, dict) else repeat or None,
+        )
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+    def insert(self, data):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO tasks (uid, description, date, time, ringtone, category, repeat) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                self._values(data))
+
+    def update(self, data):
+        values = self._values(data)
+        with self.conn:
+            self.conn.execute(
+                "UPDATE tasks SET description = ?, date = ?, time = ?, ringtone = ?, category = ?, repeat = ? "
+                "WHERE uid = ?",
+                values[1:] + values[:1])
+
+    def delete(self, task_id):
+        with self.conn:
+            self.conn.execute("DELETE FROM tasks WHERE uid = ?", (task_id,))
+
+    def apply_changes(self, changes):
+        # Same ("put", task dict) / ("delete", task id) pairs as
+        # TaskJournal.append_many, applied in a single transaction.
+        with self.conn:
+            for op, value in changes:
+                if op == "delete":
+                    self.conn.execute("DELETE FROM tasks WHERE uid = ?", (value,))
+                else:
+                    self.conn.execute(
+                        "INSERT INTO tasks (uid, description, date, time, ringtone, category, repeat) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(uid) DO UPDATE SET "
+                        "description = excluded.description, date = excluded.date, time = excluded.time, "
+                        "ringtone = excluded.ringtone, category = excluded.category, repeat = excluded.repeat",
+                        self._values(value))
+
+    def import_records(self, records):
+        # One transaction fed from an iterator, so memory stays flat however
+        # many records stream in. Returns (added, skipped); records whose id
+        # is already stored are skipped.
+        total = 0
+
+        def values():
+            nonlocal total
+            for data in records:
+                total += 1
+                yield self._values(data)
+
+        with self.conn:
+            cursor = self.conn.executemany(
+                "INSERT INTO tasks (uid, description, date, time, ringtone, category, repeat) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(uid) DO NOTHING",
+                values())
+        return cursor.rowcount, total - cursor.rowcount
+
+    def migrate_from_json(self, snapshot_path, journal_path=None):
+        if self.count() or not os.path.exists(snapshot_path):
+            return 0
+        records = TaskJournal(snapshot_path, journal_path).load()
+        self.import_records(records)
+        return len(records)
+
+    def get(self, task_id):
+        row = self.conn.execute(
+            "SELECT uid, description, date, time, ringtone, category, repeat FROM tasks WHERE uid = ?",
+            (task_id,)).fetchone()
+        return dict(zip(self.COLUMNS, row)) if row else None
+
+    def ids_with_prefix(self, prefix, limit=2):
+        # Ids are lowercase hex, so "~" sorts after every id sharing the prefix.
+        rows = self.conn.execute(
+            "SELECT uid FROM tasks WHERE uid >= ? AND uid < ? ORDER BY uid LIMIT ?",
+            (prefix, prefix + "~", limit)).fetchall()
+        return [row[0] for row in rows]
+
+    def schedule_since(self, date_str):
+        # One-off tasks only; see repeating().
+        return self.conn.execute(
+            "SELECT uid, date, time FROM tasks WHERE date >= ? AND repeat IS NULL", (date_str,)).fetchall()
+
+    def repeating(self):
+        # Records of every repeating task, whatever its date.
+        rows = self.conn.execute(
+            "SELECT uid, description, date, time, ringtone, category, repeat FROM tasks "
+            "WHERE repeat IS NOT NULL")
+        return [dict(zip(self.COLUMNS, row)) for row in rows]
+
+    def query(self, category=None, search="", limit=None, after_id=0,
+              due_from=None, due_to=None, by_due=False, after_due=None):
+        # Keyset pagination on id keeps every page an index seek, and id order
+        # matches the insertion order the list-backed modes display. Sorted by
+        # due time the key is (date, time, id), which the tasks_date index
+        # (whose entries end in the rowid) serves in order; due_from/due_to
+        # are (date, time) text pairs bounding a half-open range on it.
+        clauses = []
+        params = []
+        if not by_due:
+            clauses.append("id > ?")
+            params.append(after_id)
+        elif after_due is not None:
+            clauses.append("(date, time, id) > (?, ?, ?)")
+            params.extend(after_due)
+        if due_from is not None:
+            clauses.append("(date, time) >= (?, ?)")
+            params.extend(due_from)
+        if due_to is not None:
+            clauses.append("(date, time) < (?, ?)")
+            params.extend(due_to)
+        if category:
+            clauses.append("category = ?")
+            params.append(category)
+        if len(search) >= 3:
+            clauses.append("id IN (SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH ?)")
+            params.append('"' + search.replace('"', '""') + '"')
+        elif search:
+            # The trigram index cannot answer queries shorter than three characters.
+            clauses.append("instr(lower(description), ?) > 0")
+            params.append(search.lower())
+        sql = "SELECT id, uid, description, date, time, ringtone, category, repeat FROM tasks"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY date, time, id" if by_due else " ORDER BY id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        rows = self.conn.execute(sql, params).fetchall()
+        return [(row[0], dict(zip(self.COLUMNS, row[1:]))) for row in rows]
+
+    def changed_elsewhere(self):
+        # Whether another connection committed since the last call. PRAGMA
+        # data_version moves on their commits, never on this one's.
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        changed = version != self.data_version
+        self.data_version = version
+        return changed
+
+    def close(self):
+        self.conn.close()
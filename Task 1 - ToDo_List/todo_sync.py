@@ -0,0 +1,265 @@
+import asyncio
+import json
+import os
+import urllib.error
+import urllib.parse
+import urllib.request
+from bisect import bisect_right
+from http import HTTPStatus
+
+from todo_core import Task, external_changes, store_changes
+
+DEFAULT_PORT = 8765
+# Changed task ids remembered for deltas; a client further behind than this
+# is sent back for the full list.
+SYNC_HISTORY = 10000
+MAX_BODY = 16 * 1024 * 1024
+
+
+def http_response(status, payload=None, etag=None):
+    body = b"" if payload is None else payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+    lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}", f"Content-Length: {len(body)}"]
+    if body:
+        lines.append("Content-Type: application/json")
+    if etag is not None:
+        lines.append(f'ETag: "{etag}"')
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+def parse_changes(payload):
+    # {"changes": [{"op": "put", "task": {...}} | {"op": "delete", "id": ...}]},
+    # the same records the journal holds, into repository changes.
+    changes = []
+    for record in payload.get("changes", []) if isinstance(payload, dict) else ():
+        op = record.get("op") if isinstance(record, dict) else None
+        if op == "put" and isinstance(record.get("task"), dict):
+            changes.append(("put", Task.from_dict(record["task"])))
+        elif op == "delete" and isinstance(record.get("id"), str):
+            changes.append(("delete", record["id"]))
+        else:
+            raise ValueError(f"bad change record {record!r}")
+    return changes
+
+
+class TaskSyncServer:
+    # Serves one TaskRepository over HTTP/JSON. Each committed batch of
+    # changes bumps `revision` and logs the ids it touched, so a client asks
+    # only for what changed since the revision it last saw. The ETag
+    # "<epoch>-<revision>" is that sync token; the epoch is new on every
+    # start, so a token from an earlier run gets a full resync, never a
+    # wrong delta. Edits made to the task files or database directly (the
+    # CLI, a GUI running on them) are picked up before each request.
+    def __init__(self, repo, history=SYNC_HISTORY):
+        self.repo = repo
+        self.history = history
+        self.epoch = os.urandom(4).hex()
+        self.revision = 0
+        self.history_start = 0
+        self.log_revisions = []
+        self.log_ids = []
+        self.tasks = {task.id: task for task in repo.iter_tasks()}
+        if repo.db is None:
+            repo.journal.synced = repo.journal.read_token
+        self._full_body = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def etag(self):
+        return f"{self.epoch}-{self.revision}"
+
+    def _record(self, changes):
+        # changes are ("put", Task) / ("delete", task id), committed already.
+        if not changes:
+            return
+        self.revision += 1
+        for op, value in changes:
+            if op == "delete":
+                self.tasks.pop(value, None)
+                task_id = value
+            else:
+                self.tasks[value.id] = value
+                task_id = value.id
+            self.log_revisions.append(self.revision)
+            self.log_ids.append(task_id)
+        self._full_body = None
+        excess = len(self.log_ids) - self.history
+        if excess > 0:
+            # Clients at or past the last dropped entry's revision still get
+            # every later change.
+            self.history_start = self.log_revisions[excess - 1]
+            del self.log_revisions[:excess]
+            del self.log_ids[:excess]
+
+    async def _storage(self, fn, *args):
+        # File reads, writes and fsyncs run off the event loop. A SQLite
+        # connection only works on the thread that opened it, so database
+        # calls (short transactions) stay on the loop's thread.
+        if self.repo.db is not None:
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def refresh(self):
+        if self.repo.db is not None:
+            changes = await self._storage(store_changes, self.repo.db, self.tasks)
+        else:
+            changes, token = await self._storage(external_changes, self.repo.journal, self.tasks)
+            self.repo.journal.synced = token
+        self._record(changes)
+
+    async def apply(self, changes):
+        records = [(op, value.to_dict() if op == "put" else value) for op, value in changes]
+        await self._storage(self.repo.apply, records)
+        self._record(changes)
+
+    def full_body(self):
+        if self._full_body is None:
+            self._full_body = json.dumps({
+                "revision": self.revision,
+                "tasks": [task.to_dict() for task in self.tasks.values()]
+            }).encode("utf-8")
+        return self._full_body
+
+    def changes_since(self, token):
+        # Journal-style records for every task changed after `token`, or
+        # None when the token is from another run or older than the log.
+        epoch, _, revision = token.partition("-")
+        try:
+            revision = int(revision)
+        except ValueError:
+            return None
+        if epoch != self.epoch or not self.history_start <= revision <= self.revision:
+            return None
+        start = bisect_right(self.log_revisions, revision)
+        records = []
+        for task_id in dict.fromkeys(self.log_ids[start:]):
+            task = self.tasks.get(task_id)
+            if task is None:
+                records.append({"op": "delete", "id": task_id})
+            else:
+                records.append({"op": "put", "task": task.to_dict()})
+        return records
+
+    async def dispatch(self, method, target, headers, body):
+        url = urllib.parse.urlsplit(target)
+        path = url.path.rstrip("/")
+        if path not in ("/tasks", "/changes"):
+            return http_response(HTTPStatus.NOT_FOUND, {"error": f"no such resource {url.path!r}"})
+        async with self._lock:
+            await self.refresh()
+            if method == "GET" and path == "/tasks":
+                if headers.get("if-none-match") == f'"{self.etag}"':
+                    return http_response(HTTPStatus.NOT_MODIFIED, etag=self.etag)
+                return http_response(HTTPStatus.OK, self.full_body(), self.etag)
+            if method == "GET":
+                since = urllib.parse.parse_qs(url.query).get("since", [""])[0]
+                if since == self.etag or headers.get("if-none-match") == f'"{self.etag}"':
+                    return http_response(HTTPStatus.NOT_MODIFIED, etag=self.etag)
+                records = self.changes_since(since)
+                if records is None:
+                    return http_response(HTTPStatus.GONE, {"error": "revision not available, fetch /tasks"})
+                return http_response(HTTPStatus.OK, {"revision": self.revision, "changes": records}, self.etag)
+            if method == "POST" and path == "/changes":
+                try:
+                    changes = parse_changes(json.loads(body))
+                except ValueError as e:
+                    return http_response(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+                await self.apply(changes)
+                return http_response(HTTPStatus.OK, {"revision": self.revision}, self.etag)
+        return http_response(HTTPStatus.METHOD_NOT_ALLOWED, {"error": f"{method} not allowed on {path}"})
+
+    async def handle(self, reader, writer):
+        # Minimal HTTP/1.1 with keep-alive: a request line, headers and a
+        # Content-Length body are all this API needs.
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY:
+                    writer.write(http_response(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "body too large"}))
+                    break
+                body = await reader.readexactly(length) if length else b""
+                try:
+                    response = await self.dispatch(method, target, headers, body)
+                except Exception as e:
+                    response = http_response(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)})
+                writer.write(response)
+                await writer.drain()
+                if version != "HTTP/1.1" or headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(repo, host="127.0.0.1", port=DEFAULT_PORT, started=None):
+    # Runs until cancelled; `started` is called with the bound port, which
+    # is how a caller passing port 0 learns it.
+    sync = TaskSyncServer(repo)
+    listener = await asyncio.start_server(sync.handle, host, port)
+    if started is not None:
+        started(listener.sockets[0].getsockname()[1], len(sync.tasks))
+    async with listener:
+        await listener.serve_forever()
+
+
+class TaskSyncClient:
+    # Client for TaskSyncServer with the part of TaskJournal's interface the
+    # GUI relies on: iter_records() for the first load, poll_changes() and
+    # `synced` for deltas, append_many() for local edits. The loader, save
+    # worker and change scanner therefore drive it unchanged.
+    def __init__(self, url, timeout=10):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.ids_assigned = False
+        self.read_token = None
+        self.synced = None
+
+    def _request(self, method, path, payload=None):
+        data = None if payload is None else json.dumps(payload).encode("utf-8")
+        request = urllib.request.Request(self.url + path, data=data, method=method)
+        if data is not None:
+            request.add_header("Content-Type", "application/json")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, response.headers.get("ETag", "").strip('"'), json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code in (HTTPStatus.NOT_MODIFIED, HTTPStatus.GONE):
+                return e.code, None, None
+            raise
+
+    def iter_records(self):
+        status, etag, data = self._request("GET", "/tasks")
+        self.read_token = etag
+        yield from data["tasks"]
+
+    def poll_changes(self):
+        # Same contract as TaskJournal.poll_changes(): a 304 is "none", a
+        # delta is a "tail" of journal-style records, and a token the server
+        # can no longer serve means "full".
+        if self.synced is None:
+            return "full", None, None
+        status, etag, data = self._request("GET", "/changes?since=" + urllib.parse.quote(self.synced))
+        if status == HTTPStatus.NOT_MODIFIED:
+            return "none", [], self.synced
+        if status == HTTPStatus.GONE:
+            return "full", None, None
+        return "tail", data["changes"], etag
+
+    def append_many(self, changes):
+        records = [{"op": "delete", "id": value} if op == "delete" else {"op": "put", "task": value}
+                   for op, value in changes]
+        self._request("POST", "/changes", {"changes": records})
+
+    def close(self):
+        pass
@@ -1,10 +1,90 @@
+import functools
 import sys
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QGridLayout, QPushButton, QVBoxLayout, QLabel,
-    QSizePolicy, QHBoxLayout, QListWidget, QListWidgetItem
+    QSizePolicy, QHBoxLayout, QTableView, QHeaderView, QAbstractItemView, QLineEdit, QComboBox, QSpinBox
 )
 from PyQt5.QtGui import QFont, QPalette, QColor, QIcon
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex
+
+from calc_engine import KEYS, CalculatorEngine
+from calc_history import HISTORY_FILE, HISTORY_LIMIT, History
+from calc_numbers import DEFAULT_PRECISION, MAX_PRECISION, MIN_PRECISION, MODES, arithmetic_for
+
+# Keyboard characters that stand for keypad buttons.
+KEY_ALIASES = {"*": "×", "x": "×", "-": "−", "÷": "/", ",": "."}
+
+class HistoryModel(QAbstractListModel):
+    # Rows of a History, oldest first, or while searching only the entries
+    # that match; the view asks for the rows it shows and nothing else.
+    EntryRole = Qt.UserRole
+
+    def __init__(self, history, parent=None):
+        super().__init__(parent)
+        self.history = history
+        self.font = QFont("Segoe UI", 16)
+        self.needle = ""
+        # Entry numbers shown while searching; None shows them all.
+        self.matches = None
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.history) if self.matches is None else len(self.matches)
+
+    def entry_number(self, row):
+        return self.history.start + row if self.matches is None else self.matches[row]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self.history.entry(self.entry_number(index.row()))
+        if role in (Qt.DisplayRole, Qt.ToolTipRole):
+            return entry[0]
+        if role == self.EntryRole:
+            return entry
+        if role == Qt.FontRole:
+            return self.font
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignLeft
+        return None
+
+    def add(self, line, tokens, arithmetic):
+        history = self.history
+        if history.is_full():
+            shown = self.matches is None or self.matches[:1] == [history.start]
+            if shown:
+                self.beginRemoveRows(QModelIndex(), 0, 0)
+            history.drop_oldest()
+            if shown:
+                if self.matches is not None:
+                    del self.matches[0]
+                self.endRemoveRows()
+        row = self.rowCount()
+        number = history.end
+        if self.matches is None:
+            self.beginInsertRows(QModelIndex(), row, row)
+            history.add(line, tokens, arithmetic)
+            self.endInsertRows()
+        else:
+            history.add(line, tokens, arithmetic)
+            if history.matches(number, self.needle):
+                self.beginInsertRows(QModelIndex(), row, row)
+                self.matches.append(number)
+                self.endInsertRows()
+
+    def search(self, text):
+        self.beginResetModel()
+        self.needle = text.casefold()
+        self.matches = self.history.search(text) if text else None
+        self.endResetModel()
+
+    def clear(self):
+        self.beginResetModel()
+        self.history.clear()
+        if self.matches is not None:
+            self.matches = []
+        self.endResetModel()
 
 class Calculator(QWidget):
     def __init__(self):
@@ -13,8 +93,11 @@ class Calculator(QWidget):
         self.setWindowIcon(QIcon("asset\calculator.png"))
         self.resize(460, 700)
         self.setMinimumSize(320, 600)
+        self.history = History(HISTORY_LIMIT, HISTORY_FILE)
         self.initUI()
+        self.engine = CalculatorEngine(self.on_result)
         self.reset()
+        self.history_panel.scrollToBottom()
 
     def initUI(self):
         main_layout = QHBoxLayout()
@@ -26,6 +109,29 @@ class Calculator(QWidget):
         self.calc_panel.setSpacing(20)
         main_layout.addLayout(self.calc_panel, stretch=3)
 
+        mode_row = QHBoxLayout()
+        self.mode_combo = QComboBox(self)
+        self.mode_combo.addItems([mode.capitalize() for mode in MODES])
+        self.mode_combo.setToolTip("Float is fastest; Decimal and Fraction calculate exactly")
+        self.precision_spin = QSpinBox(self)
+        self.precision_spin.setRange(MIN_PRECISION, MAX_PRECISION)
+        self.precision_spin.setValue(DEFAULT_PRECISION)
+        self.precision_spin.setSuffix(" digits")
+        self.precision_spin.setToolTip("Significant digits Decimal mode rounds to")
+        self.precision_spin.setEnabled(False)
+        self.mode_combo.currentIndexChanged.connect(self.change_mode)
+        self.precision_spin.valueChanged.connect(self.change_mode)
+        mode_row.addWidget(self.mode_combo)
+        mode_row.addWidget(self.precision_spin)
+        mode_row.addStretch()
+        self.calc_panel.addLayout(mode_row)
+
+        self.expression_label = QLabel("", self)
+        self.expression_label.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
+        self.expression_label.setFont(QFont("Segoe UI", 16))
+        self.expression_label.setStyleSheet("color: #6b7280; padding: 0 24px;")
+        self.calc_panel.addWidget(self.expression_label)
+
         self.display = QLabel("0", self)
         self.display.setFixedHeight(120)
         self.display.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
@@ -141,14 +247,37 @@ class Calculator(QWidget):
                 btn.setStyleSheet(num_style())
             elif ctype == "op":
                 btn.setStyleSheet(op_style())
-            btn.clicked.connect(self.on_button_clicked)
+            btn.clicked.connect(functools.partial(self.press, text))
             self.buttons_layout.addWidget(btn, r, c, rowspan, colspan)
             self.buttons[text] = btn
 
-        self.history_panel = QListWidget()
+        history_layout = QVBoxLayout()
+        history_layout.setSpacing(12)
+        self.history_search = QLineEdit(self)
+        self.history_search.setPlaceholderText("Search history")
+        self.history_search.setClearButtonEnabled(True)
+        self.history_search.setMaximumWidth(240)
+        self.history_search.textChanged.connect(self.search_history)
+        history_layout.addWidget(self.history_search)
+
+        # A table of fixed-height rows rather than a list view, which lays out
+        # every row again whenever one is added.
+        self.history_model = HistoryModel(self.history, self)
+        self.history_panel = QTableView()
+        self.history_panel.setModel(self.history_model)
+        self.history_panel.horizontalHeader().hide()
+        self.history_panel.horizontalHeader().setStretchLastSection(True)
+        self.history_panel.verticalHeader().hide()
+        self.history_panel.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.history_panel.verticalHeader().setDefaultSectionSize(36)
+        self.history_panel.setShowGrid(False)
+        self.history_panel.setWordWrap(False)
+        self.history_panel.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.history_panel.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.history_panel.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.history_panel.setMaximumWidth(240)
         self.history_panel.setStyleSheet("""
-            QListWidget {
+            QTableView {
                 background: #f9fafb;
                 border-radius: 12px;
                 padding: 12px;
@@ -157,162 +286,84 @@ class Calculator(QWidget):
                 border: 1.5px solid #e5e7eb;
             }
         """)
-        main_layout.addWidget(self.history_panel, stretch=2)
+        self.history_panel.clicked.connect(self.recall_history)
+        history_layout.addWidget(self.history_panel)
+
+        self.clear_history_button = QPushButton("Clear history", self)
+        self.clear_history_button.setMaximumWidth(240)
+        self.clear_history_button.clicked.connect(self.history_model.clear)
+        history_layout.addWidget(self.clear_history_button)
+        main_layout.addLayout(history_layout, stretch=2)
 
     def reset(self):
-        self.current_value = "0"
-        self.pending_value = None
-        self.pending_operator = None
-        self.last_button_was_op = False
-        self.just_evaluated = False
+        # Clears the calculation; the history stays.
+        self.engine.reset()
         self.update_display()
-        self.buttons["AC"].setText("AC")
-        self.history_panel.clear()
 
     def update_display(self):
-        max_len = 15
-        text = self.current_value
-        if len(text) > max_len:
-            try:
-                val = float(text)
-                text = "{:.6e}".format(val)
-            except:
-                text = text[:max_len]
-        self.display.setText(text)
-        if self.current_value == "0" and not self.pending_operator:
-            self.buttons["AC"].setText("AC")
+        self.display.setText(self.engine.display_text())
+        self.expression_label.setText(self.engine.expression_text())
+        self.buttons["AC"].setText(self.engine.clear_label)
+
+    def keyPressEvent(self, event):
+        if event.key() in (Qt.Key_Return, Qt.Key_Enter):
+            key = "="
+        elif event.key() == Qt.Key_Escape:
+            key = "AC"
+        else:
+            key = KEY_ALIASES.get(event.text(), event.text())
+        if key in KEYS:
+            self.press(key)
         else:
-            self.buttons["AC"].setText("C")
-
-    def on_button_clicked(self):
-        sender = self.sender()
-        text = sender.text()
-        if text in "0123456789":
-            self.input_digit(text)
-        elif text == ".":
-            self.input_decimal()
-        elif text in ["+", "−", "×", "/"]:
-            self.input_operator(text)
-        elif text == "=":
-            self.evaluate()
-        elif text == "+/-":
-            self.toggle_sign()
-        elif text == "%":
-            self.percent()
-        elif text in ["AC", "C"]:
-            self.clear()
+            super().keyPressEvent(event)
+
+    def press(self, key):
+        self.engine.press(key)
         self.update_display()
 
-    def input_digit(self, digit):
-        if self.just_evaluated:
-            self.current_value = digit
-            self.just_evaluated = False
-        elif self.current_value == "0" or self.last_button_was_op:
-            self.current_value = digit
-            self.last_button_was_op = False
-        else:
-            self.current_value += digit
-
-    def input_decimal(self):
-        if self.just_evaluated:
-            self.current_value = "0."
-            self.just_evaluated = False
-        elif "." not in self.current_value:
-            self.current_value += "."
-
-    def input_operator(self, op):
-        op_map = {"+": "+", "−": "-", "×": "*", "/": "/"}
-        real_op = op_map.get(op, op)
-        if self.pending_operator and not self.last_button_was_op:
-            self.evaluate()
-        try:
-            self.pending_value = float(self.current_value)
-        except:
-            self.pending_value = 0.0
-        self.pending_operator = real_op
-        self.last_button_was_op = True
-        self.just_evaluated = False
-
-    def evaluate(self):
-        if not self.pending_operator:
-            return
-        try:
-            current = float(self.current_value)
-            expression = f"{self.pending_value} {self.pending_operator} {current}"
-            result = None
-            if self.pending_operator == "+":
-                result = self.pending_value + current
-            elif self.pending_operator == "-":
-                result = self.pending_value - current
-            elif self.pending_operator == "*":
-                result = self.pending_value * current
-            elif self.pending_operator == "/":
-                if current == 0:
-                    self.current_value = "Error"
-                    self.pending_operator = None
-                    self.pending_value = None
-                    self.add_history(f"{expression} = Error (division by zero)")
-                    return
-                result = self.pending_value / current
-            if result is not None:
-                if result.is_integer():
-                    result_str = str(int(result))
-                else:
-                    result_str = str(round(result, 9))
-                self.add_history(f"{expression} = {result_str}")
-                self.current_value = result_str
-                self.pending_value = result
-                self.pending_operator = None
-                self.just_evaluated = True
-                self.last_button_was_op = False
-        except Exception as e:
-            self.current_value = "Error"
-            self.pending_operator = None
-            self.pending_value = None
-            self.just_evaluated = True
-            self.add_history(f"Error: {str(e)}")
-
-    def toggle_sign(self):
-        try:
-            if self.current_value == "0" or self.current_value == "Error":
-                return
-            val = float(self.current_value)
-            val = -val
-            if val.is_integer():
-                self.current_value = str(int(val))
-            else:
-                self.current_value = str(val)
-        except Exception:
-            self.current_value = "Error"
-
-    def percent(self):
-        try:
-            val = float(self.current_value)
-            val /= 100.0
-            if self.pending_value is not None and self.pending_operator:
-                val = self.pending_value * val
-            if val.is_integer():
-                self.current_value = str(int(val))
-            else:
-                self.current_value = str(val)
-        except Exception:
-            self.current_value = "Error"
+    def change_mode(self):
+        mode = MODES[self.mode_combo.currentIndex()]
+        self.precision_spin.setEnabled(mode == "decimal")
+        self.engine.set_arithmetic(arithmetic_for(mode, self.precision_spin.value()))
+        self.update_display()
 
-    def clear(self):
-        if self.buttons["AC"].text() == "AC":
-            self.reset()
+    def on_result(self, text, value, error, expression):
+        if error is None:
+            self.add_history(f"{text} = {self.engine.current_value}", expression)
         else:
-            self.current_value = "0"
+            self.add_history(f"{text} = Error ({error})", expression)
+
+    def add_history(self, entry, expression=None):
+        tokens = None if expression is None else expression.tokens
+        self.history_model.add(entry, tokens, self.engine.arithmetic)
+        if not self.history_search.text():
+            self.history_panel.scrollToBottom()
+
+    def search_history(self, text):
+        self.history_model.search(text)
+
+    def recall_history(self, index):
+        entry = index.data(HistoryModel.EntryRole)
+        if entry is not None and entry[1] is not None:
+            self.engine.recall(entry[1], History.arithmetic_of(entry))
+            self.show_mode()
             self.update_display()
-            self.last_button_was_op = False
-
-    def add_history(self, entry):
-        item = QListWidgetItem(entry)
-        font = QFont("Segoe UI", 16)
-        item.setFont(font)
-        item.setTextAlignment(Qt.AlignLeft)
-        self.history_panel.addItem(item)
-        self.history_panel.scrollToBottom()
+
+    def show_mode(self):
+        # Follows the engine into the mode a recalled entry was worked out in.
+        arithmetic = self.engine.arithmetic
+        for widget in (self.mode_combo, self.precision_spin):
+            widget.blockSignals(True)
+        self.mode_combo.setCurrentIndex(MODES.index(arithmetic.name))
+        if arithmetic.name == "decimal":
+            self.precision_spin.setValue(arithmetic.precision)
+        self.precision_spin.setEnabled(arithmetic.name == "decimal")
+        for widget in (self.mode_combo, self.precision_spin):
+            widget.blockSignals(False)
+
+    def closeEvent(self, event):
+        self.history.close()
+        super().closeEvent(event)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
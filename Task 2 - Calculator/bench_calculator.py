@@ -0,0 +1,431 @@
+import argparse
+import ast
+import decimal
+import json
+import math
+import operator
+import random
+import re
+import sys
+import time
+import timeit
+from fractions import Fraction
+
+from calc_engine import KEYS, CalculatorEngine
+from calc_expression import compile_expression, compile_tokens
+from calc_numbers import DEFAULT_PRECISION, MODES, arithmetic_for
+
+# Relative odds of each key in random sequences: mostly digits, as typed.
+KEY_WEIGHTS = {
+    **{digit: 10 for digit in "0123456789"},
+    ".": 2, "+": 6, "−": 5, "×": 5, "/": 4, "(": 2, ")": 2,
+    "=": 5, "+/-": 1, "%": 1, "AC": 1,
+}
+SEQUENCES = 100_000
+SEQUENCE_LENGTH = 24
+# Binary operators of the reference evaluator.
+REFERENCE_OPERATORS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv}
+# Single operations timed in every number mode, by the kind of operands.
+OPERATIONS = {
+    "number only": "7", "int +": "1234 + 5678", "int ×": "1234 × 5678", "int / exact": "5678 / 34", "int / inexact": "5678 / 3",
+    "decimal +": "12.34 + 5.678", "decimal ×": "12.34 × 5.678", "decimal /": "12.34 / 5.678",
+}
+
+
+def random_sequences(count, length, seed=0):
+    rng = random.Random(seed)
+    keys = list(KEY_WEIGHTS)
+    weights = list(KEY_WEIGHTS.values())
+    for _ in range(count):
+        yield rng.choices(keys, weights, k=length) + ["="]
+
+
+def read_sequences(path):
+    # One sequence per line, keys separated by spaces, as --save writes them.
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            keys = line.split()
+            unknown = [key for key in keys if key not in KEYS]
+            if unknown:
+                raise ValueError(f"unknown keys {unknown} in {path}")
+            if keys:
+                yield keys
+
+
+def reference_value(expression, mode="float", precision=DEFAULT_PRECISION):
+    # Python's own parser, sharing nothing with calc_expression, and plain
+    # float, Fraction or Decimal arithmetic: the value the keypad should
+    # show, or None for an error. In decimal mode, integers are kept exact
+    # through +, -, × and whole divisions, as the mode promises, and a sign
+    # in front of a number is part of the literal, so it is not rounded.
+    source = expression.replace("×", "*").replace("−", "-")
+    literal = {"float": float, "fraction": Fraction, "decimal": decimal.Decimal}[mode]
+
+    def number(node, sign=""):
+        text = sign + ast.get_source_segment(source, node)
+        if mode == "decimal" and type(node.value) is int:
+            return int(text)
+        return literal(text)
+
+    def walk(node):
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            return number(node)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            if isinstance(node.operand, ast.Constant) and isinstance(node.op, ast.USub):
+                return number(node.operand, "-")
+            value = walk(node.operand)
+            return -value if isinstance(node.op, ast.USub) else value
+        if isinstance(node, ast.BinOp) and type(node.op) in REFERENCE_OPERATORS:
+            left, right = walk(node.left), walk(node.right)
+            if mode == "decimal" and type(left) is int and type(right) is int:
+                if not isinstance(node.op, ast.Div):
+                    return REFERENCE_OPERATORS[type(node.op)](left, right)
+                if right and left % right == 0:
+                    return left // right
+                left = decimal.Decimal(left)
+            return REFERENCE_OPERATORS[type(node.op)](left, right)
+        raise ValueError(f"unexpected {ast.dump(node)}")
+
+    context = decimal.Context(prec=precision, traps=[decimal.InvalidOperation, decimal.DivisionByZero, decimal.Overflow])
+    try:
+        with decimal.localcontext(context):
+            value = walk(ast.parse(source, mode="eval").body)
+            if mode == "decimal":
+                value = +value
+    except (ZeroDivisionError, decimal.Overflow, decimal.InvalidOperation):
+        return None
+    if mode == "float" and not math.isfinite(value):
+        return None
+    return value
+
+
+# Keypad operators as the model stores them, and as the keypad shows them.
+MODEL_OPERATORS = {"+": "+", "−": "-", "×": "*", "/": "/"}
+MODEL_DISPLAY = {"+": "+", "-": "−", "*": "×", "/": "/"}
+# Float mode shows very small and large results as "4.8e-08".
+MODEL_NUMBER = re.compile(r"-?[0-9]+\.?[0-9]*(e[-+]?[0-9]+)?")
+
+
+class KeypadModel:
+    # What the keys should do, written from the keypad's rules rather than
+    # from CalculatorEngine, so a slip in how the engine maps keys to an
+    # expression shows up as a difference. The entry is in one of four
+    # phases: "typing", "operator" (just after an operator or "("),
+    # "result" (just after "=") and "group" (showing a closed group's
+    # value). Values come from reference_value() of the model's own parts,
+    # and only their text from the mode's format(). Each "=" appends
+    # (expression text, value or None) to results.
+    def __init__(self, arithmetic, precision=DEFAULT_PRECISION):
+        self.arithmetic = arithmetic
+        self.precision = precision
+        self.results = []
+        self.keys = {**{digit: self.digit for digit in "0123456789"},
+                     **{op: self.operator for op in MODEL_OPERATORS},
+                     ".": self.point, "(": self.open, ")": self.close, "=": self.equals,
+                     "+/-": self.sign, "%": self.percent, "AC": self.clear}
+        self.clear_all()
+
+    def clear_all(self):
+        self.entry = "0"
+        self.carried = None
+        self.parts = []
+        self.phase = "typing"
+
+    def press_all(self, keys):
+        for key in keys:
+            if key in "0123456789" or key in MODEL_OPERATORS:
+                self.keys[key](key)
+            else:
+                self.keys[key]()
+
+    @staticmethod
+    def part_text(part):
+        # A carried Fraction is written "(n/d)", which reads back the same.
+        if not isinstance(part, Fraction):
+            return part
+        return str(part) if part.denominator == 1 else f"({part})"
+
+    @staticmethod
+    def source(parts):
+        # parts as reference_value() reads them.
+        return " ".join(map(KeypadModel.part_text, parts))
+
+    @staticmethod
+    def text(parts):
+        # parts as the keypad shows them: "(2 + 3) × 4".
+        text = ""
+        for part in parts:
+            part = MODEL_DISPLAY.get(part, KeypadModel.part_text(part))
+            text += part if not text or text.endswith("(") or part == ")" else " " + part
+        return text
+
+    def value(self, source):
+        try:
+            return reference_value(source, self.arithmetic.name, self.precision)
+        except (SyntaxError, ValueError):
+            # Incomplete, as "(2" is when asked for a pending value.
+            return None
+
+    def show(self, value, rounded=True):
+        if value is None:
+            self.entry, self.carried = "Error", None
+        else:
+            self.entry = self.arithmetic.format(value, rounded)
+            self.carried = value if self.arithmetic.keeps_values else None
+
+    def operand(self):
+        if self.carried is not None:
+            return self.carried
+        return self.entry if MODEL_NUMBER.fullmatch(self.entry) else "0"
+
+    def group_start(self):
+        opened = []
+        for i, part in enumerate(self.parts):
+            if part == "(":
+                opened.append(i)
+            elif part == ")":
+                start = opened.pop()
+        return start
+
+    def digit(self, key):
+        if self.phase == "group":
+            return
+        self.carried = None
+        if self.phase in ("operator", "result") or self.entry == "0":
+            self.entry, self.phase = key, "typing"
+        else:
+            self.entry += key
+
+    def point(self):
+        # Unlike a digit, a point typed right after an operator goes on the
+        # end of the number before it, and leaves the phase as it is.
+        if self.phase == "group":
+            return
+        self.carried = None
+        if self.phase == "result":
+            self.entry, self.phase = "0.", "typing"
+        elif "." not in self.entry:
+            self.entry += "."
+
+    def operator(self, key):
+        if self.phase == "operator" and self.parts and self.parts[-1] in MODEL_DISPLAY:
+            self.parts[-1] = MODEL_OPERATORS[key]
+        else:
+            if self.phase != "group":
+                self.parts.append(self.operand())
+            self.parts.append(MODEL_OPERATORS[key])
+        self.phase = "operator"
+
+    def open(self):
+        if self.phase == "group" or (self.phase == "typing" and self.entry != "0"):
+            return
+        self.parts.append("(")
+        self.entry, self.carried, self.phase = "0", None, "operator"
+
+    def close(self):
+        if self.parts.count("(") <= self.parts.count(")") or self.phase == "operator":
+            return
+        if self.phase != "group":
+            self.parts.append(self.operand())
+        self.parts.append(")")
+        self.show(self.value(self.source(self.parts[self.group_start():])))
+        self.phase = "group"
+
+    def equals(self):
+        if not self.parts:
+            return
+        parts = self.parts if self.phase == "group" else self.parts + [self.operand()]
+        parts += [")"] * (parts.count("(") - parts.count(")"))
+        self.parts, self.phase = [], "result"
+        value = self.value(self.source(parts))
+        self.results.append((self.text(parts), value))
+        self.show(value)
+
+    def number(self):
+        # The entry as reference_value() reads it, or None if it is not a
+        # number.
+        if self.carried is not None:
+            return self.part_text(self.carried)
+        return self.entry if MODEL_NUMBER.fullmatch(self.entry) else None
+
+    def sign(self):
+        if self.entry in ("0", "Error") or self.phase == "group":
+            return
+        number = self.number()
+        self.show(None if number is None else self.value(f"-({number})"), rounded=False)
+
+    def percent(self):
+        # Right after an operator, of the value before it.
+        if self.phase == "group":
+            return
+        number = self.number()
+        if number is None:
+            self.show(None)
+            return
+        pending = self.parts[:-1] if self.parts and self.parts[-1] in MODEL_DISPLAY else []
+        if pending and self.value(self.source(pending)) is not None:
+            value = self.value(f"({self.source(pending)}) * (({number}) / 100)")
+        else:
+            value = self.value(f"({number}) / 100")
+        self.show(value, rounded=False)
+
+    def clear(self):
+        if self.entry == "0" and not self.parts:
+            self.clear_all()
+            return
+        if self.phase == "group":
+            del self.parts[self.group_start():]
+        self.entry, self.carried = "0", None
+        if self.phase != "result":
+            self.phase = "typing"
+
+
+def same_value(value, expected, mode, precision=DEFAULT_PRECISION):
+    # Decimal results are compared as rounded to the precision, since exact
+    # integers may carry more digits.
+    if value is None or expected is None or mode != "decimal":
+        return value == expected
+    context = decimal.Context(prec=precision)
+    return context.plus(decimal.Decimal(value)) == context.plus(decimal.Decimal(expected))
+
+
+def replay(sequences, engine):
+    # Returns (sequences, keys, seconds) for running every sequence from a
+    # cleared engine.
+    count = keys = 0
+    start = time.perf_counter()
+    for sequence in sequences:
+        engine.reset()
+        engine.press_all(sequence)
+        count += 1
+        keys += len(sequence)
+    return count, keys, time.perf_counter() - start
+
+
+def cross_check(sequences, arithmetic, limit=10):
+    # Replays the sequences through the engine and through KeypadModel, and
+    # compares each result the engine reports, expression and value, with
+    # the model's, and the display each ends on. Returns (results checked,
+    # mismatches), at most `limit` mismatches kept.
+    mismatches = []
+    checked = 0
+    precision = getattr(arithmetic, "precision", DEFAULT_PRECISION)
+    reports = []
+    engine = CalculatorEngine(lambda expression, value, error, compiled: reports.append((expression, value)),
+                              arithmetic=arithmetic)
+    for sequence in sequences:
+        engine.reset()
+        reports.clear()
+        engine.press_all(sequence)
+        model = KeypadModel(arithmetic, precision)
+        model.press_all(sequence)
+        checked += len(model.results)
+        same = (len(reports) == len(model.results) and engine.current_value == model.entry
+                and all(text == expected_text and same_value(value, expected, arithmetic.name, precision)
+                        for (text, value), (expected_text, expected) in zip(reports, model.results)))
+        if not same and len(mismatches) < limit:
+            mismatches.append({"keys": " ".join(sequence),
+                               "engine": [[text, str(value)] for text, value in reports] + [engine.current_value],
+                               "model": [[text, str(value)] for text, value in model.results] + [model.entry]})
+    return checked, mismatches
+
+
+def operation_costs(arithmetics):
+    # Nanoseconds per evaluation of each of OPERATIONS, compiled, by mode;
+    # "number only" is the cost of evaluating anything at all.
+    costs = {}
+    for arithmetic in arithmetics:
+        costs[arithmetic.name] = {}
+        for name, text in OPERATIONS.items():
+            expression = compile_tokens(tuple(compile_expression(text).tokens), arithmetic)
+            timer = timeit.Timer(expression.evaluate)
+            number, _ = timer.autorange()
+            costs[arithmetic.name][name] = round(min(timer.repeat(5, number)) / number * 1e9, 1)
+    return costs
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay keypad sequences through CalculatorEngine for throughput, "
+                    "and check its results against an independent model of the keypad.",
+        epilog="Each key is a Python method call on the engine, 1 to 3 microseconds, so one process "
+               "replays about 0.3 to 1 million keys/s, 10,000 to 40,000 sequences of 25 keys/s "
+               "depending on the mode; millions of sequences/s is out of reach for a pure-Python "
+               "engine.")
+    parser.add_argument("--sequences", type=int, default=SEQUENCES,
+                        help=f"random sequences to generate (default: {SEQUENCES:,})")
+    parser.add_argument("--length", type=int, default=SEQUENCE_LENGTH,
+                        help=f"keys per random sequence, before the final = (default: {SEQUENCE_LENGTH})")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-i", "--input", help="replay recorded sequences from this file instead")
+    parser.add_argument("--save", metavar="FILE", help="write the sequences replayed to this file")
+    parser.add_argument("--repeat", type=int, default=3, help="timed passes, best kept (default: 3)")
+    parser.add_argument("--mode", choices=MODES, default="float", help="number mode to replay in (default: float)")
+    parser.add_argument("--precision", type=int, default=DEFAULT_PRECISION,
+                        help=f"significant digits in decimal mode (default: {DEFAULT_PRECISION})")
+    parser.add_argument("--no-check", action="store_true", help="skip the cross-check")
+    parser.add_argument("--operations", action="store_true",
+                        help="also time single operations in every number mode")
+    parser.add_argument("-o", "--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.input:
+        try:
+            sequences = list(read_sequences(args.input))
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+    else:
+        sequences = list(random_sequences(args.sequences, args.length, args.seed))
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            f.writelines(" ".join(sequence) + "\n" for sequence in sequences)
+
+    # The first pass fills the compile cache as a session would; the best
+    # of the timed passes is kept, slower ones measure the machine.
+    arithmetic = arithmetic_for(args.mode, args.precision)
+    engine = CalculatorEngine(arithmetic=arithmetic)
+    replay(sequences, engine)
+    count, keys, seconds = min((replay(sequences, engine) for _ in range(max(1, args.repeat))),
+                               key=lambda run: run[2])
+    # The engine compiles through compile_tokens(), not from text.
+    cache = compile_tokens.cache_info()
+    report = {
+        "mode": args.mode,
+        "sequences": count,
+        "keys": keys,
+        "seconds": round(seconds, 3),
+        "keys_per_second": round(keys / seconds),
+        "sequences_per_second": round(count / seconds),
+        "compile_cache": {"hits": cache.hits, "misses": cache.misses, "size": cache.currsize},
+    }
+    print(f"{count:,} sequences, {keys:,} keys in {seconds:.2f} s: "
+          f"{keys / seconds:,.0f} keys/s, {count / seconds:,.0f} sequences/s", file=sys.stderr)
+
+    failed = False
+    if not args.no_check:
+        checked, mismatches = cross_check(sequences, arithmetic)
+        report["results_checked"] = checked
+        report["mismatches"] = mismatches
+        print(f"checked {checked:,} results against the keypad model: {len(mismatches)} mismatches",
+              file=sys.stderr)
+        for mismatch in mismatches:
+            print(f"mismatch: {mismatch}", file=sys.stderr)
+        failed = bool(mismatches)
+
+    if args.operations:
+        costs = operation_costs([arithmetic_for(mode, args.precision) for mode in MODES])
+        report["operation_ns"] = costs
+        print(f"{'ns per operation':<16}" + "".join(f"{mode:>10}" for mode in MODES), file=sys.stderr)
+        for name in OPERATIONS:
+            print(f"{name:<16}" + "".join(f"{costs[mode][name]:>10.0f}" for mode in MODES), file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,324 @@
+import argparse
+import csv
+import itertools
+import math
+import operator
+import sys
+import time
+
+from calc_expression import CalcError, Name, parse, tokenize
+from calc_numbers import FLOAT, format_number
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Rows read, evaluated and written at a time, so a file of any size runs in
+# about the same memory.
+CHUNK_ROWS = 65_536
+ERROR = "Error"
+NAN = float("nan")
+# What a failed operation leaves in a column. NaN carries through every
+# later operation, so a row that fails anywhere comes out as Error, the way
+# CalcError ends evaluate().
+FAILURES = (ArithmeticError, ValueError, TypeError, IndexError)
+
+
+def guarded(function, fallback, values):
+    try:
+        return function(*values)
+    except FAILURES:
+        return fallback
+
+
+def each(function, *columns, fallback=NAN):
+    # list(map(function, *columns)), which loops in C. If an element fails,
+    # the columns are gone through again one element at a time, with
+    # `fallback` for those that fail; only chunks with a failure pay for it.
+    try:
+        return list(map(function, *columns))
+    except FAILURES:
+        return [guarded(function, fallback, values) for values in zip(*columns)]
+
+
+def numbers(cells):
+    # Cells as float() reads them; anything else, inf and nan included, is
+    # NaN, an Error in that row.
+    values = each(float, cells)
+    if not all(map(math.isfinite, values)):
+        values = [value if math.isfinite(value) else NAN for value in values]
+    return values
+
+
+def without_zeros(values):
+    # values with each zero made NaN, so dividing by them fails the row
+    # without failing the map(); each zero is found by an index() scan, not
+    # a loop over every value.
+    if 0.0 not in values:
+        return values
+    values = values.copy()
+    i = values.index(0.0)
+    try:
+        while True:
+            values[i] = NAN
+            i = values.index(0.0, i + 1)
+    except ValueError:
+        return values
+
+
+def format_result(value):
+    return format_number(value) if math.isfinite(value) else ERROR
+
+
+class ListColumns:
+    # Columns as lists of floats, each operation one map() over a chunk.
+    name = "list"
+
+    def column(self, values):
+        return numbers(values)
+
+    def broadcast(self, value, length):
+        return [value] * length
+
+    def negate(self, a):
+        return list(map(operator.neg, a))
+
+    def apply(self, op, a, b):
+        if op == "/":
+            if type(b) is float:
+                b = b or NAN
+            else:
+                b = without_zeros(b)
+        if type(a) is float:
+            a = itertools.repeat(a)
+        if type(b) is float:
+            b = itertools.repeat(b)
+        return each(FLOAT.functions[op], a, b)
+
+    def texts(self, values):
+        return list(map(format_result, values))
+
+
+class NumpyColumns:
+    # Columns as float64 arrays. Dividing by zero leaves NaN, not inf, so
+    # 1 / (1 / 0) is an Error as it is on the keypad, not 0.
+    name = "numpy"
+
+    def column(self, values):
+        if not isinstance(values, numpy.ndarray):
+            values = numbers(values)
+        values = numpy.asarray(values, dtype=numpy.float64)
+        return numpy.where(numpy.isfinite(values), values, NAN)
+
+    def broadcast(self, value, length):
+        return numpy.full(length, value)
+
+    def negate(self, a):
+        return -a
+
+    def apply(self, op, a, b):
+        with numpy.errstate(all="ignore"):
+            if op == "/":
+                out = numpy.full(numpy.broadcast_shapes(numpy.shape(a), numpy.shape(b)), NAN)
+                return numpy.divide(a, b, out=out, where=numpy.asarray(b) != 0)
+            return FLOAT.functions[op](a, b)
+
+    def texts(self, values):
+        return list(map(format_result, values.tolist()))
+
+
+BACKENDS = {"list": ListColumns()}
+if numpy is not None:
+    BACKENDS["numpy"] = NumpyColumns()
+
+
+def default_backend():
+    return BACKENDS.get("numpy", BACKENDS["list"])
+
+
+def compile_columns(tree):
+    # Like compile_tree(), but each closure takes (columns, backend) and
+    # works out a whole column: columns maps each Name to one. A part of the
+    # tree without names is worked out once, here, into a float.
+    kind = tree[0]
+    if kind == "num":
+        token = tree[1]
+        if type(token) is Name:
+            return lambda columns, backend: columns[token]
+        return FLOAT.number(token)
+    if kind == "neg":
+        inner = compile_columns(tree[1])
+        if type(inner) is float:
+            return -inner
+        return lambda columns, backend: backend.negate(inner(columns, backend))
+    left = compile_columns(tree[1])
+    right = compile_columns(tree[2])
+    if type(left) is float and type(right) is float:
+        return guarded(FLOAT.functions[kind], NAN, (left, right))
+    if type(left) is float:
+        return lambda columns, backend: backend.apply(kind, left, right(columns, backend))
+    if type(right) is float:
+        return lambda columns, backend: backend.apply(kind, left(columns, backend), right)
+    return lambda columns, backend: backend.apply(kind, left(columns, backend), right(columns, backend))
+
+
+class BatchExpression:
+    # An expression with variables, evaluated in float arithmetic over whole
+    # columns at once: no Python code runs per row unless a row fails. A
+    # failed row is NaN in the result and Error in texts().
+    def __init__(self, text):
+        self.tokens = tuple(tokenize(text))
+        self.names = sorted({token for token in self.tokens if type(token) is Name})
+        try:
+            self._evaluate = compile_columns(parse(self.tokens))
+        except RecursionError:
+            raise CalcError("expression too long") from None
+        except CalcError:
+            raise
+        except ValueError:
+            raise CalcError("not a number") from None
+
+    def evaluate(self, columns, length, backend=None):
+        # columns maps each of self.names to a column of `length` values, as
+        # backend.column() makes them.
+        backend = backend or default_backend()
+        result = self._evaluate if type(self._evaluate) is float else self._evaluate(columns, backend)
+        if type(result) is float:
+            return backend.broadcast(result, length)
+        return result
+
+
+def evaluate_columns(text, columns, backend=None):
+    # Evaluates text over columns given by name: lists of numbers or of
+    # cells, or NumPy arrays. Returns the results as the backend's column,
+    # NaN for errors.
+    backend = backend or default_backend()
+    expression = BatchExpression(text)
+    missing = [name for name in expression.names if name not in columns]
+    if missing:
+        raise CalcError(f"unknown name {missing[0]!r}")
+    lengths = {len(columns[name]) for name in expression.names}
+    if len(lengths) > 1:
+        raise ValueError("columns differ in length")
+    converted = {name: backend.column(columns[name]) for name in expression.names}
+    return expression.evaluate(converted, lengths.pop() if lengths else 1, backend)
+
+
+def csv_chunks(reader, positions, backend, chunk_rows=CHUNK_ROWS):
+    # Yields (rows, columns) for each chunk of the CSV reader's rows, with a
+    # column for each name at its position. A short row's missing cell is
+    # an Error like any other cell that is not a number.
+    while True:
+        rows = list(itertools.islice(reader, chunk_rows))
+        if not rows:
+            return
+        columns = {name: backend.column(each(operator.itemgetter(i), rows, fallback=""))
+                   for name, i in positions.items()}
+        yield rows, columns
+
+
+def npy_columns(array, names):
+    # How to take each column from a chunk of a .npy array: by field name
+    # for a structured array, and for a plain one by `names` in order,
+    # defaulting to x for one column and c0, c1, ... for more.
+    if array.dtype.names:
+        return {name: operator.itemgetter(name) for name in array.dtype.names}
+    if array.ndim == 1:
+        return {(names or ["x"])[0]: lambda chunk: chunk}
+    if array.ndim != 2:
+        raise ValueError(f"a .npy input needs 1 or 2 dimensions, not {array.ndim}")
+    names = names or [f"c{i}" for i in range(array.shape[1])]
+    if len(names) != array.shape[1]:
+        raise ValueError(f"{len(names)} names for {array.shape[1]} columns")
+    return {name: operator.itemgetter((slice(None), i)) for i, name in enumerate(names)}
+
+
+def npy_chunks(array, getters, backend, chunk_rows=CHUNK_ROWS):
+    # Like csv_chunks(), over an array memory-mapped by numpy.load(), so
+    # only the chunk being worked on is read in.
+    for start in range(0, len(array), chunk_rows):
+        chunk = array[start:start + chunk_rows]
+        yield len(chunk), {name: backend.column(get(chunk)) for name, get in getters.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Evaluate a calculator expression over every row of a CSV file or .npy array, "
+                    "with the columns as variables. Rows that fail, as on division by zero, give Error.")
+    parser.add_argument("expression", help='for example "price * (1 + rate / 100)"')
+    parser.add_argument("input", help="CSV file with a header row, or .npy file; - reads CSV from stdin")
+    parser.add_argument("-o", "--output", help="CSV file to write (default: stdout)")
+    parser.add_argument("--name", default="result", help="header of the result column (default: result)")
+    parser.add_argument("--names", help="comma-separated names for the columns of a plain .npy array")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS,
+                        help=f"rows evaluated at a time (default: {CHUNK_ROWS:,})")
+    parser.add_argument("--backend", choices=["list", "numpy"], default=default_backend().name,
+                        help=f"how columns are held (default: {default_backend().name})")
+    args = parser.parse_args()
+
+    if args.backend not in BACKENDS:
+        parser.error("the numpy backend needs numpy installed")
+    backend = BACKENDS[args.backend]
+    try:
+        expression = BatchExpression(args.expression)
+    except CalcError as e:
+        parser.error(f"{args.expression!r}: {e}")
+
+    is_npy = args.input.endswith(".npy")
+    if is_npy and numpy is None:
+        parser.error("reading .npy files needs numpy installed")
+    source = sys.stdin if args.input == "-" else None
+    target = sys.stdout
+    rows_done = errors = 0
+    start = time.perf_counter()
+    try:
+        if is_npy:
+            array = numpy.load(args.input, mmap_mode="r")
+            getters = npy_columns(array, args.names.split(",") if args.names else None)
+            header = [args.name]
+        else:
+            source = source or open(args.input, "r", encoding="utf-8", newline="")
+            reader = csv.reader(source)
+            header = next(reader, [])
+            positions = {name: header.index(name) for name in expression.names if name in header}
+            header = header + [args.name]
+        missing = [name for name in expression.names if name not in (getters if is_npy else positions)]
+        if missing:
+            parser.error(f"no column named {missing[0]!r} in {args.input}")
+        if args.output:
+            target = open(args.output, "w", encoding="utf-8", newline="")
+        writer = csv.writer(target)
+        writer.writerow(header)
+        if is_npy:
+            for length, columns in npy_chunks(array, {name: getters[name] for name in expression.names},
+                                              backend, args.chunk_rows):
+                texts = backend.texts(expression.evaluate(columns, length, backend))
+                writer.writerows(zip(texts))
+                rows_done += length
+                errors += texts.count(ERROR)
+        else:
+            for rows, columns in csv_chunks(reader, positions, backend, args.chunk_rows):
+                texts = backend.texts(expression.evaluate(columns, len(rows), backend))
+                # The result goes under its header whatever the row's length:
+                # a short row is padded, a long row's extra cells follow it.
+                width = len(header) - 1
+                writer.writerows(row[:width] + [""] * (width - len(row)) + [text] + row[width:]
+                                 for row, text in zip(rows, texts))
+                rows_done += len(rows)
+                errors += texts.count(ERROR)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    finally:
+        if source not in (None, sys.stdin):
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+    seconds = time.perf_counter() - start
+    print(f"{rows_done:,} rows, {errors:,} errors in {seconds:.2f} s with {backend.name} columns: "
+          f"{rows_done / seconds if seconds else 0:,.0f} rows/s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
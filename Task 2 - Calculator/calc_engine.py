@@ -0,0 +1,276 @@
+import decimal
+import functools
+
+from calc_expression import CalcError, OPERATORS, PRECEDENCE, compile_tokens, format_tokens, is_number
+from calc_numbers import FLOAT
+
+# Longest number shown as typed; longer ones are shown in scientific notation.
+DISPLAY_DIGITS = 15
+# What each key does, as (method, arguments). "AC" is the clear key whether
+# it currently reads AC or C; see CalculatorEngine.clear_label.
+KEYS = {
+    **{digit: ("input_digit", digit) for digit in "0123456789"},
+    ".": ("input_decimal",),
+    **{op: ("input_operator", op) for op in ("+", "−", "×", "/")},
+    "(": ("open_group",),
+    ")": ("close_group",),
+    "=": ("evaluate",),
+    "+/-": ("toggle_sign",),
+    "%": ("percent",),
+    "AC": ("clear",),
+}
+
+
+class CalculatorEngine:
+    # The keypad's state machine, without Qt. tokens is the expression
+    # entered so far, up to the number being typed into current_value;
+    # after_close means it ends in ")" and current_value only shows that
+    # group's value. Numbers are those of `arithmetic` (see calc_numbers);
+    # where its results' text is not exact, `value` carries the number
+    # current_value shows. Each "=" reports on_history(text, value, error,
+    # expression): the expression's text, the result or None, the CalcError
+    # message or None, and the compiled Expression (None if it did not
+    # compile), whose tokens and arithmetic recall() takes. "AC" calls
+    # on_reset() after clearing everything.
+    def __init__(self, on_history=None, on_reset=None, arithmetic=FLOAT):
+        self.on_history = on_history
+        self.on_reset = on_reset
+        self.arithmetic = arithmetic
+        self.actions = {key: functools.partial(getattr(self, name), *args) for key, (name, *args) in KEYS.items()}
+        self.reset()
+
+    def set_arithmetic(self, arithmetic):
+        # Starts a new calculation in the other mode.
+        self.arithmetic = arithmetic
+        self.reset()
+
+    def reset(self):
+        self.current_value = "0"
+        self.value = None
+        self.tokens = []
+        self.after_close = False
+        self.last_button_was_op = False
+        self.just_evaluated = False
+
+    def press(self, key):
+        self.actions[key]()
+
+    def press_all(self, keys):
+        actions = self.actions
+        for key in keys:
+            actions[key]()
+
+    @property
+    def clear_label(self):
+        return "AC" if self.current_value == "0" and not self.tokens else "C"
+
+    def display_text(self):
+        # A number too long to show is rounded to fit, in decimal so exact
+        # modes' digits are not bent through a float on the way; very large
+        # and very small ones are shown in scientific notation.
+        text = self.current_value
+        if len(text) <= DISPLAY_DIGITS:
+            return text
+        try:
+            number = decimal.Decimal(text)
+        except decimal.InvalidOperation:
+            return text[:DISPLAY_DIGITS]
+        if not number:
+            # Zeros being typed after the point.
+            return text[:DISPLAY_DIGITS]
+        whole_digits = max(number.adjusted(), 0) + 1 + (number < 0)
+        if whole_digits <= DISPLAY_DIGITS and number.adjusted() > -6:
+            places = max(DISPLAY_DIGITS - whole_digits - 1, 0)
+            shown = number.quantize(decimal.Decimal(1).scaleb(-places), context=decimal.Context(prec=DISPLAY_DIGITS + 1))
+            shown = format(shown.normalize(), "f")
+            if len(shown) <= DISPLAY_DIGITS:
+                return shown
+        return "{:.6e}".format(number)
+
+    def expression_text(self):
+        return format_tokens(self.tokens)
+
+    def operand(self):
+        # The number being typed, as a token.
+        if self.value is not None:
+            return self.value
+        return self.current_value if is_number(self.current_value) else "0"
+
+    def show(self, value, rounded=True):
+        self.current_value = self.arithmetic.format(value, rounded)
+        self.value = value if self.arithmetic.keeps_values else None
+
+    def number(self):
+        # What current_value stands for; ValueError if not a number.
+        if self.value is not None:
+            return self.value
+        return self.arithmetic.number(self.current_value)
+
+    def value_of(self, tokens):
+        # The value of a complete expression, or None; compiled through the
+        # cache, so asking again as more is typed costs little.
+        try:
+            return compile_tokens(tuple(tokens), self.arithmetic).evaluate()
+        except CalcError:
+            return None
+
+    def input_digit(self, digit):
+        if self.after_close:
+            return
+        self.value = None
+        if self.just_evaluated:
+            self.current_value = digit
+            self.just_evaluated = False
+        elif self.current_value == "0" or self.last_button_was_op:
+            self.current_value = digit
+            self.last_button_was_op = False
+        else:
+            self.current_value += digit
+
+    def input_decimal(self):
+        if self.after_close:
+            return
+        self.value = None
+        if self.just_evaluated:
+            self.current_value = "0."
+            self.just_evaluated = False
+        elif "." not in self.current_value:
+            self.current_value += "."
+
+    def input_operator(self, op):
+        real_op = OPERATORS[op]
+        if self.last_button_was_op and self.tokens and self.tokens[-1] in PRECEDENCE:
+            # Pressing another operator replaces the one just pressed.
+            self.tokens[-1] = real_op
+        else:
+            if not self.after_close:
+                self.tokens.append(self.operand())
+            self.tokens.append(real_op)
+        self.after_close = False
+        self.last_button_was_op = True
+        self.just_evaluated = False
+
+    def open_group(self):
+        if self.after_close or not (self.last_button_was_op or self.just_evaluated or self.current_value == "0"):
+            return
+        self.tokens.append("(")
+        self.current_value = "0"
+        self.value = None
+        self.last_button_was_op = True
+        self.just_evaluated = False
+
+    def close_group(self):
+        if self.tokens.count("(") <= self.tokens.count(")") or (self.last_button_was_op and not self.after_close):
+            return
+        if not self.after_close:
+            self.tokens.append(self.operand())
+        self.tokens.append(")")
+        self.show_group()
+        self.after_close = True
+        self.last_button_was_op = False
+
+    def show_group(self):
+        # Shows the value of the group that ends tokens.
+        value = self.value_of(self.tokens[self.group_start():])
+        if value is None:
+            self.current_value = "Error"
+            self.value = None
+        else:
+            self.show(value)
+
+    def group_start(self):
+        # Index of the "(" matching the ")" that ends tokens.
+        depth = 0
+        for i in range(len(self.tokens) - 1, -1, -1):
+            depth += {")": 1, "(": -1}.get(self.tokens[i], 0)
+            if depth == 0:
+                return i
+        return 0
+
+    def evaluate(self):
+        if not self.tokens:
+            return
+        tokens = self.tokens if self.after_close else self.tokens + [self.operand()]
+        tokens += [")"] * (tokens.count("(") - tokens.count(")"))
+        self.tokens = []
+        self.after_close = False
+        self.just_evaluated = True
+        self.last_button_was_op = False
+        expression = None
+        try:
+            expression = compile_tokens(tuple(tokens), self.arithmetic)
+            value = expression.evaluate()
+        except CalcError as e:
+            self.current_value = "Error"
+            self.value = None
+            if self.on_history:
+                self.on_history(format_tokens(tokens), None, str(e), expression)
+            return
+        self.show(value)
+        if self.on_history:
+            self.on_history(expression.text, value, None, expression)
+
+    def toggle_sign(self):
+        try:
+            if self.current_value == "0" or self.current_value == "Error" or self.after_close:
+                return
+            value = self.number()
+            self.show(self.arithmetic.run(lambda: self.arithmetic.negate(value)), rounded=False)
+        except Exception:
+            self.current_value = "Error"
+            self.value = None
+
+    def percent(self):
+        # Right after an operator, a percentage is of the value before it:
+        # 200 + 5% is 200 + 10.
+        if self.after_close:
+            return
+        try:
+            value = self.number()
+            functions = self.arithmetic.functions
+            pending_value = None
+            if self.tokens and self.tokens[-1] in PRECEDENCE:
+                pending_value = self.value_of(self.tokens[:-1])
+            if pending_value is None:
+                self.show(self.arithmetic.run(lambda: functions["/"](value, 100)), rounded=False)
+            else:
+                self.show(self.arithmetic.run(lambda: functions["*"](pending_value, functions["/"](value, 100))),
+                          rounded=False)
+        except Exception:
+            self.current_value = "Error"
+            self.value = None
+
+    def clear(self):
+        if self.clear_label == "AC":
+            self.reset()
+            if self.on_reset:
+                self.on_reset()
+        else:
+            if self.after_close:
+                # Clearing a closed group takes the whole group back out.
+                del self.tokens[self.group_start():]
+                self.after_close = False
+            self.current_value = "0"
+            self.value = None
+            self.last_button_was_op = False
+
+    def recall(self, tokens, arithmetic):
+        # Puts an earlier calculation back for editing from its tokens, with
+        # no parsing: its last number is typed in again and "=" re-runs it
+        # from the compile cache. The engine switches to the arithmetic it
+        # was worked out in.
+        self.arithmetic = arithmetic
+        tokens = list(tokens)
+        self.after_close = tokens[-1] == ")"
+        self.tokens = tokens
+        if self.after_close:
+            self.show_group()
+        else:
+            last = tokens.pop()
+            if isinstance(last, str):
+                self.current_value = last
+                self.value = None
+            else:
+                self.show(last)
+        self.last_button_was_op = False
+        self.just_evaluated = False
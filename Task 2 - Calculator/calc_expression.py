@@ -0,0 +1,222 @@
+import functools
+import operator
+import re
+
+from calc_numbers import FLOAT
+
+# Keypad and keyboard spellings of each operator, by the ASCII one used in
+# tokens.
+OPERATORS = {"+": "+", "-": "-", "−": "-", "*": "*", "×": "*", "/": "/", "÷": "/"}
+DISPLAY_OPERATORS = {"+": "+", "-": "−", "*": "×", "/": "/"}
+PRECEDENCE = {"+": 1, "-": 1, "*": 2, "/": 2}
+SYMBOLS = {*PRECEDENCE, "(", ")", None}
+# Operations on two ints that always give an int.
+INT_FUNCTIONS = {"+": operator.add, "-": operator.sub, "*": operator.mul}
+# Compiled expressions kept for re-running history entries.
+COMPILE_CACHE_SIZE = 512
+# Deepest nesting of parentheses and signs the parser accepts.
+MAX_DEPTH = 200
+
+NUMBER = r"(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?"
+NUMBER_RE = re.compile(rf"-?{NUMBER}")
+TOKEN_RE = re.compile(rf"\s*(?:({NUMBER})|([A-Za-z_]\w*)|(.))")
+SIGNED_NUMBER_RE = re.compile(rf"\s*([-−])\s*({NUMBER})")
+
+
+class CalcError(ValueError):
+    pass
+
+
+class Name(str):
+    # A variable, as tokenize() returns it; only batch evaluation (see
+    # calc_batch) gives them values.
+    __slots__ = ()
+
+
+def tokenize(text):
+    # Numbers, names, ASCII operators and parentheses. A sign right in front
+    # of a number where an operand is expected becomes part of the number,
+    # so "2 × -3" has the tokens 2, *, -3 and reads back the same way.
+    tokens = []
+    position = 0
+    expect_operand = True
+    text = text.rstrip()
+    while position < len(text):
+        if expect_operand:
+            match = SIGNED_NUMBER_RE.match(text, position)
+            if match:
+                tokens.append("-" + match.group(2))
+                position = match.end()
+                expect_operand = False
+                continue
+        match = TOKEN_RE.match(text, position)
+        number, name, symbol = match.groups()
+        position = match.end()
+        if number:
+            tokens.append(number)
+            expect_operand = False
+        elif name:
+            tokens.append(Name(name))
+            expect_operand = False
+        elif symbol in OPERATORS:
+            tokens.append(OPERATORS[symbol])
+            expect_operand = True
+        elif symbol in "()":
+            tokens.append(symbol)
+            expect_operand = symbol == "("
+        else:
+            raise CalcError(f"unexpected {symbol!r}")
+    return tokens
+
+
+def is_number(token):
+    return NUMBER_RE.fullmatch(token) is not None
+
+
+def format_tokens(tokens):
+    # The way the keypad shows an expression: "(2 + 3) × -4", "−(1 − 2)".
+    # A result carried on as a Fraction is written "(1/3)", which reads
+    # back as the same number.
+    parts = []
+    glue_next = True
+    expect_operand = True
+    for token in tokens:
+        if not isinstance(token, str):
+            token = str(token)
+            if "/" in token:
+                token = f"({token})"
+        parts.append(("" if glue_next or token == ")" else " ") + DISPLAY_OPERATORS.get(token, token))
+        # An operator where an operand is expected is a sign.
+        glue_next = token == "(" or (token in PRECEDENCE and expect_operand)
+        expect_operand = token == "(" or token in PRECEDENCE
+    return "".join(parts)
+
+
+def parse(tokens):
+    # Pratt parser: binary operators bind by PRECEDENCE and associate left,
+    # "+" and "-" in front of an operand are signs. The tree is nested
+    # tuples: ("num", text or Name), ("neg", operand) or (operator, left,
+    # right).
+    # Anything that is not an operator or parenthesis is taken for a number;
+    # tokenize() has checked them. A None at the end saves bounds checks.
+    position = 0
+    tokens = (*tokens, None)
+
+    def operand(depth):
+        nonlocal position
+        if depth > MAX_DEPTH:
+            raise CalcError("expression nested too deeply")
+        token = tokens[position]
+        position += 1
+        if token not in SYMBOLS:
+            return ("num", token)
+        if token == "(":
+            node = expression(1, depth + 1)
+            if tokens[position] != ")":
+                raise CalcError("missing ')'")
+            position += 1
+            return node
+        if token == "-":
+            return ("neg", operand(depth + 1))
+        if token == "+":
+            return operand(depth + 1)
+        if token is None:
+            raise CalcError("expression ends too early")
+        raise CalcError(f"unexpected {DISPLAY_OPERATORS.get(token, token)!r}")
+
+    def expression(min_precedence, depth):
+        nonlocal position
+        left = operand(depth)
+        while PRECEDENCE.get(tokens[position], 0) >= min_precedence:
+            op = tokens[position]
+            position += 1
+            left = (op, left, expression(PRECEDENCE[op] + 1, depth + 1))
+        return left
+
+    tree = expression(1, 0)
+    if position < len(tokens) - 1:
+        raise CalcError(f"unexpected {DISPLAY_OPERATORS.get(tokens[position], tokens[position])!r}")
+    return tree
+
+
+def compile_tree(tree, arithmetic=FLOAT):
+    # Turns the tree into nested closures, so evaluating walks no tuples and
+    # looks nothing up. Literals are converted by `arithmetic` once, here;
+    # a token that already is a number is used as it is.
+    return _compile(tree, arithmetic)[0]
+
+
+def _compile(tree, arithmetic):
+    # (closure, whether it always gives an int). Subtrees known to stay ints
+    # use INT_FUNCTIONS directly, the exact modes' fast path.
+    kind = tree[0]
+    if kind == "num":
+        if type(tree[1]) is Name:
+            raise CalcError(f"unknown name {tree[1]!r}")
+        value = arithmetic.number(tree[1]) if isinstance(tree[1], str) else tree[1]
+        return (lambda: value), type(value) is int
+    if kind == "neg":
+        inner, is_int = _compile(tree[1], arithmetic)
+        if is_int or arithmetic.negate is operator.neg:
+            return (lambda: -inner()), is_int
+        negate = arithmetic.negate
+        return (lambda: negate(inner())), False
+    left, left_int = _compile(tree[1], arithmetic)
+    right, right_int = _compile(tree[2], arithmetic)
+    is_int = left_int and right_int and kind in INT_FUNCTIONS
+    fn = INT_FUNCTIONS[kind] if is_int else arithmetic.functions[kind]
+    return (lambda: fn(left(), right())), is_int
+
+
+class Expression:
+    # A parsed and compiled expression, from a tuple of tokens as tokenize()
+    # returns them, evaluated in one of the calc_numbers arithmetics. `text`
+    # is the canonical spelling from format_tokens(), whatever spacing or
+    # symbols it was typed with.
+    __slots__ = ("tokens", "arithmetic", "tree", "_evaluate", "_text")
+
+    def __init__(self, tokens, arithmetic=FLOAT):
+        self.tokens = tokens
+        self.arithmetic = arithmetic
+        self._text = None
+        try:
+            self.tree = parse(self.tokens)
+            self._evaluate = compile_tree(self.tree, arithmetic)
+        except RecursionError:
+            raise CalcError("expression too long") from None
+        except CalcError:
+            raise
+        except ValueError:
+            raise CalcError("not a number") from None
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = format_tokens(self.tokens)
+        return self._text
+
+    def evaluate(self):
+        try:
+            return self.arithmetic.run(self._evaluate)
+        except ZeroDivisionError:
+            raise CalcError("division by zero") from None
+        except OverflowError:
+            raise CalcError("result out of range") from None
+        except RecursionError:
+            raise CalcError("expression too long") from None
+
+
+@functools.lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_tokens(tokens, arithmetic=FLOAT):
+    # tokens is a tuple, as the keypad builds them. Raises CalcError for
+    # ones that do not parse; those are not cached.
+    return Expression(tokens, arithmetic)
+
+
+@functools.lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_expression(text, arithmetic=FLOAT):
+    return compile_tokens(tuple(tokenize(text)), arithmetic)
+
+
+def evaluate(text, arithmetic=FLOAT):
+    return compile_expression(text, arithmetic).evaluate()
@@ -0,0 +1,156 @@
+import collections
+import json
+import os
+from fractions import Fraction
+
+from calc_numbers import DEFAULT_PRECISION, arithmetic_for
+
+HISTORY_FILE = "calc_history.jsonl"
+# Calculations kept, in memory and when loading the file.
+HISTORY_LIMIT = int(os.environ.get("CALC_HISTORY_LIMIT", 1000))
+
+
+def encode_token(token):
+    # Tokens are text, except results carried on exactly in Fraction mode.
+    if isinstance(token, str):
+        return token
+    return [token.numerator, token.denominator]
+
+
+def decode_token(token):
+    if isinstance(token, str):
+        return token
+    value = Fraction(*token)
+    return value.numerator if value.denominator == 1 else value
+
+
+class History:
+    # The last `limit` calculations in a ring: adding one to a full history
+    # drops the oldest without moving the others. Entries are numbered in
+    # the order they were added, from `start` up to `end`; each is a tuple
+    # (line, tokens, mode, precision), where line is what the panel shows
+    # and tokens (None if it did not compile) and the mode and precision are
+    # what recalling it needs, so it is never parsed again.
+    #
+    # With a path, every entry added is appended to that file as a JSON
+    # line, and the last `limit` are loaded back from it. The file is
+    # rewritten with just those once it holds more than twice as many.
+    def __init__(self, limit=HISTORY_LIMIT, path=None):
+        self.limit = max(1, limit)
+        self.ring = [None] * self.limit
+        self.start = self.end = 0
+        self.path = path
+        self.file = None
+        self.lines_in_file = 0
+        if path:
+            self.load()
+
+    def __len__(self):
+        return self.end - self.start
+
+    def entry(self, number):
+        return self.ring[number % self.limit]
+
+    def entries(self):
+        return [self.entry(number) for number in range(self.start, self.end)]
+
+    def is_full(self):
+        return len(self) == self.limit
+
+    def drop_oldest(self):
+        self.ring[self.start % self.limit] = None
+        self.start += 1
+
+    def add(self, line, tokens, arithmetic):
+        # Returns the new entry's number.
+        entry = (line, None if tokens is None else tuple(tokens),
+                 arithmetic.name, getattr(arithmetic, "precision", None))
+        self._put(entry)
+        if self.path:
+            self._write(entry)
+        return self.end - 1
+
+    def _put(self, entry):
+        if self.is_full():
+            self.drop_oldest()
+        self.ring[self.end % self.limit] = entry
+        self.end += 1
+
+    def matches(self, number, needle):
+        return needle in self.entry(number)[0].casefold()
+
+    def search(self, text):
+        # Numbers of the entries whose expression or result contains text,
+        # ignoring case.
+        needle = text.casefold()
+        return [number for number in range(self.start, self.end) if self.matches(number, needle)]
+
+    @staticmethod
+    def arithmetic_of(entry):
+        _, _, mode, precision = entry
+        return arithmetic_for(mode, precision or DEFAULT_PRECISION)
+
+    def clear(self):
+        self.ring = [None] * self.limit
+        self.start = self.end = 0
+        if self.path:
+            self._rewrite()
+
+    def load(self):
+        # One line more than is kept, in case the last was cut short; the ring
+        # drops the extra one otherwise.
+        lines = collections.deque(maxlen=self.limit + 1)
+        count = 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    lines.append(line)
+                    count += 1
+        except FileNotFoundError:
+            pass
+        for line in lines:
+            try:
+                record = json.loads(line)
+                tokens = record["tokens"]
+                self._put((record["line"], None if tokens is None else tuple(map(decode_token, tokens)),
+                           record["mode"], record.get("precision")))
+            except (ValueError, KeyError, TypeError):
+                # A line cut short when the app was killed mid-write.
+                continue
+        self.lines_in_file = count
+        # Appending after a cut-short line would run into it.
+        if count > 2 * self.limit or (lines and not lines[-1].endswith("\n")):
+            self._rewrite()
+
+    def _record(self, entry):
+        line, tokens, mode, precision = entry
+        record = {"line": line, "tokens": None if tokens is None else [encode_token(token) for token in tokens],
+                  "mode": mode}
+        if precision is not None:
+            record["precision"] = precision
+        return json.dumps(record, ensure_ascii=False) + "\n"
+
+    def _write(self, entry):
+        if self.lines_in_file >= 2 * self.limit:
+            self._rewrite()
+            return
+        if self.file is None:
+            self.file = open(self.path, "a", encoding="utf-8")
+        self.file.write(self._record(entry))
+        self.file.flush()
+        self.lines_in_file += 1
+
+    def _rewrite(self):
+        # Replaces the file with the entries kept, through a temporary file
+        # so a crash leaves either the old file or the new one.
+        self.close()
+        temp = self.path + ".tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            f.writelines(self._record(entry) for entry in self.entries())
+        os.replace(temp, self.path)
+        self.lines_in_file = len(self)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
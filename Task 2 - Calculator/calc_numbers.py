@@ -0,0 +1,175 @@
+import decimal
+import functools
+import math
+import operator
+import re
+from fractions import Fraction
+
+# Number modes the keypad offers, and the Decimal mode's default number of
+# significant digits.
+MODES = ("float", "decimal", "fraction")
+DEFAULT_PRECISION = 28
+MIN_PRECISION = 4
+MAX_PRECISION = 200
+# Digits shown for a fraction that has no finite decimal expansion.
+FRACTION_DIGITS = 20
+
+INTEGER_RE = re.compile(r"-?\d+")
+
+
+def format_number(value):
+    if value.is_integer():
+        return str(int(value))
+    return str(round(value, 9))
+
+
+class FloatArithmetic:
+    # Binary floats, as the keypad always worked: results are shown rounded
+    # to nine decimals and typed back in from that text.
+    name = "float"
+    # Whether a result's exact value has to be carried on, because its text
+    # is only an approximation.
+    keeps_values = False
+    negate = operator.neg
+
+    def __init__(self):
+        self.functions = {"+": operator.add, "-": operator.sub, "*": operator.mul, "/": operator.truediv}
+
+    def number(self, text):
+        return float(text)
+
+    def run(self, evaluate):
+        result = evaluate()
+        if not math.isfinite(result):
+            raise OverflowError
+        return result
+
+    def format(self, value, rounded=True):
+        # Results of "=" are rounded; +/- and % show the plain float.
+        if rounded:
+            return format_number(value)
+        return str(int(value)) if value.is_integer() else str(value)
+
+
+class ExactArithmetic:
+    # Base of the exact modes. Literals without a decimal point become ints;
+    # compile_tree() turns +, - and × of ints into plain int operations,
+    # which cost about what floats do, and a division that comes out whole
+    # stays an int too. Only other divisions and non-integer literals make
+    # numbers of the subclass's `exact` type, which go through `functions`.
+    keeps_values = False
+    negate = operator.neg
+
+    def __init__(self):
+        self.functions = {"+": operator.add, "-": operator.sub, "*": operator.mul, "/": self.divide}
+
+    def number(self, text):
+        if INTEGER_RE.fullmatch(text):
+            return int(text)
+        return self.exact(text)
+
+    def divide(self, a, b):
+        if type(a) is int and type(b) is int:
+            if b and not a % b:
+                return a // b
+            return self.exact(a) / b
+        return a / b
+
+    def run(self, evaluate):
+        return evaluate()
+
+
+def exact_for_ints(int_function, function):
+    # `function`, except on two ints, which can still meet where
+    # compile_tree() could not tell, after a division that came out whole.
+    def apply(a, b):
+        if type(a) is int and type(b) is int:
+            return int_function(a, b)
+        return function(a, b)
+    return apply
+
+
+class DecimalArithmetic(ExactArithmetic):
+    # decimal.Decimal rounded to `precision` significant digits; integer
+    # results are exact whatever their length. Every operation goes through
+    # this mode's own context's methods rather than the thread's current
+    # context, which would cost a localcontext() (about a microsecond) per
+    # evaluation.
+    name = "decimal"
+    exact = decimal.Decimal
+
+    def __init__(self, precision=DEFAULT_PRECISION):
+        self.precision = precision
+        self.context = decimal.Context(
+            prec=precision, rounding=decimal.ROUND_HALF_EVEN,
+            traps=[decimal.InvalidOperation, decimal.DivisionByZero, decimal.Overflow])
+        self.functions = {"+": exact_for_ints(operator.add, self.context.add),
+                          "-": exact_for_ints(operator.sub, self.context.subtract),
+                          "*": exact_for_ints(operator.mul, self.context.multiply),
+                          "/": self.divide}
+
+    def negate(self, a):
+        # An int, typed or come out of a whole division, keeps every digit.
+        if type(a) is int:
+            return -a
+        return self.context.minus(a)
+
+    def divide(self, a, b):
+        if type(a) is int and type(b) is int and b and not a % b:
+            return a // b
+        return self.context.divide(a, b)
+
+    def run(self, evaluate):
+        try:
+            return evaluate()
+        except decimal.Overflow:
+            raise OverflowError from None
+        except decimal.InvalidOperation:
+            # 0 / 0 is the only invalid operation on finite numbers.
+            raise ZeroDivisionError from None
+
+    def format(self, value, rounded=True):
+        if type(value) is int:
+            return str(value)
+        value = value.normalize(self.context)
+        if value == value.to_integral_value():
+            return str(int(value))
+        return format(value, "f")
+
+
+class FractionArithmetic(ExactArithmetic):
+    # fractions.Fraction, exact through any number of divisions. A result
+    # like 1/3 is shown to FRACTION_DIGITS digits but carried on exactly.
+    name = "fraction"
+    keeps_values = True
+    exact = Fraction
+
+    def __init__(self):
+        super().__init__()
+        self.digits = decimal.Context(prec=FRACTION_DIGITS)
+
+    def format(self, value, rounded=True):
+        if type(value) is int or value.denominator == 1:
+            return str(int(value))
+        shown = self.digits.divide(decimal.Decimal(value.numerator), value.denominator).normalize(self.digits)
+        return format(shown, "f")
+
+
+def arithmetic_for(mode="float", precision=DEFAULT_PRECISION):
+    # One shared instance per setting, so compiled expressions can be cached
+    # by it; only Decimal mode has a precision.
+    return _arithmetic_for(mode, precision if mode == "decimal" else None)
+
+
+@functools.lru_cache(maxsize=None)
+def _arithmetic_for(mode, precision):
+    if mode == "decimal":
+        return DecimalArithmetic(precision)
+    if mode == "fraction":
+        return FractionArithmetic()
+    if mode == "float":
+        return FloatArithmetic()
+    raise ValueError(f"unknown number mode {mode!r}")
+
+
+FLOAT = arithmetic_for("float")